@@ -20,173 +20,551 @@
     @author Martino Pilia <martino.pilia@gmail.com>
     @date 2015-04-17
     @brief Simplified emulator for mu0 processor.
+
+    The module can be imported as a library, e.g.:
+
+        import mu0
+        machine = mu0.Machine(mu0.assemble(open('sample_program.asm')))
+        status = machine.run()  # or machine.step(), one at a time
+        print(machine.acc, machine.dump())
+
+    Only the assembler and the core are imported with it: the modules for
+    the other engines and features are imported by main() when an option
+    needs them, so that both importing the module and plain console runs
+    start quickly.
 """
 
 import os.path
-import re
 import sys
 
-def dump(memory):
-    """Return a string representing the dump of the input memory.
-    Note: for negative values, conversion to 2's complement is needed:
-    it is done adding the (negative) value to 0x1000 (i.e. 2^12).
+import mu0_asm
+import mu0_core
+import mu0_object
+from mu0_asm import SourceSyntaxError
+from mu0_core import Machine, Program, MemoryAccessError, \
+        WordOverflowError, HALT_STOP, HALT_END, HALT_FAULT, HALT_OVERFLOW, \
+        HALT_LIMIT, HALT_TIMEOUT, HALT_LOOP
+
+def assemble(source, log = None, address_bits = mu0_core.ADDRESS_BITS):
+    """ Assemble a source, given as a string or as an iterable of lines
+        (e.g. an open file), and return the decoded Program.
+
+        Each recognized line is passed to the log function, if any, and a
+        SourceSyntaxError is risen if any line is not valid. Programs with a
+        wider address_bits (16 or 24) are run by a mu0_wide.WideMachine.
+    """
+    if isinstance(source, str):
+        source = source.splitlines(True)
+    return mu0_asm.assemble(source, log, address_bits)
+
+def show_status(machine):
+    """ Show the registers and the memory locations changed since the last
+        call.
+    """
+    print("  Current PC value:  %#0.3x" % (machine.pc))
+    print("  Current ACC value: " + mu0_core.format_value(machine.acc))
+    changes = machine.changes()
+    print("Memory changes after instruction execution:")
+    print(machine.dump(sorted(changes), changes) if changes else "  (none)")
+
+def run_steps(machine, debugger, running = False):
+    """ Run a program step by step, showing the status after each
+        instruction, and return the reason why the program halted.
+
+        Only the memory locations changed by each instruction are shown
+        (marked with '*'), while the full dump is available on request.
+        The execution is recorded, so that it is possible to step backwards
+        or to go to any instruction count.
+
+        The program can also continue at full speed, up to the next
+        breakpoint or watchpoint of the debugger (from the start, if running
+        is True): the recording starts again after it.
+    """
+    import mu0_history
+
+    program = machine.program
+    history = mu0_history.History(machine)
+    machine.changes() # start tracking the changes from here
+    while True:
+        if running:
+            running = False
+            status = debugger.run(machine)
+            if status != mu0_core.HALT_BREAK:
+                return status
+            history = mu0_history.History(machine)
+            print("\n### " + debugger.hit + ", at instruction count " +
+                    str(machine.steps) + ".")
+            show_status(machine)
+        else:
+            number = machine.pc # PC for the current instruction
+            status = history.step()
+            if status is not None:
+                return status
+            # show status
+            word = program.code[number]
+            print("\nExecuted line " + str(program.lines[number]) +
+                    ", instr. %#0.3x: %s %#0.3x" % (number,
+                        mu0_core.MNEMONICS[word >> 12],
+                        word & mu0_core.ADDRESS_MASK))
+            print("Comment: " + str(program.comments[number]))
+            show_status(machine)
+
+        # ask for continuation
+        while True:
+            command = input("Press ENTER for next instruction (d: full " +
+                    "memory dump, b: step back, g N: go to instruction " +
+                    "count N, c: continue, br LINE [if COND]: set " +
+                    "breakpoint, w ADDR[:r|w|rw]: set watchpoint)").split()
+            if not command:
+                break
+            if command[0] == "d":
+                print("Memory dump:")
+                print(machine.dump())
+                continue
+            if command[0] == "c":
+                running = True
+                break
+            if command[0] in ("br", "w") and len(command) > 1:
+                try:
+                    if command[0] == "br":
+                        debugger.parse_breakpoint(' '.join(command[1:]))
+                    else:
+                        debugger.parse_watchpoint(command[1])
+                except ValueError as e:
+                    print(e)
+                continue
+            if command[0] == "b":
+                if not history.back():
+                    print("Already at the start of the program.")
+                    continue
+            elif command[0] == "g" and len(command) == 2 and \
+                    command[1].isdigit():
+                status = history.seek(int(command[1]))
+                if status is not None:
+                    return status
+            else:
+                print("Unrecognized command.")
+                continue
+            print("\nAt instruction count " + str(history.position()) +
+                    ", next instruction at line " + str(machine.line()))
+            show_status(machine)
+
+SNAPSHOT_CHUNK = 1000000 # instructions run between checks for snapshots
+SNAPSHOT_INTERVAL = 10.  # seconds between periodic snapshots
+
+def run_saving(machine, run, snapshot_path):
+    """ Run a program with the given function (taking the machine and the
+        maximum number of instructions), saving the status of the machine to
+        the snapshot file periodically, and when interrupted with Ctrl-C.
+
+        Return the reason why the program halted, or None if it was
+        interrupted.
+    """
+    import signal
+    import time
+
+    interrupted = []
+    handler = signal.signal(signal.SIGINT,
+            lambda number, frame: interrupted.append(number))
+    try:
+        saved = time.monotonic() # time of the last snapshot
+        while True:
+            status = run(machine, SNAPSHOT_CHUNK)
+            if status is not None:
+                return status
+            if interrupted or \
+                    time.monotonic() - saved >= SNAPSHOT_INTERVAL:
+                mu0_object.write_file(snapshot_path, machine.snapshot())
+                saved = time.monotonic()
+                if interrupted:
+                    return None
+    finally:
+        signal.signal(signal.SIGINT, handler)
+
+def load_hooks(module):
+    """ Import a module installing instrumentation hooks, given as a module
+        name or as the path of a Python file, and return it.
+
+        The module must define an install(machine) function, adding its
+        hooks to the machine (see mu0_hooks).
     """
-    return '\n'.join(['  @%#0.3x: %#0.3x (dec: %d)'
-        % (l, v if v >= 0 else v + 0x1000, v) # deal with negative 2's compl.
-        for (l, v) in memory.items()])
-
-source_path = ""  # path for the source file
-step = False      # program is executed step by step when True
-line = 1          # source file line counter
-source = []       # instructions
-instructions = [] # regexes to match instructions
-memory = {}       # RAM memory
-acc = 0           # implicit accumulator register
-pc = 0            # program counter
-
-# parse command line arguments
-for s in sys.argv[1:]:
-    if s == "-s":
-        step = True
-    elif s[0] == '-':
-        print("Unrecognized option \"" + s + "\".")
+    import importlib
+    if not module.endswith('.py'):
+        return importlib.import_module(module)
+    import importlib.util
+    name = os.path.splitext(os.path.basename(module))[0]
+    spec = importlib.util.spec_from_file_location(name, module)
+    if spec is None:
+        raise ImportError("cannot load " + module)
+    loaded = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(loaded)
+    except OSError as e:
+        raise ImportError(str(e))
+    return loaded
+
+def main():
+    """ Entry point of the console emulator.
+    """
+    source_path = ""  # path for the source file
+    step = False      # program is executed step by step when True
+    jit = False       # program is translated into Python functions when True
+    accel = False     # iterations of affine loops are skipped when True
+    batch = None      # manifest path, for batch execution
+    workers = None    # number of worker processes for batch execution
+    lanes = False     # batch jobs are run by the vectorized engine when True
+    output_path = None # path for the object image to be written
+    cache = True      # assembled programs are cached when True
+    memo = False      # results of the runs are cached when True
+    profile = False   # an execution profile is shown at the end when True
+    optimize = False  # the program is optimized before running when True
+    snapshot_path = None # path for the snapshots of the machine status
+    resume_path = None # path of the snapshot to resume the execution from
+    trace = None      # path for the execution trace
+    breakpoints = []  # breakpoints, as "LINE" or "LINE if CONDITION"
+    watchpoints = []  # watchpoints, as "ADDRESS" or "ADDRESS:MODE"
+    trace_range = (0, None) # range of instruction counts traced
+    limit = None      # maximum number of instructions
+    timeout = None    # maximum running time, in seconds
+    loops = False     # endless loops are detected when True
+    hooks = []        # modules installing instrumentation hooks
+    address_bits = mu0_core.ADDRESS_BITS # width of the address field
+
+    # parse command line arguments
+    args = iter(sys.argv[1:])
+    for s in args:
+        if s == "-s":
+            step = True
+        elif s == "-j":
+            jit = True
+        elif s == "-a":
+            accel = True
+        elif s == "-O":
+            optimize = True
+        elif s == "-o":
+            output_path = next(args, "")
+            if output_path == "":
+                print("Missing object file parameter.")
+                quit()
+        elif s == "--profile":
+            profile = True
+        elif s == "--snapshot" or s == "--resume":
+            path = next(args, "")
+            if path == "":
+                print("Missing snapshot file parameter.")
+                quit()
+            if s == "--snapshot":
+                snapshot_path = path
+            else:
+                resume_path = path
+        elif s == "--break" or s == "--watch":
+            spec = next(args, "")
+            if spec == "":
+                print("Missing " + s[2:] + "point parameter.")
+                quit()
+            (breakpoints if s == "--break" else watchpoints).append(spec)
+        elif s == "--hook":
+            module = next(args, "")
+            if module == "":
+                print("Missing hook module parameter.")
+                quit()
+            hooks.append(module)
+        elif s == "--trace":
+            trace = next(args, "")
+            if trace == "":
+                print("Missing trace file parameter.")
+                quit()
+        elif s == "--trace-range":
+            try:
+                first, last = next(args, "").split(':')
+                trace_range = (int(first, 0) if first else 0,
+                        int(last, 0) if last else None)
+            except ValueError:
+                print("Invalid trace range (expected FIRST:END).")
+                quit()
+        elif s == "--limit":
+            try:
+                limit = int(next(args, ""), 0)
+            except ValueError:
+                print("Invalid instruction limit.")
+                quit()
+        elif s == "--timeout":
+            try:
+                timeout = float(next(args, ""))
+            except ValueError:
+                print("Invalid timeout.")
+                quit()
+        elif s == "--address-bits":
+            try:
+                address_bits = int(next(args, ""))
+            except ValueError:
+                address_bits = None
+            if address_bits not in mu0_core.ADDRESS_WIDTHS:
+                print("Invalid address width (expected 12, 16 or 24).")
+                quit()
+        elif s == "--detect-loops":
+            loops = True
+        elif s == "--no-cache":
+            cache = False
+        elif s == "--memo":
+            memo = True
+        elif s == "--batch":
+            batch = next(args, "")
+        elif s == "--lanes":
+            lanes = True
+        elif s == "--workers":
+            try:
+                workers = int(next(args, ""))
+            except ValueError:
+                print("Invalid number of workers.")
+                quit()
+        elif s[0] == '-':
+            print("Unrecognized option \"" + s + "\".")
+            quit()
+        elif source_path == "":
+            source_path = s
+
+    if address_bits != mu0_core.ADDRESS_BITS and (step or jit or accel or
+            optimize or profile or memo or loops or breakpoints or
+            watchpoints or batch is not None or output_path is not None or
+            trace is not None):
+        print("The --address-bits option can only be used with --limit, " +
+                "--timeout, --hook, --snapshot and --resume.")
         quit()
-    elif source_path == "":
-        source_path = s
-if len(sys.argv) < 2 or source_path == "":
-    print("Missing source file parameter.")
-    quit()
-
-# ensure the source file exists
-if (not (os.path.exists(source_path) and os.path.isfile(source_path))):
-    print("Source file not found.")
-    quit()
-
-# open source file
-try:
-    source_file = open(source_path, 'r')
-except OSError as e:
-    print("Error opening source file.")
-    quit()
-
-# create regexes to catch instructions lines or comment/blank lines
-instructions = [
-    re.compile('^ *(LOAD) *(0x[0-9A-Fa-f]{1,3}) *(;+ *(.*))?$'),
-    re.compile('^ *(STORE) *(0x[0-9A-Fa-f]{1,3}) *(;+ *(.*))?$'),
-    re.compile('^ *(ADD) *(0x[0-9A-Fa-f]{1,3}) *(;+ *(.*))?$'),
-    re.compile('^ *(SUB) *(0x[0-9A-Fa-f]{1,3}) *(;+ *(.*))?$'),
-    re.compile('^ *(JUMP) *(0x[0-9A-Fa-f]{1,3}) *(;+ *(.*))?$'),
-    re.compile('^ *(JGE) *(0x[0-9A-Fa-f]{1,3}) *(;+ *(.*))?$'),
-    re.compile('^ *(JNE) *(0x[0-9A-Fa-f]{1,3}) *(;+ *(.*))?$'),
-    re.compile('^ *(STOP) *()?(;+ *(.*))?$'), # note the void group
-    re.compile('^ *;+.*$'), # comment line
-    re.compile('^ *$'),    # blank line
-]
-
-# regex for line initializing a value in memory
-initializer = re.compile(
-    '^(INI) *(0x[0-9A-Fa-f]{1,3}) *(0x[0-9A-Fa-f]{1,3}) *(;+.*)?$')
-
-# get lines from file and put instructions in the array
-print("### Parsing source file ...")
-for source_line in source_file:
-    # match initializer lines
-    match = initializer.match(source_line)
-    if match:
-        value = int(match.group(3), 16) # get value from string
-        if value > 0x7FF: # if it is negative, convert from two's complement
-            value = value - 0x1000
-        memory[int(match.group(2), 16)] = value # store value
-        line += 1
-        print("Recognized: " + source_line, end = "")
-        continue
-    # match instruction lines
-    for regex in instructions:
-        match = regex.match(source_line)
-        if match:
-            if len(match.groups()) != 0: # ignore non-instruction lines
-                source.append(dict(
-                    opc = match.group(1), # save opcode
-                    imm = match.group(2), # save immediate
-                    com = match.group(4), # save comment
-                    line = line))         # save source line number
-                print("Recognized: " + source_line, end = "")
-            line += 1
-            break
-    # unrecognized line
-    if match == None:
-        print("Line " + str(line) + ": unrecognized instruction\n   " +
-                source_line, end = "")
+
+    # run a batch of jobs, if requested
+    if batch is not None:
+        if not os.path.isfile(batch):
+            print("Manifest file not found.")
+            quit()
+        if lanes and (jit or memo):
+            print("The --lanes option cannot be used with -j or --memo.")
+            quit()
+        import mu0_batch
+        try:
+            mu0_batch.run(batch, sys.stdout, workers, jit, cache, memo,
+                    limit, timeout, loops, lanes)
+        except ValueError as e:
+            print(e)
+            quit()
+        return
+
+    if lanes:
+        print("The --lanes option can only be used with --batch.")
+        quit()
+    if step + jit + accel + profile + (trace is not None) > 1:
+        print("Only one of the -s, -j, -a, --profile and --trace options " +
+                "can be used.")
+        quit()
+    if snapshot_path is not None and (step or jit):
+        print("The --snapshot option cannot be used with -s or -j.")
+        quit()
+    if (breakpoints or watchpoints) and (jit or accel or profile or memo or
+            trace is not None or snapshot_path is not None):
+        print("The --break and --watch options cannot be used with -j, " +
+                "-a, --profile, --memo, --trace or --snapshot.")
+        quit()
+    if memo and (step or profile or trace is not None or
+            snapshot_path is not None):
+        print("The --memo option cannot be used with -s, --profile, " +
+                "--trace or --snapshot.")
+        quit()
+    if (limit is not None or timeout is not None or loops) and \
+            (step or breakpoints or watchpoints):
+        print("The --limit, --timeout and --detect-loops options cannot " +
+                "be used with -s, --break or --watch.")
+        quit()
+    if loops and (jit or accel or profile or trace is not None):
+        print("The --detect-loops option cannot be used with -j, -a, " +
+                "--profile or --trace.")
+        quit()
+    if hooks and (jit or accel or profile or memo or loops or
+            trace is not None):
+        print("The --hook option cannot be used with -j, -a, --profile, " +
+                "--memo, --trace or --detect-loops.")
+        quit()
+
+    if len(sys.argv) < 2 or source_path == "":
+        print("Missing source file parameter.")
+        quit()
+
+    # ensure the source file exists
+    if (not (os.path.exists(source_path) and os.path.isfile(source_path))):
+        print("Source file not found.")
+        quit()
+
+    # get lines from file and decode the program once, so that no string is
+    # handled while running it (unless the source is an object image, or it
+    # has been assembled before)
+    print("### Parsing source file ...")
+    log = lambda l: print("Recognized: " + l, end = "")
+    try:
+        program, cached = mu0_object.cached_assemble(source_path, log,
+                cache, address_bits)
+    except mu0_asm.SourceSyntaxError as e:
+        for line, content in e.errors:
+            print("Line " + str(line) + ": unrecognized instruction\n   " +
+                    content.rstrip('\n'))
+        quit()
+    except (OSError, ValueError) as e:
+        print("Error opening source file.")
+        quit()
+    if program.address_bits != address_bits:
+        print("Object files can only be run without --address-bits.")
         quit()
+    if cached:
+        print("Loaded assembled program (parsing skipped).")
+
+    # optimize the program, if requested
+    if optimize:
+        import mu0_opt
+        size = len(program)
+        program = mu0_opt.optimize(program)
+        print("\n### Optimized program: " + str(size) + " -> " +
+                str(len(program)) + " instructions.")
+
+    # write the object image, if requested
+    if output_path is not None:
+        try:
+            mu0_object.save(program, output_path)
+        except OSError:
+            print("Error writing object file.")
+            quit()
+        print("\n### Object image written to " + output_path + ".")
+        return
+
+    # import the engine for the run
+    if jit:
+        import mu0_jit
+    if accel:
+        import mu0_accel
+    if memo:
+        import mu0_memo
+    if profile:
+        import mu0_profile
+    if trace is not None:
+        import mu0_trace
+    if limit is not None or timeout is not None or loops:
+        import mu0_runaway
+    debugger = None
+    if step or breakpoints or watchpoints:
+        import mu0_debug
+        debugger = mu0_debug.Debugger(program)
+        try:
+            for spec in breakpoints:
+                debugger.parse_breakpoint(spec)
+            for spec in watchpoints:
+                debugger.parse_watchpoint(spec)
+        except ValueError as e:
+            print(e)
+            quit()
 
-# close source file
-source_file.close()
+    if address_bits == mu0_core.ADDRESS_BITS:
+        machine = mu0_core.Machine(program)
+    else:
+        import mu0_wide
+        machine = mu0_wide.WideMachine(program)
+    for module in hooks:
+        try:
+            load_hooks(module).install(machine)
+        except (ImportError, AttributeError, ValueError) as e:
+            print("Error installing the hooks of " + module + ": " + str(e))
+            quit()
+    if profile:
+        profile = mu0_profile.Profile(program)
 
-print("\n### Memory dump before program execution:")
-print(dump(memory))
+    # restore the status of an interrupted run, if requested
+    if resume_path is not None:
+        try:
+            with open(resume_path, 'rb') as f:
+                machine.restore(f.read())
+        except (OSError, ValueError) as e:
+            print("Error reading snapshot file: " + str(e))
+            quit()
+        print("\n### Resumed after " + str(machine.steps) +
+                " executed instructions.")
 
-# cicle for actual instructions execution
-print("\n### Running the program ...")
-while pc < len(source):
-    opcode = source[pc]['opc']     # opcode for the current instuction
-    line = str(source[pc]['line']) # line number for the current inst.
-    number = pc # instruction number (i.e. PC for the current instruction)
+    print("\n### Memory dump before program execution:")
+    print(machine.dump())
 
-    # check for stop instruction
-    if (opcode == "STOP"):
-        print("\n### Reached STOP instruction at line " + line + ".")
-        break
+    if trace is not None:
+        trace_path = trace
+        try:
+            trace = mu0_trace.Trace(trace_path, *trace_range)
+        except OSError:
+            print("Error opening trace file.")
+            quit()
 
-    # immediate for the current inst., it may be safely set only now
-    immediate = int(source[pc]['imm'], 16)
+    # function running the machine, within the budgets (if any)
+    run = mu0_jit.run if jit else \
+            mu0_accel.run if accel else \
+            profile.run if profile else \
+            trace.run if trace else \
+            type(machine).run
+    if loops:
+        detector = mu0_runaway.CycleDetector()
+        run = detector.run
+    if limit is not None or timeout is not None:
+        run = mu0_runaway.Budget(run, limit, timeout).run
 
-    # access instructions (potentially invalid location)
+    # cicle for actual instructions execution
+    print("\n### Running the program ...")
     try:
-        if (opcode == "LOAD"):
-            acc = memory[immediate]
-        elif (opcode == "ADD"):
-            acc += memory[immediate]
-        elif (opcode == "SUB"):
-            acc -= memory[immediate]
-    except KeyError as e:
-        print("Error at line " + line + ": invalid memory access.")
+        if debugger:
+            status = run_steps(machine, debugger, running = not step)
+        elif snapshot_path is not None:
+            status = run_saving(machine, run, snapshot_path)
+            if status is None:
+                print("\n### Interrupted after " + str(machine.steps) +
+                        " executed instructions, status saved to " +
+                        snapshot_path + ".")
+                return
+        elif memo:
+            status, cached = mu0_memo.run(machine, run,
+                    mu0_memo.Memo(mu0_memo.default_path()), limit)
+            if cached:
+                print("Loaded result of a previous run (execution skipped).")
+        else:
+            status = run(machine)
+    except (mu0_core.MemoryAccessError, mu0_core.WordOverflowError) as e:
+        print("Error at line " + str(e.line) + ": " +
+                ("invalid memory access." if isinstance(e,
+                    mu0_core.MemoryAccessError) else "arithmetic overflow."))
+        if profile:
+            print("\n### Execution profile:")
+            print(profile.report())
         quit()
+    finally:
+        if trace:
+            trace.close()
+            print("\n### Trace of " + str(trace.records) +
+                    " instructions written to " + trace_path + ".")
 
-    # other instructions
-    if (opcode == "STORE"):
-        memory[immediate] = acc
-    elif (opcode == "JUMP"):
-        pc = immediate
-    elif (opcode == "JGE"):
-        if acc >= 0:
-            pc = immediate
-        else:
-            pc += 1
-    elif (opcode == "JNE"):
-        if acc != 0:
-            pc = immediate
-        else:
-            pc += 1
-
-    # increment program counter after each non-jump instruction
-    if opcode != "JUMP" and opcode != "JGE" and opcode != "JNE":
-        pc += 1
-
-    if step: # show status and ask for continuation
-        print("\nExecuted line " + line +
-                ", instr. %#0.3x: %s %#0.3x" % (number, opcode, immediate))
-        print("Comment: " + str(source[number]['com']))
-        print("  Current PC value:  %#0.3x" % (pc))
-        print("  Current ACC value: %#0.3x (dec: %d)"
-                % (acc if acc >= 0 else 0x1000 + acc, acc)) # 2's complement
-        print("Memory dump after instruction execution:")
-        print(dump(memory))
-        input("Press ENTER for next instruction")
-
-# show EOF message (if the program has not been stopped before)
-if pc == len(source):
-    print("\nReached end of instructions.")
-
-# and show a memory dump
-print("\n### Memory dump after program end:")
-print(dump(memory))
+    if status == mu0_core.HALT_STOP:
+        print("\n### Reached STOP instruction at line " +
+                str(machine.line()) + ".")
+    elif status == mu0_core.HALT_LIMIT:
+        print("\n### Instruction limit reached after " +
+                str(machine.steps) + " executed instructions.")
+    elif status == mu0_core.HALT_TIMEOUT:
+        print("\n### Time limit exceeded after " + str(machine.steps) +
+                " executed instructions.")
+    elif status == mu0_core.HALT_LOOP:
+        print("\n### Endless loop: the status at instruction count " +
+                str(detector.start) + " is repeated every " +
+                str(detector.period) + " instructions.")
+
+    # show EOF message (if the program has not been stopped before)
+    if machine.pc == len(program):
+        print("\nReached end of instructions.")
+
+    # and show a memory dump
+    print("\n### Memory dump after program end:")
+    print(machine.dump())
+
+    if profile:
+        print("\n### Execution profile:")
+        print(profile.report())
+
+if __name__ == "__main__":
+    main()
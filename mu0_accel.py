@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_accel.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Closed-form acceleration of affine loops.
+
+    A loop is found for each backward jump, following the instructions
+    from its target (the loop head) until they come back to it: on each
+    conditional jump, one way must stay in the loop and the other must
+    leave it (a STOP counts as leaving).
+
+    An iteration is executed symbolically, expressing each value as the
+    value of a location (or of ACC) at the start of the iteration plus a
+    constant, where the locations only read by the loop are constants. The
+    loop can be accelerated when each location read before being written is
+    translated by a constant at each iteration: all the values are then
+    affine in the iteration number, so the number of iterations before a
+    conditional jump leaves the loop, and the status after them, have a
+    closed form.
+
+    The head of each loop is replaced by a trap, so that the interpreter
+    runs at full speed elsewhere. When the trap is reached, the iterations
+    are skipped, and the interpreter runs the last one, leaving the loop. A
+    loop that cannot be skipped (e.g. since it never leaves) has its trap
+    removed, and runs normally, and so does a loop whose ADD or SUB results
+    would not fit in a word before it leaves, so that the interpreter
+    reports the overflow at the faulting instruction.
+"""
+
+import array
+import sys
+import weakref
+
+from mu0_core import LOAD, STORE, ADD, SUB, JUMP, JGE, JNE, STOP, TRAP, \
+        ADDRESS_MASK, HALT_TRAP, WORD_MIN, WORD_MAX
+
+MAX_LENGTH = 256    # maximum number of instructions in an iteration
+NEVER = sys.maxsize # iterations before a condition that never fails
+ACC = -1            # key for ACC among the memory locations
+
+# accelerators, by machine, so that the analysis is done once for all the
+# calls of run() on a machine (e.g. one per chunk of a budget), and the loops
+# whose trap was removed keep running normally
+_accelerators = weakref.WeakKeyDictionary()
+
+class Loop:
+    """ A loop, as the sequence of instructions executed in an iteration.
+    """
+    def __init__(self, head, path):
+        """
+            head: first instruction of the loop
+            path: (opcode, address, True if a conditional jump stays in the
+                loop when taken) for each instruction of an iteration
+        """
+        self.head = head
+        self.path = path
+        self.length = len(path)
+        self.written = set(a for op, a, _ in path if op == STORE)
+        self.used = set(a for op, a, _ in path if op <= SUB)
+
+    def closed_form(self, constant):
+        """ Execute an iteration symbolically, each value being a pair
+            (location or None, offset), given the function returning the
+            value of each constant location.
+
+            Return None if the loop is not affine, otherwise the value of
+            each location (or ACC) written at the end of the iteration, the
+            condition of each conditional jump as (opcode, True if the loop
+            goes on when taken, ACC value), the step of each location
+            (or ACC) read before being written, and the result of each ADD
+            or SUB.
+        """
+        values = {} # locations written so far
+        live = set() # locations read before being written
+
+        def value(v):
+            if v in values:
+                return values[v]
+            if v == ACC or v in self.written:
+                live.add(v)
+                return (v, 0)
+            return (None, constant(v))
+
+        conditions = []
+        sums = []
+        for op, address, on_taken in self.path:
+            if op == LOAD:
+                values[ACC] = value(address)
+            elif op == STORE:
+                values[address] = value(ACC)
+            elif op == ADD or op == SUB:
+                a = value(ACC)
+                b = value(address)
+                if b[0] is not None and (a[0] is not None or op == SUB):
+                    return None # not a translation
+                variable = a[0] if b[0] is None else b[0]
+                values[ACC] = (variable,
+                        a[1] + b[1] if op == ADD else a[1] - b[1])
+                sums.append(values[ACC])
+            elif op != JUMP:
+                conditions.append((op, on_taken, value(ACC)))
+
+        steps = {}
+        for v in live:
+            variable, offset = values.get(v, (v, 0))
+            if variable != v:
+                return None # not a translation
+            steps[v] = offset
+        return values, conditions, steps, sums
+
+    def iterations(self, conditions, steps, values):
+        """ Return the number of iterations going on, given the conditions
+            and steps from closed_form() and the initial value of each
+            location read before being written.
+        """
+        count = NEVER
+        for op, on_taken, (variable, offset) in conditions:
+            a = offset + (values[variable] if variable is not None else 0)
+            s = steps.get(variable, 0) # slope in the iteration number
+            if op == JGE and on_taken: # goes on while ACC >= 0
+                k = 0 if a < 0 else NEVER if s >= 0 else a // -s + 1
+            elif op == JGE: # goes on while ACC < 0
+                k = 0 if a >= 0 else NEVER if s <= 0 else (-a + s - 1) // s
+            elif on_taken: # JNE, goes on while ACC != 0
+                k = 0 if a == 0 else NEVER if s == 0 or -a % s or \
+                        -a // s < 0 else -a // s
+            else: # JNE, goes on while ACC == 0
+                k = 0 if a != 0 else NEVER if s == 0 else 1
+            count = min(count, k)
+        return count
+
+    def skip(self, machine, limit = None):
+        """ Skip the iterations of the loop going on from the status of the
+            machine (at the loop head), executing at most limit instructions.
+
+            Return False if the loop cannot be skipped (it is not affine, it
+            never leaves and no limit is given, or a result would overflow),
+            True otherwise.
+        """
+        machine.own()
+        valid = machine.valid
+        memory = machine.memory
+        for a in self.used:
+            if not valid[a]:
+                return True # let the interpreter fault or initialize it
+        form = self.closed_form(lambda a: memory[a])
+        if form is None:
+            return False
+        final, conditions, steps, sums = form
+        values = dict((v, machine.acc if v == ACC else memory[v])
+                for v in steps)
+
+        count = self.iterations(conditions, steps, values)
+        if limit is not None:
+            count = min(count, limit // self.length)
+        elif count == NEVER:
+            return False
+        if count == 0:
+            return True
+
+        # the results are affine in the iteration number, so they fit in a
+        # word in all the iterations if they do in the first and in the last
+        for variable, offset in sums:
+            if variable is None:
+                head = tail = offset
+            else:
+                head = offset + values[variable]
+                tail = head + (count - 1) * steps[variable]
+            if not (WORD_MIN <= head <= WORD_MAX and
+                    WORD_MIN <= tail <= WORD_MAX):
+                return False
+
+        # status at the end of the last iteration skipped, from the values
+        # at its start
+        last = dict((v, values[v] + (count - 1) * s)
+                for v, s in steps.items())
+        for v, (variable, offset) in final.items():
+            value = offset + (last[variable] if variable is not None else 0)
+            if v == ACC:
+                machine.acc = value
+            else:
+                memory[v] = value
+                machine.dirty.add(v)
+        machine.steps += count * self.length
+        return True
+
+def analyze(code, head, end):
+    """ Return the Loop starting at head and closed by the jump at end, or
+        None if the loop has an unsupported shape.
+    """
+    n = len(code)
+    path = []
+    i = head
+    while len(path) < MAX_LENGTH:
+        word = code[i]
+        op = word >> 12
+        address = word & ADDRESS_MASK
+        if op <= SUB:
+            path.append((op, address, None))
+            i += 1
+        elif op == JUMP:
+            path.append((op, address, None))
+            i = address
+        elif op == JGE or op == JNE:
+            # exactly one way must stay in the loop
+            inside = [t for t in (address, i + 1)
+                    if head <= t <= end and code[t] >> 12 != STOP]
+            if len(inside) != 1:
+                return None
+            path.append((op, address, inside[0] == address))
+            i = inside[0]
+        else:
+            return None # STOP (or a trap)
+        if i == head:
+            loop = Loop(head, path)
+            return loop if loop.closed_form(lambda a: 0) else None
+        if not head <= i <= end or i >= n:
+            return None
+    return None
+
+class Accelerator:
+    """ Affine loops of a program, with a copy of its code where the head of
+        each loop is replaced by a trap.
+    """
+    def __init__(self, program):
+        self.program = program
+        code = program.code
+        # for each loop head, the last backward jump to it
+        ends = {}
+        for i, word in enumerate(code):
+            op = word >> 12
+            target = word & ADDRESS_MASK
+            if (op == JUMP or op == JGE or op == JNE) and target <= i:
+                ends[target] = i
+        self.loops = {}
+        for head, end in ends.items():
+            loop = analyze(code, head, end)
+            if loop is not None:
+                self.loops[head] = loop
+        self.code = array.array('H', code)
+        for head in self.loops:
+            self.code[head] = TRAP << 12 | (code[head] & ADDRESS_MASK)
+
+def run(machine, limit = None):
+    """ Same as machine.run(limit), skipping the iterations of affine loops.
+    """
+    accelerator = _accelerators.get(machine)
+    if accelerator is None or accelerator.program is not machine.program:
+        accelerator = _accelerators[machine] = \
+                Accelerator(machine.program)
+    original = machine.code
+    code = machine.code = accelerator.code
+    last = machine.steps + limit if limit is not None else None
+    try:
+        while True:
+            status = machine.run(None if last is None else
+                    last - machine.steps)
+            if status != HALT_TRAP:
+                return status
+            pc = machine.pc
+            if not accelerator.loops[pc].skip(machine,
+                    None if last is None else last - machine.steps):
+                code[pc] = original[pc] # run it normally from now on
+            if last is not None and machine.steps >= last:
+                return None
+            # the first instruction of the last iteration
+            status = machine.execute(original[pc])
+            if status is not None:
+                return status
+    finally:
+        machine.code = original
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_asm.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Assembler for mu0 source files.
+"""
+
+import array
+import bisect
+
+import mu0_core
+
+# version of the assembler, to be increased whenever the programs it decodes
+# from the same source change (the cached object images are keyed by it)
+VERSION = 2
+
+class SourceSyntaxError(RuntimeError):
+    """ Exception to be risen when the source file contains syntax errors.
+    """
+    def __init__(self, errors):
+        """
+            errors: list of (line number, line content) for each line
+                causing the exception
+        """
+        RuntimeError.__init__(self, '\n'.join(
+            ["Line " + str(l) + ": unrecognized instruction"
+                for l, _ in errors]))
+        self.errors = errors
+        self.line, self.line_content = errors[0] # first error
+
+# regex matching any valid line: an instruction, an initializer, a comment
+# line or a blank line
+LINE_PATTERN = (
+    '^\\s*' + # leading whitespace
+    '(?:' +
+        '(LOAD|LDA|STORE|STO|ADD|SUB|JUMP|JMP|JGE|JNE)' + # instruction name
+        '\\s*' +
+        '(0x[0-9A-Fa-f]{1,3})' + # operand
+    '|' +
+        '(STOP)' + # instruction without operand
+    '|' +
+        'INI' + # initializer
+        '\\s*' +
+        '(0x[0-9A-Fa-f]{1,3})' + # location
+        '\\s*' +
+        '(0x[0-9A-Fa-f]{1,3})' + # value
+    ')?' +
+    '\\s*' +
+    '(?:;+\\s*(.*))?$') # comment
+
+# regex for a valid operand
+OPERAND_PATTERN = '0x[0-9A-Fa-f]{1,3}$'
+
+_regexes = {} # compiled regexes, by pattern
+
+def regex(pattern):
+    """ Return the compiled regex (ignoring case) for a pattern.
+
+        Regexes are compiled, and the re module imported, when first used,
+        so that importing the assembler is cheap.
+    """
+    compiled = _regexes.get(pattern)
+    if compiled is None:
+        import re
+        compiled = _regexes[pattern] = re.compile(pattern, flags = re.I)
+    return compiled
+
+def assemble(source_file, log = None, address_bits = mu0_core.ADDRESS_BITS):
+    """ Parse a source (any iterable of lines, read in a single streaming
+        pass) and return the decoded Program.
+
+        Lines are split into whitespace separated tokens, and only the lines
+        not in the common forms (e.g. with no space between the mnemonic and
+        the operand, or invalid) are matched against LINE_PATTERN.
+
+        Each recognized line containing an instruction or an initializer is
+        passed to the log function, if any. A SourceSyntaxError listing all
+        the unrecognized lines is risen at the end of the source, if any
+        line was not recognized.
+
+        With a wider address_bits (see mu0_core.ADDRESS_WIDTHS), operands,
+        locations and values have up to address_bits / 4 hex digits, and the
+        program is run by a mu0_wide.WideMachine.
+    """
+    program = mu0_core.Program(address_bits)
+    memory = program.data
+    errors = []
+    code = program.code.append
+    lines = program.lines.append
+    comments = program.comments.append
+    # opcode of each mnemonic, shifted in place in the instruction word
+    opcodes = dict((m, o << address_bits)
+            for m, o in mu0_core.OPCODES.items())
+    stop = opcodes.pop('STOP')
+    operands = {} # value of the operands already seen
+    line_pattern = LINE_PATTERN
+    operand_pattern = OPERAND_PATTERN
+    if address_bits != mu0_core.ADDRESS_BITS:
+        digits = '{1,%d}' % (address_bits // 4)
+        line_pattern = line_pattern.replace('{1,3}', digits)
+        operand_pattern = operand_pattern.replace('{1,3}', digits)
+    operand = regex(operand_pattern).match
+    sign = 1 << (address_bits - 1) # values from here on are negative
+
+    for line, source_line in enumerate(source_file, 1):
+        text, semicolon, comment = source_line.partition(';')
+        tokens = text.split()
+        n = len(tokens)
+        if n == 0: # comment or blank line
+            continue
+
+        # get operands (None if invalid)
+        args = []
+        for token in tokens[1:]:
+            value = operands.get(token)
+            if value is None and operand(token):
+                value = operands[token] = int(token, 16)
+            args.append(value)
+
+        word = None # instruction word
+        mnemonic = tokens[0].upper()
+        if n == 2 and mnemonic in opcodes and args[0] is not None:
+            word = opcodes[mnemonic] | args[0]
+        elif n == 1 and mnemonic == 'STOP':
+            word = stop
+        elif n == 3 and mnemonic == 'INI' and None not in args:
+            location, value = args
+        else:
+            # uncommon form, or invalid line
+            m = regex(line_pattern).match(source_line)
+            if m is None:
+                errors.append((line, source_line))
+                continue
+            opc, imm, is_stop, location, value, _ = m.groups()
+            if opc is not None:
+                word = opcodes[opc.upper()] | int(imm, 16)
+            elif is_stop is not None:
+                word = stop
+            else:
+                location = int(location, 16)
+                value = int(value, 16)
+
+        if word is None:
+            if value >= sign: # if it is negative, convert from 2's complement
+                value = value - 2 * sign
+            memory[location] = value # store value
+        else:
+            code(word)
+            lines(line)
+            # same as the comment group in LINE_PATTERN
+            comments(comment.lstrip(';').lstrip().rstrip('\n')
+                    if semicolon else None)
+        if log:
+            log(source_line)
+
+    if errors:
+        raise SourceSyntaxError(errors)
+    return program
+
+def decode_line(source_line):
+    """ Decode a single source line, and return None for a blank or comment
+        line, (instruction word, comment) for an instruction, or (None,
+        (location, value)) for an initializer. A SourceSyntaxError is risen
+        if the line is not recognized.
+    """
+    program = assemble((source_line,))
+    if program.code:
+        return program.code[0], program.comments[0]
+    if program.data:
+        return None, program.data.popitem()
+    return None
+
+def decode_lines(source_lines):
+    """ Return the list of the decoded lines in a list of source lines, each
+        as returned by decode_line, or False if it is not recognized.
+
+        The lines are decoded with a single assembler pass, unless some of
+        them are initializers (whose decoded form is not kept by the
+        program) or they are not recognized.
+    """
+    decoded = [None] * len(source_lines)
+    try:
+        program = assemble(source_lines)
+    except SourceSyntaxError as e:
+        for line, _ in e.errors:
+            decoded[line - 1] = False
+    else:
+        for word, line, comment in zip(program.code, program.lines,
+                program.comments):
+            decoded[line - 1] = (word, comment)
+        if not program.data:
+            return decoded
+    # decode one at a time the lines left
+    for i, source_line in enumerate(source_lines):
+        if decoded[i] is None and source_line.partition(';')[0].strip():
+            try:
+                decoded[i] = decode_line(source_line)
+            except SourceSyntaxError:
+                decoded[i] = False
+    return decoded
+
+class IncrementalAssembler:
+    """ Assembler for a source which is being edited, keeping the decoded
+        program up to date with the changes of the source.
+
+        At each update, only the block of lines between the unchanged head
+        and tail of the source is decoded again, and the instructions of the
+        block are replaced in place in the decoded program.
+    """
+    def __init__(self):
+        self.text = []       # source lines, as of the last update
+        self.source = []     # decoded form of each line (see decode_lines)
+        self.errors = []     # (line number, content) of unrecognized lines
+        self.inits = []      # line numbers of the initializers
+        self.code = array.array('H') # instruction words
+        self.lines = []      # source line for each instruction
+        self.comments = []   # comment for each instruction
+        self._program = None # copy of the program, for the last update
+
+    def update(self, source_lines):
+        """ Update the source (a list of lines), and return the list of the
+            unrecognized lines, as (line number, content).
+        """
+        text = self.text
+        if source_lines == text:
+            return self.errors
+        # find the changed block, between the unchanged head and tail
+        n = min(len(text), len(source_lines))
+        start = 0
+        while start < n and text[start] == source_lines[start]:
+            start += 1
+        tail = 0
+        while tail < n - start and text[-1 - tail] == source_lines[-1 - tail]:
+            tail += 1
+        end = len(text) - tail          # end of the block in the old source
+        new_end = len(source_lines) - tail # end of the block in the new one
+        shift = new_end - end
+        block = decode_lines(source_lines[start:new_end])
+
+        # replace the instructions of the block, shifting the line numbers
+        # of the following ones
+        first = bisect.bisect_right(self.lines, start)
+        last = bisect.bisect_right(self.lines, end, first)
+        code = [d[0] for d in block if d and d[0] is not None]
+        self.code[first:last] = array.array('H', code)
+        self.comments[first:last] = [d[1] for d in block
+                if d and d[0] is not None]
+        self.lines[first:] = [line for line, d in
+                enumerate(block, start + 1) if d and d[0] is not None] + \
+                ([l + shift for l in self.lines[last:]] if shift else
+                self.lines[last:])
+
+        def renumber(numbers, added):
+            """ Replace the line numbers in the block with the added ones.
+            """
+            return [l for l in numbers if l <= start] + added + \
+                    [l + shift for l in numbers if l > end]
+        self.inits = renumber(self.inits, [line for line, d in
+                enumerate(block, start + 1) if d and d[0] is None])
+        errors = renumber([line for line, _ in self.errors], [line for
+                line, d in enumerate(block, start + 1) if d is False])
+
+        self.text = source_lines
+        self.source[start:end] = block
+        self.errors = [(line, source_lines[line - 1]) for line in errors]
+        self._program = None
+        return self.errors
+
+    def program(self):
+        """ Return the decoded Program for the last update, raising a
+            SourceSyntaxError if any line was not recognized.
+
+            The program is a copy, which is not changed by later updates.
+        """
+        if self.errors:
+            raise SourceSyntaxError(self.errors)
+        if self._program is None:
+            program = self._program = mu0_core.Program()
+            program.code = array.array('H', self.code)
+            program.lines = list(self.lines)
+            program.comments = list(self.comments)
+            for line in self.inits:
+                location, value = self.source[line - 1][1]
+                program.data[location] = value
+        return self._program
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_batch.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Parallel execution of batches of mu0 jobs.
+
+    A manifest file contains a JSON object for each line, describing a job
+    as the program to run and the memory locations to initialize in addition
+    to the INI ones, e.g.:
+
+        {"id": "19/5", "program": "sample_program.asm",
+         "memory": {"0x100": "0x13", "0x101": 5}}
+
+    Optional fields are "limit" (maximum number of instructions), "timeout"
+    (maximum running time, in seconds) and "detect_loops" (halt the endless
+    loops repeating the status of the machine), overriding the values given
+    for the whole batch.
+
+    Program paths are relative to the manifest. Each program is assembled
+    once, and the decoded programs are handed to the pool of worker
+    processes when the workers start, so that jobs only carry the memory
+    image and the budget. The result of each job is written as a line of JSON.
+
+    With the lanes engine, the jobs of each program (with the same limit, no
+    timeout and no detection of loops) are run together in a single process
+    by mu0_lanes, as the lanes of a vectorized machine, and the other jobs
+    by the pool. The engine needs NumPy: without it, all the jobs are run
+    by the pool.
+"""
+
+import concurrent.futures
+import json
+import os.path
+
+import mu0_asm
+import mu0_core
+import mu0_jit
+import mu0_lanes
+import mu0_memo
+import mu0_object
+import mu0_runaway
+
+# status of a worker process
+_programs = {} # decoded programs (or assembly error messages), by path
+_jit = False   # run the programs with the JIT translator when True
+_memo = None   # cache of the results, if used
+
+def _init_worker(programs, jit, memo_path = None):
+    """ Initialize a worker process of the pool.
+    """
+    global _programs, _jit, _memo
+    _programs = programs
+    _jit = jit
+    _memo = mu0_memo.Memo(memo_path) if memo_path is not None else None
+
+def parse_value(value):
+    """ Return the integer for a value in a manifest, given either as an
+        integer (fitting in a word) or as a hexadecimal string (in 2's
+        complement on 12 bits, as for INI), raising ValueError if it is out
+        of range.
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        if not mu0_core.WORD_MIN <= value <= mu0_core.WORD_MAX:
+            raise ValueError("value out of range: %d" % value)
+        return value
+    if not isinstance(value, str):
+        raise ValueError("invalid value: %r" % (value,))
+    number = int(value, 16)
+    if not 0 <= number <= 0xFFF:
+        raise ValueError("value out of range: %s" % value)
+    if number > 0x7FF: # if it is negative, convert from 2's complement
+        number = number - 0x1000
+    return number
+
+def parse_image(memory):
+    """ Return the memory image (address -> value) for the memory
+        dictionary of a manifest entry.
+    """
+    image = {}
+    for address, value in memory.items():
+        address = int(address, 16)
+        if not 0 <= address < mu0_core.MEMORY_SIZE:
+            raise ValueError("address out of range: %#x" % address)
+        image[address] = parse_value(value)
+    return image
+
+def run_machine(machine, jit = False, limit = None, timeout = None,
+        detector = None):
+    """ Run a machine until it halts, and return the reason why it halted.
+
+        jit: run the translated program when True
+        limit: maximum number of instructions (HALT_LIMIT is returned when
+            they are executed)
+        timeout: maximum running time in seconds (HALT_TIMEOUT is returned
+            when it is exceeded)
+        detector: CycleDetector halting the endless loops with HALT_LOOP,
+            if any (the program is interpreted, even if jit is True)
+    """
+    run = detector.run if detector is not None else \
+            mu0_jit.run if jit else mu0_core.Machine.run
+    if limit is None and timeout is None:
+        return run(machine)
+    return mu0_runaway.Budget(run, limit, timeout).run(machine)
+
+def run_program(program, image, jit = False, limit = None, timeout = None,
+        memo = None, loops = False):
+    """ Run a program from the given memory image (in addition to the INI
+        locations), and return the result as a dictionary with the reason
+        why it halted, the line of the STOP instruction (or of the faulting
+        one), ACC, PC, the number of executed instructions and the final
+        memory (and the start and period of the loop, for an endless loop).
+
+        The parameters are the same as for run_machine(), memo is the Memo
+        caching the results, if any, and the endless loops are detected
+        when loops is True.
+    """
+    machine = mu0_core.Machine(program)
+    for address, value in image.items():
+        machine.write(address, value)
+    detector = mu0_runaway.CycleDetector() if loops else None
+    line = None
+    try:
+        if memo is not None:
+            status = mu0_memo.run(machine, lambda m, limit:
+                    run_machine(m, jit, limit, timeout, detector),
+                    memo, limit)[0]
+        else:
+            status = run_machine(machine, jit, limit, timeout, detector)
+        if status == mu0_core.HALT_STOP:
+            line = machine.line()
+    except mu0_core.MemoryAccessError as e:
+        status = mu0_core.HALT_FAULT
+        line = e.line
+    except mu0_core.WordOverflowError as e:
+        status = mu0_core.HALT_OVERFLOW
+        line = e.line
+
+    result = machine_result(machine, status, line)
+    if status == mu0_core.HALT_LOOP:
+        result.update(loop_start = detector.start,
+                loop_period = detector.period)
+    return result
+
+def machine_result(machine, status, line):
+    """ Return the result of a job run by a machine, given the reason why
+        it halted and the related line (see run_program()).
+    """
+    return dict(
+            status = status,
+            line = line,
+            acc = machine.acc,
+            pc = machine.pc,
+            steps = machine.steps,
+            memory = dict(('%#0.3x' % a, machine.memory[a])
+                for a in machine.order))
+
+def run_lanes(program, images, limit = None):
+    """ Run a program from each of the given memory images, as the lanes of
+        a mu0_lanes.Lanes, and return the list of the results (as for
+        run_program()), where the lanes still running after limit
+        instructions halt with HALT_LIMIT.
+    """
+    lanes = mu0_lanes.run(program, images, limit)
+    results = []
+    for lane in range(len(lanes)):
+        machine = lanes.machine(lane)
+        status = lanes.result(lane)
+        if status is None:
+            status = mu0_core.HALT_LIMIT
+        line = None if status in (mu0_core.HALT_END, mu0_core.HALT_LIMIT) \
+                else machine.line()
+        results.append(machine_result(machine, status, line))
+    return results
+
+def run_job(job):
+    """ Run a job, given as (id, program name, program path, memory image,
+        budget), where the budget is (limit, timeout, loops) as for
+        run_program(), and return its result as a dictionary (with status
+        'error' and a message if the job could not be run).
+    """
+    job_id, name, path, image, (limit, timeout, loops) = job
+    result = dict(id = job_id, program = name)
+    program = _programs[path]
+    if isinstance(program, str): # the program could not be assembled
+        result.update(status = 'error', error = program)
+        return result
+    try:
+        result.update(run_program(program, image, _jit, limit, timeout,
+            _memo, loops))
+    except Exception as e:
+        # a failing job must not take the results of the others with it
+        result.update(status = 'error', error = str(e) or type(e).__name__)
+    return result
+
+def parse_budget(entry, limit = None, timeout = None, loops = False):
+    """ Return the budget (limit, timeout, loops) of a manifest entry, with
+        the given values as defaults.
+    """
+    limit = entry.get('limit', limit)
+    timeout = entry.get('timeout', timeout)
+    if limit is not None and (isinstance(limit, bool) or
+            not isinstance(limit, int) or limit < 0):
+        raise ValueError("invalid limit")
+    if timeout is not None and (isinstance(timeout, bool) or
+            not isinstance(timeout, (int, float)) or timeout < 0):
+        raise ValueError("invalid timeout")
+    return limit, timeout, bool(entry.get('detect_loops', loops))
+
+def load(manifest_path, cache = True, limit = None, timeout = None,
+        loops = False):
+    """ Read a manifest, assemble its programs (or load them from the cache
+        of assembled programs), and return the jobs and the dictionary of
+        the decoded programs.
+
+        The budget of the jobs not giving their own is set by limit, timeout
+        and loops (see run_program()).
+    """
+    base = os.path.dirname(manifest_path)
+    jobs = []
+    programs = {}
+    with open(manifest_path, 'r') as manifest:
+        for number, text in enumerate(manifest, 1):
+            if not text.strip():
+                continue
+            try:
+                entry = json.loads(text)
+                name = entry['program']
+                image = parse_image(entry.get('memory', {}))
+                budget = parse_budget(entry, limit, timeout, loops)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                raise ValueError("Manifest line %d: invalid job (%s)"
+                        % (number, e))
+            path = os.path.join(base, name)
+            if path not in programs:
+                try:
+                    programs[path] = mu0_object.cached_assemble(
+                            path, cache = cache)[0]
+                except (OSError, ValueError, mu0_asm.SourceSyntaxError) as e:
+                    programs[path] = str(e)
+            jobs.append((entry.get('id', number), name, path, image, budget))
+    return jobs, programs
+
+def lane_results(jobs, programs):
+    """ Run the jobs fit for the lanes engine (see run_lanes()), grouped by
+        program and limit, and return their results by position in the
+        list of jobs.
+    """
+    groups = {}
+    for i, (job_id, name, path, image, budget) in enumerate(jobs):
+        limit, timeout, loops = budget
+        if timeout is None and not loops and \
+                not isinstance(programs[path], str):
+            groups.setdefault((path, limit), []).append(i)
+    results = {}
+    for (path, limit), indices in groups.items():
+        for i, result in zip(indices, run_lanes(programs[path],
+                [jobs[i][3] for i in indices], limit)):
+            job_id, name = jobs[i][:2]
+            results[i] = dict(id = job_id, program = name)
+            results[i].update(result)
+    return results
+
+def run(manifest_path, output, workers = None, jit = False, cache = True,
+        memo = False, limit = None, timeout = None, loops = False,
+        lanes = False):
+    """ Run all the jobs in a manifest over a pool of worker processes,
+        writing the results (in the manifest order) to the output stream.
+
+        When memo is True, the results are cached (see mu0_memo), so that
+        repeated jobs are not run again. The limit, timeout and loops
+        parameters give the budget of the jobs not setting their own. When
+        lanes is True (and NumPy is available), the jobs fit for it are run
+        by the lanes engine instead (see lane_results()), without caching
+        their results.
+    """
+    jobs, programs = load(manifest_path, cache, limit, timeout, loops)
+    workers = workers or os.cpu_count() or 1
+    memo_path = mu0_memo.default_path() if memo else None
+
+    done = {} # results of the jobs run by the lanes engine, by position
+    if lanes and mu0_lanes.np is not None:
+        done = lane_results(jobs, programs)
+    pending = [job for i, job in enumerate(jobs) if i not in done]
+
+    def write(results):
+        for i in range(len(jobs)):
+            result = done[i] if i in done else next(results)
+            output.write(json.dumps(result) + '\n')
+
+    if workers == 1 or not pending:
+        _init_worker(programs, jit, memo_path)
+        write(map(run_job, pending))
+        return
+
+    # send a few chunks of jobs to each worker, to limit the overhead
+    chunksize = max(1, len(pending) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers = workers,
+            initializer = _init_worker,
+            initargs = (programs, jit, memo_path)) as pool:
+        write(pool.map(run_job, pending, chunksize = chunksize))
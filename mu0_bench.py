@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_bench.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Benchmark suite for the mu0 assembler and emulator.
+
+    Synthetic workloads are generated and measured for assembly speed
+    (source lines per second), execution speed (instructions per second)
+    with each engine, and peak memory allocated (measured with tracemalloc,
+    in a separate run, since tracing slows down the execution). The
+    engines are the console interpreter, the JIT translator and the step
+    logic of the graphical interface (Application.runInstruction, run in a
+    withdrawn window, when Tk can be started).
+
+    Results can be saved as a JSON baseline, and later runs compared to it:
+
+        python mu0_bench.py --save baseline.json
+        python mu0_bench.py --compare baseline.json
+
+    Other options are --scale F (scale factor for the workload sizes),
+    --repeat N (timed runs, the best is kept) and --tolerance T (relative
+    change reported as a regression, 0.25 by default). The comparison exits
+    with status 1 if any regression is found.
+"""
+
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import mu0_asm
+import mu0_core
+import mu0_history
+import mu0_jit
+
+# the step logic of the GUI is measured only if Tk is available
+try:
+    import tkinter
+except ImportError:
+    mu0_graphic = None
+else:
+    import mu0_graphic
+
+TOLERANCE = 0.25 # relative change reported as a regression
+MIN_TIME = 0.2   # minimum duration of a timed run, in seconds
+
+def division_source():
+    """ Return the source of the division in sample_program.asm.
+    """
+    return ("INI 0x100 0x13\nINI 0x101 0x5\nINI 0x102 0x1\n" +
+            "INI 0x103 0x0\nINI 0x104 0x0\n" +
+            "LOAD 0x100\nSTORE 0x103\nLOAD 0x103\nSUB 0x101\nJGE 0x6\n" +
+            "STOP\nSTORE 0x103\nLOAD 0x104\nADD 0x102\nSTORE 0x104\n" +
+            "JUMP 0x2\n")
+
+def counting_source():
+    """ Return the source of a tight loop counting down to zero.
+    """
+    return ("INI 0x100 0x0 ; counter\nINI 0x101 0x1\n" +
+            "LOAD 0x100\nSUB 0x101\nSTORE 0x100\nJNE 0x0\nSTOP\n")
+
+def store_source():
+    """ Return the source of a loop writing several locations at each
+        iteration.
+    """
+    return ("INI 0x100 0x0 ; counter\nINI 0x101 0x1\n" +
+            "LOAD 0x100\nSUB 0x101\nSTORE 0x100\n" +
+            "STORE 0x200\nSTORE 0x201\nSTORE 0x202\nSTORE 0x203\n" +
+            "JNE 0x0\nSTOP\n")
+
+def straight_source(lines):
+    """ Return a straight-line source with the given number of lines,
+        mixing instructions, comments and blank lines.
+    """
+    body = ["INI 0x100 0x7 ; initial value", "INI 0x101 0x1"]
+    pattern = ["LOAD 0x100 ; load", "ADD  0x101", "STORE 0x100",
+            "", "; comment line", "sub 0x101", "Store 0x102 ; lower case"]
+    while len(body) < lines - 1:
+        body.append(pattern[len(body) % len(pattern)])
+    body.append("STOP")
+    return '\n'.join(body) + '\n'
+
+def workloads(scale = 1.):
+    """ Return the workloads, as tuples (name, source, memory image to be
+        written before running, maximum number of instructions for the GUI
+        engine).
+    """
+    n = int(100000 * scale)
+    return [
+        ('division', division_source(), {0x100: 3 * n, 0x101: 3}, 20000),
+        ('counting', counting_source(), {0x100: 2 * n}, 20000),
+        ('store', store_source(), {0x100: n}, 20000),
+        ('straight', straight_source(2 * n), {}, 20000),
+    ]
+
+_application = None # Application running the GUI step logic
+
+def application():
+    """ Return the Application running the step logic of the GUI, in a
+        withdrawn window (created at the first call), or None if Tk is not
+        available or cannot be started (e.g. without a display).
+    """
+    global _application
+    if _application is None and mu0_graphic is not None:
+        try:
+            root = tkinter.Tk()
+        except tkinter.TclError:
+            return None
+        root.withdraw()
+        _application = mu0_graphic.Application(master = root)
+    return _application
+
+def _machine(program, image):
+    """ Return a new machine for a program, with an initial memory image.
+    """
+    machine = mu0_core.Machine(program)
+    for address, value in image.items():
+        machine.write(address, value)
+    return machine
+
+def run_interpreter(program, image, limit):
+    """ Run a program with the interpreter, and return the number of
+        executed instructions.
+    """
+    machine = _machine(program, image)
+    machine.run()
+    return machine.steps
+
+def run_jit(program, image, limit):
+    """ Run a program with the JIT translator, and return the number of
+        executed instructions.
+    """
+    machine = _machine(program, image)
+    mu0_jit.run(machine)
+    return machine.steps
+
+def run_jit_cold(program, image, limit):
+    """ Same as run_jit(), translating the program from scratch, as for the
+        first run of a program.
+    """
+    mu0_jit.clear_cache()
+    return run_jit(program, image, limit)
+
+def run_gui(program, image, limit):
+    """ Run at most limit instructions of a program with the step logic of
+        the GUI, and return the number of executed instructions.
+    """
+    app = application()
+    app.resetProgramStatus()
+    app.machine = _machine(program, image)
+    app.history = mu0_history.History(app.machine)
+    try:
+        while app.machine.steps < limit:
+            app.runInstruction()
+    except mu0_graphic.ExecutionComplete:
+        pass
+    return app.machine.steps
+
+ENGINES = [
+    ('interpreter', run_interpreter),
+    ('jit', run_jit),
+    ('jit-cold', run_jit_cold),
+    ('gui', run_gui),
+]
+
+def measure(function, repeat):
+    """ Time a function, and return the best time per call over repeat
+        timed runs, the result of the last call, and the peak of the memory
+        allocated by a further call.
+
+        Each timed run calls the function enough times to last at least
+        MIN_TIME, so that short benchmarks are timed accurately.
+    """
+    number = 1 # calls for each timed run
+    best = None
+    runs = 0
+    while runs < repeat:
+        start = time.perf_counter()
+        for _ in range(number):
+            result = function()
+        elapsed = time.perf_counter() - start
+        if elapsed < MIN_TIME and best is None:
+            # too short, calibrate the number of calls
+            number = max(number + 1, int(number * 1.2 * MIN_TIME /
+                max(elapsed, 1e-6)))
+            continue
+        runs += 1
+        best = elapsed / number if best is None else \
+                min(best, elapsed / number)
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, result, peak
+
+def run(scale = 1., repeat = 3, log = None):
+    """ Run the benchmarks, and return the results as a dictionary
+        benchmark name -> dict(rate, unit, peak).
+    """
+    results = {}
+    def record(name, rate, unit, peak):
+        results[name] = dict(rate = rate, unit = unit, peak = peak)
+        if log:
+            log(name, results[name])
+
+    for name, source, image, gui_limit in workloads(scale):
+        lines = source.count('\n')
+        elapsed, program, peak = measure(
+                lambda: mu0_asm.assemble(io.StringIO(source)), repeat)
+        record(name + '/assemble', lines / elapsed, 'lines/s', peak)
+
+        for engine, function in ENGINES:
+            if engine == 'gui' and application() is None:
+                continue
+            limit = gui_limit if engine == 'gui' else None
+            elapsed, steps, peak = measure(
+                    lambda: function(program, image, limit), repeat)
+            record(name + '/' + engine, steps / elapsed,
+                    'instructions/s', peak)
+    return results
+
+def compare(results, baseline, tolerance = TOLERANCE):
+    """ Return the list of regressions of the results with respect to a
+        baseline, as tuples (benchmark, quantity, baseline value, value).
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['rate'] < base['rate'] * (1 - tolerance):
+            regressions.append((name, 'rate', base['rate'], result['rate']))
+        if result['peak'] > base['peak'] * (1 + tolerance):
+            regressions.append((name, 'peak', base['peak'], result['peak']))
+    return regressions
+
+def main():
+    """ Entry point of the benchmark suite.
+    """
+    save_path = None    # path for the baseline to be written
+    compare_path = None # path for the baseline to compare with
+    scale = 1.          # scale factor for the workload sizes
+    repeat = 3          # timed runs for each benchmark (the best is kept)
+    tolerance = TOLERANCE # relative change reported as a regression
+
+    # parse command line arguments
+    args = iter(sys.argv[1:])
+    for s in args:
+        try:
+            if s == "--save":
+                save_path = next(args)
+            elif s == "--compare":
+                compare_path = next(args)
+            elif s == "--scale":
+                scale = float(next(args))
+            elif s == "--repeat":
+                repeat = max(1, int(next(args)))
+            elif s == "--tolerance":
+                tolerance = float(next(args))
+            else:
+                print("Unrecognized option \"" + s + "\".")
+                quit()
+        except (StopIteration, ValueError):
+            print("Missing or invalid parameter for option \"" + s + "\".")
+            quit()
+
+    baseline = None
+    if compare_path is not None:
+        try:
+            with open(compare_path, 'r') as f:
+                baseline = json.load(f)['results']
+        except (OSError, ValueError, KeyError):
+            print("Error reading baseline file.")
+            quit()
+
+    print("%-24s %16s %-16s %10s" % ("Benchmark", "Rate", "", "Peak KiB"))
+    def log(name, result):
+        print("%-24s %16.0f %-16s %10.0f" % (name, result['rate'],
+            result['unit'], result['peak'] / 1024.), end = "")
+        if baseline is not None and name in baseline:
+            print("  (%+.1f%%)" % (
+                100. * (result['rate'] / baseline[name]['rate'] - 1)), end = "")
+        print()
+    results = run(scale, repeat, log)
+
+    if save_path is not None:
+        with open(save_path, 'w') as f:
+            json.dump(dict(
+                python = platform.python_version(),
+                platform = platform.platform(),
+                scale = scale,
+                results = results), f, indent = 1, sort_keys = True)
+            f.write('\n')
+        print("\nBaseline written to " + save_path + ".")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, tolerance)
+        for name, quantity, old, new in regressions:
+            print("Regression in %s: %s %.0f -> %.0f" % (
+                name, quantity, old, new))
+        if regressions:
+            sys.exit(1)
+        print("\nNo regressions with respect to " + compare_path + ".")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,510 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_core.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Execution core shared by the console and the graphic emulator.
+
+    Programs are decoded once into packed 16-bit instruction words
+    (opcode << 12 | address), and the RAM is kept in a flat array, so that
+    no string is parsed or compared while the program is running. Programs
+    for a wider address space (see mu0_wide) have wider words, with the
+    opcode above the wider address field.
+
+    ACC and the memory locations hold signed words of WORD_BITS bits, in
+    every engine: an ADD or SUB whose result does not fit in a word halts
+    the program with a WordOverflowError, before changing ACC.
+"""
+
+import array
+import copy
+import struct
+import sys
+import zlib
+
+# opcodes, as encoded in the upper 4 bits of an instruction word
+LOAD = 0x0
+STORE = 0x1
+ADD = 0x2
+SUB = 0x3
+JUMP = 0x4
+JGE = 0x5
+JNE = 0x6
+STOP = 0x7
+# opcodes from TRAP on are never produced by the assembler: they are patched
+# into a copy of the code by the tools needing to regain control when an
+# instruction is reached, and they halt run() and step() before executing it
+TRAP = 0x8
+
+# mnemonics accepted in the source files, with the related opcode
+OPCODES = {
+    'LOAD': LOAD,
+    'LDA': LOAD,
+    'STORE': STORE,
+    'STO': STORE,
+    'ADD': ADD,
+    'SUB': SUB,
+    'JUMP': JUMP,
+    'JMP': JUMP,
+    'JGE': JGE,
+    'JNE': JNE,
+    'STOP': STOP,
+}
+
+# canonical mnemonic for each opcode
+MNEMONICS = ('LOAD', 'STORE', 'ADD', 'SUB', 'JUMP', 'JGE', 'JNE', 'STOP')
+
+MEMORY_SIZE = 0x1000 # address space is 2^12 words
+ADDRESS_MASK = 0xFFF # mask selecting the address field in a word
+ADDRESS_BITS = 12    # width of the address field in a word
+# widths of the address field accepted for a program (the ones wider than
+# ADDRESS_BITS need a mu0_wide.WideMachine)
+ADDRESS_WIDTHS = (12, 16, 24)
+
+WORD_BITS = 64                     # width of ACC and of the memory words
+WORD_MIN = -(1 << (WORD_BITS - 1)) # smallest value of a word
+WORD_MAX = (1 << (WORD_BITS - 1)) - 1 # largest value of a word
+
+# reasons for the end of a run
+HALT_STOP = 'stop'   # a STOP instruction was reached
+HALT_END = 'end'     # the program counter went past the last instruction
+HALT_FAULT = 'fault' # an uninitialized location was read
+HALT_TRAP = 'trap'   # a trap was reached (the PC points to it)
+HALT_OVERFLOW = 'overflow' # the result of an ADD or SUB did not fit a word
+# reasons for the end of a run, for the drivers enforcing budgets, for the
+# debugger and for the detection of endless loops
+HALT_LIMIT = 'limit'     # the maximum number of instructions was executed
+HALT_TIMEOUT = 'timeout' # the maximum running time was exceeded
+HALT_BREAK = 'break'     # a breakpoint or a watchpoint was hit
+HALT_LOOP = 'loop'       # the status was repeated, so it would never halt
+
+# header of a machine snapshot: magic string, checksum of the program code,
+# PC, ACC, executed instructions, number of initialized locations
+SNAPSHOT_MAGIC = b'MU0S'
+SNAPSHOT_HEADER = struct.Struct('<4sIIqQI')
+
+class MemoryAccessError(RuntimeError):
+    """ Exception risen when an instruction reads an uninitialized location.
+    """
+    def __init__(self, line = 0, address = 0):
+        """
+            line: source line of the faulting instruction
+            address: memory location accessed
+        """
+        RuntimeError.__init__(self,
+                "Line %d: invalid memory access at %#0.3x" % (line, address))
+        self.line = line
+        self.address = address
+
+class WordOverflowError(RuntimeError):
+    """ Exception risen when the result of an ADD or SUB instruction does
+        not fit in a word (ACC is left unchanged).
+    """
+    def __init__(self, line = 0, value = 0):
+        """
+            line: source line of the faulting instruction
+            value: result of the instruction
+        """
+        RuntimeError.__init__(self,
+                "Line %d: arithmetic overflow (result %d does not fit in "
+                "%d bits)" % (line, value, WORD_BITS))
+        self.line = line
+        self.value = value
+
+class Program:
+    """ A decoded program: packed instruction words, the source line and
+        comment of each instruction, and the memory image defined by the
+        INI pseudoinstructions.
+    """
+    def __init__(self, address_bits = ADDRESS_BITS):
+        """
+            address_bits: width of the address field (one of
+                ADDRESS_WIDTHS), ValueError is risen for any other
+        """
+        if address_bits not in ADDRESS_WIDTHS:
+            raise ValueError("Unsupported address width: " +
+                    str(address_bits) + " bits.")
+        # packed instruction words (32-bit for the wide address widths)
+        self.code = array.array('H' if address_bits == ADDRESS_BITS else 'L')
+        self.lines = []              # source line for each instruction
+        self.comments = []           # comment for each instruction
+        self.data = {}               # initial memory, address -> value
+        self.address_bits = address_bits # width of the address field
+
+    def __len__(self):
+        return len(self.code)
+
+    def append(self, opcode, address, line, comment = None):
+        """ Append an instruction to the program.
+        """
+        self.code.append(opcode << self.address_bits | address)
+        self.lines.append(line)
+        self.comments.append(comment)
+
+def format_value(value, bits = ADDRESS_BITS):
+    """ Return the 2's complement hexadecimal form of a value (on the given
+        number of bits), together with its decimal form.
+    """
+    return '%#0.3x (dec: %d)' % (value if value >= 0 else value + (1 << bits),
+            value)
+
+class Machine:
+    """ Status of an emulated MU0 processor running a decoded program.
+    """
+    address_bits = ADDRESS_BITS # width of the address field of the programs
+    snapshot_magic = SNAPSHOT_MAGIC # magic string of the snapshots
+    snapshot_address = 'H' # typecode of the addresses in the snapshots
+
+    def __init__(self, program):
+        """ Raise ValueError if the program is for a different address
+            width.
+        """
+        if program.address_bits != self.address_bits:
+            raise ValueError("Program for a " + str(program.address_bits) +
+                    "-bit address space (see mu0_wide).")
+        self.program = program
+        self.code = program.code
+        self._clear_memory()
+        self.acc = 0     # implicit accumulator register
+        self.pc = 0      # program counter
+        self.steps = 0   # number of executed instructions
+        self.dirty = set() # locations written since the last call to changes()
+        self.shared = False # True if the memory may be shared with a fork
+        self.hooks = None   # instrumentation hooks, if any (see mu0_hooks)
+        for address, value in program.data.items():
+            self.write(address, value)
+        self.dirty.clear() # the initial memory is not a change
+        self._ops = self._handlers()
+
+    def _clear_memory(self):
+        """ Make the whole memory uninitialized.
+        """
+        self.memory = array.array('q', bytes(8 * MEMORY_SIZE)) # RAM
+        self.valid = bytearray(MEMORY_SIZE) # 1 for initialized locations
+        self.order = []  # initialized locations, in initialization order
+
+    def _handlers(self):
+        """ Return the handler for each opcode, used when stepping (calling
+            the hooks, if any).
+        """
+        handlers = (
+            self._load,
+            self._store,
+            self._add,
+            self._sub,
+            self._jump,
+            self._jge,
+            self._jne,
+            self._stop,
+        ) + (self._trap,) * 8
+        if self.hooks is not None:
+            handlers = self.hooks.wrap(self, handlers)
+        return handlers
+
+    def add_hook(self, event, function):
+        """ Call a function at each event of a kind ('fetch', 'read',
+            'write' or 'branch') of the execution, as described in
+            mu0_hooks.
+        """
+        if self.hooks is None:
+            import mu0_hooks
+            hooks = mu0_hooks.Hooks()
+            hooks.add(event, function)
+            self.hooks = hooks
+        else:
+            self.hooks.add(event, function)
+        self._ops = self._handlers()
+
+    def remove_hook(self, event, function):
+        """ Remove a function added with add_hook(), going back to the plain
+            execution when no hook is left.
+        """
+        if self.hooks is not None:
+            self.hooks.remove(event, function)
+            if not self.hooks:
+                self.hooks = None
+            self._ops = self._handlers()
+
+    def fork(self):
+        """ Return a copy of the machine.
+
+            The copy shares the memory with the original machine, until
+            either of them runs or writes it: only then the memory is
+            copied (see own()), so that forking many continuations of the
+            same status is cheap. The copy has its own hooks, initially the
+            same as the original ones.
+        """
+        other = copy.copy(self)
+        other.dirty = set()
+        if self.hooks is not None:
+            other.hooks = self.hooks.copy()
+        other._ops = other._handlers()
+        self.shared = other.shared = True
+        return other
+
+    def own(self):
+        """ Copy the memory, if it may be shared with a fork.
+
+            This is done before any change to the memory, by the methods of
+            the machine and by any other code changing it directly.
+        """
+        if self.shared:
+            self.memory = array.array('q', self.memory)
+            self.valid = bytearray(self.valid)
+            self.order = list(self.order)
+            self.shared = False
+
+    def snapshot(self):
+        """ Return the status of the machine, as a compact binary image
+            (the program is not included).
+        """
+        addresses = array.array(self.snapshot_address, self.order)
+        values = array.array('q', [self.memory[a] for a in self.order])
+        if sys.byteorder == 'big':
+            addresses.byteswap()
+            values.byteswap()
+        return b''.join([
+            SNAPSHOT_HEADER.pack(self.snapshot_magic, zlib.crc32(self.code),
+                self.pc, self.acc, self.steps, len(addresses)),
+            addresses.tobytes(),
+            values.tobytes(),
+        ])
+
+    def restore(self, image):
+        """ Restore the status saved by snapshot() (any bytes-like object),
+            raising ValueError if it is invalid, or if it was taken from a
+            machine running a different program.
+        """
+        if len(image) < SNAPSHOT_HEADER.size:
+            raise ValueError("Truncated snapshot.")
+        magic, checksum, pc, acc, steps, n = \
+                SNAPSHOT_HEADER.unpack_from(image)
+        if magic != self.snapshot_magic:
+            raise ValueError("Not a mu0 snapshot (for this address width).")
+        addresses = array.array(self.snapshot_address)
+        size = addresses.itemsize * n # size of the addresses
+        if len(image) != SNAPSHOT_HEADER.size + size + 8 * n:
+            raise ValueError("Truncated snapshot.")
+        if checksum != zlib.crc32(self.program.code):
+            raise ValueError("Snapshot of a different program.")
+        values = array.array('q')
+        offset = SNAPSHOT_HEADER.size
+        addresses.frombytes(image[offset:offset + size])
+        values.frombytes(image[offset + size:])
+        if sys.byteorder == 'big':
+            addresses.byteswap()
+            values.byteswap()
+        if max(addresses, default = 0) >= len(self.valid):
+            raise ValueError("Invalid snapshot.")
+
+        self.shared = False # nothing is kept
+        self._clear_memory()
+        for address, value in zip(addresses, values):
+            self.write(address, value)
+        self.pc = pc
+        self.acc = acc
+        self.steps = steps
+
+    def read(self, address):
+        """ Return the value of a memory location, raising MemoryAccessError
+            if the location was never initialized.
+        """
+        if not self.valid[address]:
+            raise MemoryAccessError(self.line(), address)
+        return self.memory[address]
+
+    def write(self, address, value):
+        """ Write a value in a memory location.
+        """
+        if self.shared:
+            self.own()
+        if not self.valid[address]:
+            self.valid[address] = 1
+            self.order.append(address)
+        self.memory[address] = value
+        self.dirty.add(address)
+
+    def changes(self):
+        """ Return the set of locations written since the last call (or
+            since the machine was created), and start tracking again.
+        """
+        dirty = self.dirty
+        self.dirty = set()
+        return dirty
+
+    def line(self, pc = None):
+        """ Return the source line of the instruction at the given position
+            (the current one by default).
+        """
+        pc = self.pc if pc is None else pc
+        return self.program.lines[pc] if pc < len(self.code) else 0
+
+    def dump(self, addresses = None, marked = ()):
+        """ Return a string representing the dump of the memory.
+
+            addresses: locations to be dumped (all the initialized ones by
+                default, in initialization order)
+            marked: locations to be highlighted with a '*'
+        """
+        memory = self.memory
+        valid = self.valid
+        if addresses is None:
+            addresses = self.order
+        return '\n'.join(['%s @%#0.3x: %s' % ('*' if l in marked else ' ',
+            l, format_value(memory[l], self.address_bits) if valid[l] else
+            '(uninitialized)')
+            for l in addresses])
+
+    def _load(self, address):
+        self.acc = self.read(address)
+        self.pc += 1
+
+    def _store(self, address):
+        self.write(address, self.acc)
+        self.pc += 1
+
+    def _add(self, address):
+        self.acc = self._check(self.acc + self.read(address))
+        self.pc += 1
+
+    def _sub(self, address):
+        self.acc = self._check(self.acc - self.read(address))
+        self.pc += 1
+
+    def _check(self, value):
+        """ Return the result of an ADD or SUB, raising WordOverflowError if
+            it does not fit in a word.
+        """
+        if not WORD_MIN <= value <= WORD_MAX:
+            raise WordOverflowError(self.line(), value)
+        return value
+
+    def _jump(self, address):
+        self.pc = address
+
+    def _jge(self, address):
+        self.pc = address if self.acc >= 0 else self.pc + 1
+
+    def _jne(self, address):
+        self.pc = address if self.acc != 0 else self.pc + 1
+
+    def _stop(self, address):
+        return HALT_STOP
+
+    def _trap(self, address):
+        return HALT_TRAP
+
+    def step(self):
+        """ Execute a single instruction.
+
+            Return None if the program can continue, otherwise the reason
+            why the program is halted (HALT_STOP, HALT_END or HALT_TRAP).
+        """
+        if self.pc >= len(self.code):
+            return HALT_END
+        return self.execute(self.code[self.pc])
+
+    def execute(self, word):
+        """ Execute the given instruction word as if it were at the current
+            position (e.g. the instruction replaced by a trap).
+
+            Return the same as step().
+        """
+        if self.shared:
+            self.own()
+        status = self._ops[word >> 12](word & ADDRESS_MASK)
+        if status is None:
+            self.steps += 1
+        return status
+
+    def run(self, limit = None):
+        """ Run the program until it halts, and return the reason why it
+            halted (HALT_STOP, HALT_END or HALT_TRAP), raising
+            MemoryAccessError or WordOverflowError if it faults.
+
+            If limit is given, at most limit instructions are executed, and
+            None is returned if the program did not halt meanwhile.
+
+            This is the same as calling step() in a loop, with the dispatch
+            inlined over local variables (when the machine has no hooks).
+        """
+        if self.hooks is not None:
+            return self.hooks.run(self, limit)
+        if self.shared:
+            self.own()
+        code = self.code
+        memory = self.memory
+        valid = self.valid
+        order = self.order
+        mark = self.dirty.add
+        end = len(code)
+        pc = self.pc
+        acc = self.acc
+        steps = self.steps
+        last = steps + limit if limit is not None else sys.maxsize
+        try:
+            while steps < last:
+                if pc >= end:
+                    return HALT_END
+                word = code[pc]
+                op = word >> 12
+                address = word & 0xFFF
+                if op < 4: # memory access instructions
+                    if op == 1: # STORE
+                        if not valid[address]:
+                            valid[address] = 1
+                            order.append(address)
+                        memory[address] = acc
+                        mark(address)
+                    elif not valid[address]:
+                        raise MemoryAccessError(
+                                self.program.lines[pc], address)
+                    elif op == 0: # LOAD
+                        acc = memory[address]
+                    elif op == 2: # ADD
+                        acc += memory[address]
+                        if not WORD_MIN <= acc <= WORD_MAX:
+                            acc -= memory[address]
+                            raise WordOverflowError(self.program.lines[pc],
+                                    acc + memory[address])
+                    else: # SUB
+                        acc -= memory[address]
+                        if not WORD_MIN <= acc <= WORD_MAX:
+                            acc += memory[address]
+                            raise WordOverflowError(self.program.lines[pc],
+                                    acc - memory[address])
+                    pc += 1
+                elif op == 4: # JUMP
+                    pc = address
+                elif op == 5: # JGE
+                    pc = address if acc >= 0 else pc + 1
+                elif op == 6: # JNE
+                    pc = address if acc != 0 else pc + 1
+                elif op == 7: # STOP
+                    return HALT_STOP
+                else: # trap
+                    return HALT_TRAP
+                steps += 1
+            if pc >= end:
+                return HALT_END
+            return None
+        finally:
+            self.pc = pc
+            self.acc = acc
+            self.steps = steps
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_debug.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Breakpoints and watchpoints for mu0 programs.
+
+    Breakpoints and watchpoints are compiled into a copy of the code, where
+    the instructions they concern are replaced by traps. The machine runs
+    the patched code at full speed, halting with HALT_TRAP on a trap: only
+    then the debugger checks the condition of the breakpoint (if any), and
+    runs the original instruction if the program does not have to stop.
+    The instructions without a breakpoint pay nothing.
+
+    A line breakpoint stops before the instruction of its source line is
+    executed, if its condition holds (e.g. "12 if ACC < 0"). A watchpoint
+    stops after any instruction writing (or reading) its location: since the
+    address of each memory access is in the instruction itself, the
+    instructions accessing a location are found statically.
+"""
+
+import array
+import operator
+import sys
+
+import mu0_asm
+from mu0_core import STORE, SUB, TRAP, ADDRESS_MASK, HALT_TRAP, HALT_BREAK, \
+        Machine
+
+# regex for a condition, comparing ACC or a memory location with a value
+CONDITION_PATTERN = (
+    '^\\s*(?:(ACC)|\\[\\s*(0x[0-9a-f]{1,3})\\s*\\])' + # ACC or [address]
+    '\\s*(<=|>=|==|!=|<|>)\\s*' + # comparison
+    '([-+]?(?:0x[0-9a-f]+|[0-9]+))\\s*$') # value
+
+COMPARISONS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+class Condition:
+    """ Condition of a breakpoint, comparing ACC or the content of a memory
+        location with a value.
+    """
+    def __init__(self, text):
+        """
+            text: the condition, e.g. "ACC < 0" or "[0x103] == 0x4"
+        """
+        m = mu0_asm.regex(CONDITION_PATTERN).match(text)
+        if m is None:
+            raise ValueError("Invalid condition \"" + text.strip() + "\".")
+        acc, address, comparison, value = m.groups()
+        self.address = None if acc else int(address, 16) # None for ACC
+        self.comparison = comparison
+        self.compare = COMPARISONS[comparison]
+        self.value = int(value, 0)
+
+    def __str__(self):
+        return '%s %s %d' % ('ACC' if self.address is None else
+                '[%#0.3x]' % self.address, self.comparison, self.value)
+
+    def __call__(self, machine):
+        """ Return True if the condition holds for the machine (it never
+            holds for an uninitialized location).
+        """
+        if self.address is None:
+            return self.compare(machine.acc, self.value)
+        return bool(machine.valid[self.address]) and \
+                self.compare(machine.memory[self.address], self.value)
+
+class Debugger:
+    """ Breakpoints and watchpoints set on a program.
+    """
+    def __init__(self, program):
+        self.program = program
+        self.breakpoints = {} # condition (or None) by source line
+        self.watchpoints = {} # access mode ('r', 'w' or 'rw') by address
+        self.hit = None       # description of the last hit
+        self.code = None      # patched code, built when needed
+        self.breaks = {}      # line of the breakpoint at each patched pc
+        self.watches = {}     # location watched at each patched pc
+        self._resume = None   # (steps, pc) of the last breakpoint hit
+
+    def add_breakpoint(self, line, condition = None):
+        """ Set a breakpoint on a source line, with an optional Condition,
+            raising ValueError if no instruction is on the line.
+        """
+        if line not in self.program.lines:
+            raise ValueError("No instruction at line %d." % line)
+        self.breakpoints[line] = condition
+        self.code = None
+
+    def remove_breakpoint(self, line):
+        """ Remove the breakpoint on a source line, if any.
+        """
+        self.breakpoints.pop(line, None)
+        self.code = None
+
+    def add_watchpoint(self, address, mode = 'w'):
+        """ Watch the writes (mode 'w'), the reads ('r') or both ('rw') of a
+            memory location.
+        """
+        if not 0 <= address <= ADDRESS_MASK or \
+                mode not in ('r', 'w', 'rw', 'wr'):
+            raise ValueError("Invalid watchpoint.")
+        self.watchpoints[address] = mode
+        self.code = None
+
+    def remove_watchpoint(self, address):
+        """ Remove the watchpoint on a memory location, if any.
+        """
+        self.watchpoints.pop(address, None)
+        self.code = None
+
+    def parse_breakpoint(self, spec):
+        """ Set a breakpoint given as "LINE" or "LINE if CONDITION".
+        """
+        line, _, condition = spec.partition(' if ')
+        try:
+            line = int(line, 0)
+        except ValueError:
+            raise ValueError("Invalid breakpoint \"" + spec + "\".")
+        self.add_breakpoint(line,
+                Condition(condition) if condition.strip() else None)
+
+    def parse_watchpoint(self, spec):
+        """ Set a watchpoint given as "ADDRESS" or "ADDRESS:MODE".
+        """
+        address, _, mode = spec.partition(':')
+        try:
+            address = int(address, 16)
+        except ValueError:
+            raise ValueError("Invalid watchpoint \"" + spec + "\".")
+        self.add_watchpoint(address, mode or 'w')
+
+    def _patch(self):
+        """ Build the patched code, with a trap on each instruction having a
+            breakpoint or accessing a watched location.
+        """
+        code = self.program.code
+        lines = self.program.lines
+        self.code = array.array('H', code)
+        self.breaks = {}
+        self.watches = {}
+        for pc, word in enumerate(code):
+            op = word >> 12
+            address = word & ADDRESS_MASK
+            if lines[pc] in self.breakpoints:
+                self.breaks[pc] = lines[pc]
+            mode = self.watchpoints.get(address)
+            if mode and op <= SUB and \
+                    ('w' if op == STORE else 'r') in mode:
+                self.watches[pc] = address
+            if pc in self.breaks or pc in self.watches:
+                self.code[pc] = TRAP << 12 | address
+
+    def run(self, machine, limit = None, run = Machine.run):
+        """ Same as run(machine, limit), where run is the function running
+            the machine (Machine.run by default, or e.g. Profile.run), but
+            halting with HALT_BREAK when a breakpoint or a watchpoint is hit,
+            after setting the description of the hit.
+
+            A run starting where a breakpoint was hit goes on from there.
+        """
+        if self.code is None:
+            self._patch()
+        original = machine.code
+        code = machine.code = self.code
+        last = machine.steps + limit if limit is not None else sys.maxsize
+        try:
+            while True:
+                status = run(machine, None if limit is None else
+                        last - machine.steps)
+                if status != HALT_TRAP:
+                    return status
+                pc = machine.pc
+                line = self.breaks.get(pc)
+                if line is not None and \
+                        self._resume != (machine.steps, pc):
+                    condition = self.breakpoints[line]
+                    if condition is None or condition(machine):
+                        self._resume = (machine.steps, pc)
+                        self.hit = "Breakpoint at line %d" % line + (
+                                " (%s)" % condition if condition else "")
+                        return HALT_BREAK
+                if machine.steps >= last:
+                    return None
+
+                # run the original instruction
+                code[pc] = original[pc]
+                try:
+                    status = run(machine, 1)
+                finally:
+                    code[pc] = TRAP << 12 | (original[pc] & ADDRESS_MASK)
+                if status is not None:
+                    return status
+                address = self.watches.get(pc)
+                if address is not None:
+                    self._resume = None
+                    self.hit = "Watchpoint %#0.3x %s at line %d" % (address,
+                            'written' if original[pc] >> 12 == STORE else
+                            'read', self.program.lines[pc])
+                    return HALT_BREAK
+        finally:
+            machine.code = original
@@ -22,15 +22,20 @@
     @brief Simplified emulator for mu0 processor.
 """
 
-import io
-import os.path
-import re
-import sys
+import time
+
+import mu0_asm
+import mu0_core
+import mu0_debug
+import mu0_history
+import mu0_profile
+import mu0_runaway
+from mu0_asm import SourceSyntaxError
 
 # tk support
 try:
     import tkinter as tk
-    from tkinter import filedialog
+    import tkinter.filedialog # loads tk.filedialog
     from tkinter import *
 except ImportError:
     print("Tk support missing")
@@ -41,17 +46,6 @@ class FileNotFound(RuntimeError):
     """
     pass
 
-class SourceSyntaxError(RuntimeError):
-    """ Exception to be risen when the source file contains a syntax error.
-    """
-    def __init__(self, line = 0, line_content = None):
-        """
-            line: line number
-            line_content: text contained in the line causing the exception
-        """
-        self.line = line
-        self.line_content = line_content
-
 class ExecutionComplete(Exception):
     """ Exception risen when the program reaches the end of its execution.
     """
@@ -61,10 +55,16 @@ class ExecutionComplete(Exception):
 # thanks to Bryan Oakley on StackOverflow: http://stackoverflow.com/a/16375233
 class TextLineNumbers(tk.Canvas):
     """ Class defining the canvas containing the line numbers for the text box.
+
+        Clicking on a line number toggles a breakpoint on the line, shown by
+        the number in red.
     """
     def __init__(self, *args, **kwargs):
         tk.Canvas.__init__(self, *args, **kwargs)
         self.textwidget = None
+        self.breakpoints = set() # lines with a breakpoint
+        self.items = [] # (item, (line, y, color)) for each line number drawn
+        self.bind("<Button-1>", self.toggle)
 
     def attach(self, text_widget):
         """ Attach the widget to a text widget.
@@ -73,19 +73,47 @@ class TextLineNumbers(tk.Canvas):
 
     def redraw(self, *args):
         """ Redraw line numbers according to the text widget content.
-        """
-        self.delete("all")
 
+            Only the visible lines are drawn, and the items already on the
+            canvas are reused, changing only those whose line, position or
+            color changed.
+        """
+        items = self.items
+        n = 0 # number of visible lines drawn
         i = self.textwidget.index("@0,0") # line counter
         while True:
             dline = self.textwidget.dlineinfo(i) # get info on the text line
             if dline is None:
                 break
             y = dline[1] # get vertical line start
-            linenum = str(i).split(".")[0] # get line number
-            self.create_text(2, y, anchor = "nw", text = linenum)
+            linenum = int(str(i).split(".")[0]) # get line number
+            state = (linenum, y,
+                    "red" if linenum in self.breakpoints else "black")
+            if n == len(items):
+                items.append((self.create_text(2, y, anchor = "nw",
+                    text = str(linenum), fill = state[2]), state))
+            elif items[n][1] != state:
+                item = items[n][0]
+                self.coords(item, 2, y)
+                self.itemconfigure(item, text = str(linenum),
+                        fill = state[2])
+                items[n] = (item, state)
+            n += 1
             i = self.textwidget.index("%s+1line" % i) # update line counter
 
+        # remove the numbers of the lines no more visible
+        for item, _ in items[n:]:
+            self.delete(item)
+        del items[n:]
+
+    def toggle(self, event):
+        """ Toggle the breakpoint on the line at the clicked position.
+        """
+        index = self.textwidget.index("@0,%d" % event.y)
+        line = int(str(index).split(".")[0])
+        self.breakpoints ^= set([line])
+        self.redraw()
+
 # thanks to Bryan Oakley on StackOverflow: http://stackoverflow.com/a/16375233
 class CustomText(tk.Text):
     """ Subclass of the text widget, adding the generation of an event
@@ -137,17 +165,163 @@ class NumberedText(tk.Frame):
 
         # bind events related to text change to the handler for the
         # line numbers redraw
+        self.redrawJob = None # pending redraw of the line numbers
         self.text.bind("<<Change>>", self._on_change)
         self.text.bind("<Configure>", self._on_change)
 
     def _on_change(self, event):
         """ Handler for the text content change.
+
+            The redraw is scheduled for when the application is idle, once
+            for all the changes notified meanwhile.
         """
+        if self.redrawJob is None:
+            self.redrawJob = self.after_idle(self._redraw)
+
+    def _redraw(self):
+        """ Redraw the line numbers, after the changes.
+        """
+        self.redrawJob = None
         self.linenumbers.redraw()
 
+class MemoryView(tk.Frame):
+    """ Scrollable table of the whole address space, showing the value of
+        each location.
+
+        The table is virtualized: only the visible rows have an item on the
+        canvas, and the items are reused when scrolling. When the memory
+        changes, only the rows of the locations written (and of the ones
+        highlighted before) are formatted and updated again.
+    """
+    ROW_HEIGHT = 16 # height of a row, in pixels
+    def __init__(self, *args, **kwargs):
+        tk.Frame.__init__(self, *args, **kwargs)
+        self.machine = None  # machine shown
+        self.first = 0       # address of the first visible row
+        self.changes = set() # locations highlighted as just written
+        self.items = []      # (item, (text, color)) for each visible row
+
+        # entry and button to jump to an address
+        self.addressEntry = tk.Entry(self, width = 8)
+        self.addressEntry.bind('<Return>', lambda event: self.jump())
+        self.addressEntry.grid(row = 0, column = 0, sticky = 'ew')
+        self.jumpButton = tk.Button(
+                self,
+                text = "Go to address",
+                command = self.jump)
+        self.jumpButton.grid(row = 0, column = 1, columnspan = 2)
+
+        # canvas with the rows of the table, and its scrollbar
+        self.canvas = tk.Canvas(self, width = 240, bg = "#FFFFFF")
+        self.canvas.grid(row = 1, column = 0, columnspan = 2, sticky = 'nsew')
+        self.scrollBar = tk.Scrollbar(self, command = self.yview)
+        self.scrollBar.grid(row = 1, column = 2, sticky = 'ns')
+        self.rowconfigure(1, weight = 1)
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+        self.canvas.bind("<MouseWheel>", lambda event:
+                self.scrollTo(self.first - event.delta // 120 * 3))
+        self.canvas.bind("<Button-4>", lambda event:
+                self.scrollTo(self.first - 3))
+        self.canvas.bind("<Button-5>", lambda event:
+                self.scrollTo(self.first + 3))
+
+    def rows(self):
+        """ Return the number of visible rows.
+        """
+        height = self.canvas.winfo_height() or 0
+        return max(1, height // self.ROW_HEIGHT)
+
+    def row(self, address):
+        """ Return the text and the color of the row of a location.
+        """
+        machine = self.machine
+        if not machine.valid[address]:
+            return ' @%#0.3x: (uninitialized)' % address, "#A0A0A0"
+        changed = address in self.changes
+        return (('*' if changed else ' ') + '@%#0.3x: ' % address +
+                mu0_core.format_value(machine.memory[address]),
+                "#C00000" if changed else "#000000")
+
+    def draw(self, n, address):
+        """ Draw the row of a location as the n-th visible row, changing the
+            canvas only if its content is different.
+        """
+        state = self.row(address)
+        if n == len(self.items):
+            self.items.append((self.canvas.create_text(2,
+                n * self.ROW_HEIGHT, anchor = "nw", font = "TkFixedFont",
+                text = state[0], fill = state[1]), state))
+        elif self.items[n][1] != state:
+            item = self.items[n][0]
+            self.canvas.itemconfigure(item, text = state[0], fill = state[1])
+            self.items[n] = (item, state)
+
+    def redraw(self):
+        """ Draw all the visible rows.
+        """
+        if self.machine is None:
+            return
+        rows = min(self.rows(), mu0_core.MEMORY_SIZE - self.first)
+        for n in range(rows):
+            self.draw(n, self.first + n)
+        for item, _ in self.items[rows:]:
+            self.canvas.delete(item)
+        del self.items[rows:]
+        self.scrollBar.set(self.first / mu0_core.MEMORY_SIZE,
+                (self.first + rows) / mu0_core.MEMORY_SIZE)
+
+    def show(self, machine, changes):
+        """ Show the memory of a machine, highlighting the locations in
+            changes (the locations written since it was last shown).
+        """
+        if machine is not self.machine:
+            # a new program: start from its first initialized location
+            self.machine = machine
+            self.changes = set(changes)
+            self.first = 0
+            self.scrollTo(min(machine.order) if machine.order else 0)
+            return
+        rows = len(self.items)
+        update = self.changes | changes
+        self.changes = set(changes)
+        for address in update:
+            n = address - self.first
+            if 0 <= n < rows:
+                self.draw(n, address)
+
+    def scrollTo(self, first):
+        """ Scroll the table to have a location as the first visible row.
+        """
+        self.first = max(0, min(first,
+            mu0_core.MEMORY_SIZE - min(self.rows(), mu0_core.MEMORY_SIZE)))
+        self.redraw()
+
+    def yview(self, *args):
+        """ Scroll the table, as requested by the scrollbar.
+        """
+        if args[0] == 'moveto':
+            self.scrollTo(int(float(args[1]) * mu0_core.MEMORY_SIZE))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.rows()
+            self.scrollTo(self.first + amount)
+
+    def jump(self):
+        """ Scroll the table to the address in the entry.
+        """
+        try:
+            address = int(self.addressEntry.get(), 16)
+        except ValueError:
+            return
+        self.scrollTo(address)
+
 class Application(tk.Frame):
     """ Class defining the main window frame for the program.
     """
+    FRAME_TIME = 1 / 30. # seconds between output refreshes when running all
+    CHUNK_SIZE = 10000   # instructions run between checks of the time
+    ASSEMBLY_DELAY = 200 # ms after the last edit before assembling the source
     def __init__(self, master=None):
         tk.Frame.__init__(self, master)
         self.pack()
@@ -156,165 +330,117 @@ class Application(tk.Frame):
         self.resetProgramStatus();
         self.outputText = StringVar()
         self.currentFileName = None
-
-        # create regexes to catch instructions lines or comment/blank lines
-        self.instructions_re = [
-            re.compile(
-                '^[ \t]*' + # leading whitespace
-                '(LOAD|LDA|STORE|STO|ADD|SUB|JUMP|JMP|JGE|JNE)' +
-                # instruction name
-                '[ \t]*' + # whitespace
-                '(0x[0-9A-Fa-f]{1,3})' + # operand
-                '[ \t]*' + # whitespace
-                '(?:;+[ \t]*(.*))?$', # comment
-                flags = re.I), # ignore case
-            re.compile(
-                '^[ \t]*' +
-                '(STOP)' +
-                '[ \t]*' +
-                '()?' + # void group, to have the same format as the above re
-                '(?:;+[ \t]*(.*))?$',
-                flags = re.I),
-            re.compile('^[ \t]*;+.*$'), # comment line
-            re.compile('^[ \t]*$'),    # blank line
-        ]
-        # regex for a line initializing a value in memory
-        self.initializer = re.compile(
-                '^[ \t]*' +
-                '(INI)' +
-                '[ \t]*' +
-                '(0x[0-9A-Fa-f]{1,3})' + # location
-                '[ \t]*' +
-                '(0x[0-9A-Fa-f]{1,3})' + # value
-                '[ \t]*' +
-                '(;+[ \t]*(.*))?$',
-                flags = re.I)
+        self.profile = None # execution profile of the last "Run all"
+        self.assembler = mu0_asm.IncrementalAssembler() # for the text box
+        self.assemblyJob = None # pending assembly of the edited source
 
         # create the widgets in the window
         self.createWidgets()
 
-    def dump(self):
-        """Return a string representing the dump of the input memory.
-
-        Note: for negative values, conversion to 2's complement is needed:
-        it is done adding the (negative) value to 0x1000 (i.e. 2^12).
-        """
-        return '\n'.join(['  @%#0.3x: %#0.3x (dec: %d)'
-            % (l, v if v >= 0 else v + 0x1000, v) # 2's complement
-            for (l, v) in self.memory.items()])
-
-    def parseSource(self, source_file):
-        """ Parse the source file whose path is passed as a parameter.
-        """
-
-        self.line = 1 # source file line counter
-        self.instructions = [] # instructions
-        self.memory = {}       # RAM memory
-
-        # get lines from file and put instructions in the array
-        print("### Parsing source file ...")
-        for source_line in source_file:
-            source_line = source_line.rstrip() # strip final newline char
-            # match initializer lines
-            match = self.initializer.match(source_line)
-            if match:
-                value = int(match.group(3), 16) # get value from string
-                if value > 0x7FF: # two's complement when negative
-                    value = value - 0x1000
-                self.memory[int(match.group(2), 16)] = value # store value
-                self.line += 1
-                print("Recognized: " + source_line)
-                continue
-            # match instruction lines
-            for regex in self.instructions_re:
-                match = regex.match(source_line)
-                if match:
-                    if len(match.groups()) != 0: # ignore non-instruction lines
-                        self.instructions.append(dict(
-                            opc = match.group(1), # save opcode
-                            imm = match.group(2), # save immediate
-                            com = match.group(3), # save comment
-                            line = self.line))         # save source line number
-                        print("Recognized: " + source_line)
-                    self.line += 1
-                    break
-            # unrecognized line
-            if match == None:
-                print("Line " + str(self.line) +
+    def showMemory(self):
+        """ Show the machine memory in the memory view, highlighting the
+            locations written since the last call.
+        """
+        self.memoryView.show(self.machine, self.machine.changes())
+
+    def sourceChanged(self, event):
+        """ Handler for the text content change, scheduling the assembly of
+            the source when it has been edited, once the editing pauses.
+        """
+        if self.textBox.text.edit_modified():
+            if self.assemblyJob is not None:
+                self.after_cancel(self.assemblyJob)
+            self.assemblyJob = self.after(self.ASSEMBLY_DELAY,
+                    self.assembleSource)
+
+    def assembleSource(self):
+        """ Assemble the changes in the source, and mark the unrecognized
+            lines.
+        """
+        if self.assemblyJob is not None:
+            self.after_cancel(self.assemblyJob)
+            self.assemblyJob = None
+        text = self.textBox.text
+        text.edit_modified(False)
+        errors = self.assembler.update(text.get('1.0', END).splitlines(True))
+        text.tag_remove("error", '1.0', END)
+        for line, _ in errors:
+            text.tag_add("error", '%d.0' % line, '%d.0' % (line + 1))
+
+    def parseSource(self):
+        """ Return the decoded program for the source in the text box.
+
+            The program is assembled while the source is edited, so only
+            the last changes (if any) have to be assembled here.
+        """
+        if self.assemblyJob is not None or self.textBox.text.edit_modified():
+            self.assembleSource()
+        try:
+            return self.assembler.program()
+        except SourceSyntaxError as e:
+            for line, content in e.errors:
+                print("Line " + str(line) +
                         ": unrecognized instruction\n   " +
-                        source_line)
-                raise SourceSyntaxError(self.line, source_line)
+                        content.rstrip())
+            raise
+
+    def haltMessage(self, status):
+        """ Return the message shown when the program halts, showing the
+            final memory.
+        """
+        if status == mu0_core.HALT_STOP:
+            message = ("Reached STOP instruction at line " +
+                    str(self.machine.line()) + ".")
+        elif status == mu0_core.HALT_LOOP:
+            message = ("Endless loop: the status at instruction count " +
+                    str(self.detector.start) + " is repeated after " +
+                    str(self.detector.period) + " instructions.")
+        else:
+            message = "End of program reached."
+        self.showMemory()
+        return message
 
     def runInstruction(self):
         """ Run the next instruction in the current program.
         """
-        if self.pc >= len(self.instructions):
-            raise ExecutionComplete(
-                    "End of program reached." +
-                    "\nMemory dump after program end:" +
-                    self.dump())
-        else:
-            # opcode for current instr.
-            opcode = self.instructions[self.pc]['opc']
-            # line for current instr.
-            self.line = str(self.instructions[self.pc]['line'])
-            number = self.pc # PC for the current instruction
-
-            # check for stop instruction
-            if (opcode == "STOP"):
-                raise ExecutionComplete(
-                        "Reached STOP instruction at line "
-                        + self.line + "." +
-                        "\nMemory dump after program end:" +
-                        self.dump())
-
-            # immediate for the current inst., it may be safely set only now
-            immediate = int(self.instructions[self.pc]['imm'], 16)
-
-            # access instructions (potentially invalid location)
-            try:
-                if (opcode == "LOAD" or opcode == "LDA"):
-                    self.acc = self.memory[immediate]
-                elif (opcode == "ADD"):
-                    self.acc += self.memory[immediate]
-                elif (opcode == "SUB"):
-                    self.acc -= self.memory[immediate]
-            except KeyError as e:
-                print("Line " + self.line + ": uninitialized memory access.")
-                quit()
-
-            # other instructions
-            if (opcode == "STORE" or opcode == "STO"):
-                self.memory[immediate] = self.acc
-            elif (opcode == "JUMP" or opcode == "JMP"):
-                self.pc = immediate
-            elif (opcode == "JGE"):
-                if self.acc >= 0:
-                    self.pc = immediate
-                else:
-                    self.pc += 1
-            elif (opcode == "JNE"):
-                if self.acc != 0:
-                    self.pc = immediate
-                else:
-                    self.pc += 1
-
-            # increment program counter after each non-jump instruction
-            if opcode != "JUMP" and opcode != "JGE" and opcode != "JNE":
-                self.pc += 1
-
-            # set output text message
-            self.outputText.set(
-                "Executed line " + self.line +
-                ", instr. %#0.3x: %s %#0.3x" % (number, opcode, immediate) +
-                "\nComment: " + str(self.instructions[number]['com']) +
-                "\n  Current PC value:  %#0.3x" % (self.pc) +
-                "\n  Current ACC value: %#0.3x (dec: %d)"
-                    % (self.acc if self.acc >= 0 else 0x1000 + self.acc,
-                        self.acc) + # 2's complement
-                "\nMemory dump after instruction execution:" +
-                self.dump())
-            return 1
+        program = self.machine.program
+        number = self.machine.pc # PC for the current instruction
+        try:
+            status = self.history.step()
+        except mu0_core.MemoryAccessError as e:
+            print("Line " + str(e.line) + ": uninitialized memory access.")
+            quit()
+        except mu0_core.WordOverflowError as e:
+            print("Line " + str(e.line) + ": arithmetic overflow.")
+            quit()
+
+        if status is not None:
+            raise ExecutionComplete(self.haltMessage(status))
+
+        # set output text message
+        word = program.code[number]
+        self.outputText.set(
+            "Executed line " + str(program.lines[number]) +
+            ", instr. %#0.3x: %s %#0.3x" % (number,
+                mu0_core.MNEMONICS[word >> 12],
+                word & mu0_core.ADDRESS_MASK) +
+            "\nComment: " + str(program.comments[number]) +
+            "\n  Current PC value:  %#0.3x" % (self.machine.pc) +
+            "\n  Current ACC value: " +
+                mu0_core.format_value(self.machine.acc))
+        self.showMemory()
+        return 1
+
+    def showPosition(self):
+        """ Show the status of the program after moving in its history.
+        """
+        self.outputText.set(
+            "At instruction count " + str(self.history.position()) +
+            ", next instruction at line " + str(self.machine.line()) +
+            "\n  Current PC value:  %#0.3x" % (self.machine.pc) +
+            "\n  Current ACC value: " +
+                mu0_core.format_value(self.machine.acc))
+        self.showMemory()
 
     def createWidgets(self):
         """ Create the widgets in the application window.
@@ -334,15 +460,22 @@ class Application(tk.Frame):
                 "\"Run step\" button.\n" +
                 "; and then use the \"Next\" button to run the next " +
                 "instruction,\n" +
-                "; or \"Stop\" to stop the execution\n")
-        self.textBox.grid(row = 0, column = 0, rowspan = 9)
+                "; or \"Stop\" to stop the execution\n" +
+                "; Click on a line number to set a breakpoint for " +
+                "\"Run all\".\n")
+        self.textBox.grid(row = 0, column = 0, rowspan = 12)
+
+        # assemble the source while it is edited, highlighting the lines
+        # which are not recognized
+        self.textBox.text.tag_configure("error", background = "#FFC0C0")
+        self.textBox.text.bind("<<Change>>", self.sourceChanged, add = "+")
 
         # scrollbar for the source text box
         self.scrollBar = tk.Scrollbar(
                 self,
                 command = self.textBox.text.yview)
         self.textBox.text["yscrollcommand"] = self.scrollBar.set
-        self.scrollBar.grid(row = 0, column = 1, rowspan = 9, sticky = 'nsew')
+        self.scrollBar.grid(row = 0, column = 1, rowspan = 12, sticky = 'nsew')
 
         # label for the execution output
         self.terminal = tk.Label(
@@ -353,8 +486,13 @@ class Application(tk.Frame):
                 bg = "#000000",
                 justify = LEFT,
                 anchor = NW) # align text to up-left corner
-        self.terminal.grid(row = 9, column = 0, columnspan = 2)
-        self.outputText.set("\n\n\n\n\n\n\n\n")
+        self.terminal.grid(row = 12, column = 0, columnspan = 2)
+        self.outputText.set("\n\n\n\n\n")
+
+        # table of the memory locations
+        self.memoryView = MemoryView(self)
+        self.memoryView.grid(row = 0, column = 3, rowspan = 13,
+                sticky = 'nsew')
 
         # button for source file opening
         self.openButton = tk.Button(
@@ -406,21 +544,55 @@ class Application(tk.Frame):
         self.nextButton.grid(row = 5, column = 2)
         self.nextButton.config(width = 8)
 
+        # button to undo the last instruction when running step by step
+        self.backButton = tk.Button(
+                self,
+                text = "Back",
+                command = self.runBack,
+                state = DISABLED)
+        self.backButton.grid(row = 6, column = 2)
+        self.backButton.config(width = 8)
+
         # button to stop current execution
         self.stopButton = tk.Button(
                 self,
                 text = "Stop",
                 command = self.stopProgram,
                 state = DISABLED)
-        self.stopButton.grid(row = 6, column = 2)
+        self.stopButton.grid(row = 7, column = 2)
         self.stopButton.config(width = 8)
 
+        # entry and button to go to an instruction count when running step
+        # by step
+        self.seekEntry = tk.Entry(
+                self,
+                width = 8,
+                state = DISABLED)
+        self.seekEntry.bind('<Return>', lambda event: self.seekProgram())
+        self.seekEntry.grid(row = 8, column = 2)
+        self.seekButton = tk.Button(
+                self,
+                text = "Go to",
+                command = self.seekProgram,
+                state = DISABLED)
+        self.seekButton.grid(row = 9, column = 2)
+        self.seekButton.config(width = 8)
+
+        # button to show the execution profile of the last run
+        self.profileButton = tk.Button(
+                self,
+                text = "Profile",
+                command = self.showProfile,
+                state = DISABLED)
+        self.profileButton.grid(row = 10, column = 2)
+        self.profileButton.config(width = 8)
+
         # button to quit the program
         self.quitButton = tk.Button(
                 self,
                 text = "Quit",
-                command = root.destroy)
-        self.quitButton.grid(row = 7, column = 2)
+                command = self.master.destroy)
+        self.quitButton.grid(row = 11, column = 2)
         self.quitButton.config(width = 8)
 
     def openFile(self):
@@ -438,11 +610,12 @@ class Application(tk.Frame):
             print("Error opening source file.")
             raise OSError('Error opening source file.')
 
-        # put its content in the textbox
+        # put its content in the textbox, with a single insertion (so that
+        # the widget lays it out, and notifies the change, only once)
+        with source_file:
+            content = source_file.read()
         self.textBox.text.delete('1.0', END)
-        for line in source_file:
-            self.textBox.text.insert(END, line)
-        source_file.close() # close file
+        self.textBox.text.insert(END, content)
 
         self.saveButton["state"] = 'normal'
 
@@ -472,13 +645,20 @@ class Application(tk.Frame):
     def runProgram(self):
         """ Start the step by step execution of a program.
         """
-        source = io.StringIO(self.textBox.text.get('1.0', END))
-        self.parseSource(source)
+        try:
+            self.machine = mu0_core.Machine(self.parseSource())
+        except SourceSyntaxError as e:
+            self.outputText.set(str(e))
+            return
+        self.history = mu0_history.History(self.machine)
         # change button state
         self.runButton["state"] = DISABLED
         self.textBox.text["state"] = DISABLED
         self.stopButton["state"] = 'normal'
         self.nextButton["state"] = 'normal'
+        self.backButton["state"] = 'normal'
+        self.seekEntry["state"] = 'normal'
+        self.seekButton["state"] = 'normal'
         # run first instruction
         try:
             self.runNext()
@@ -489,20 +669,26 @@ class Application(tk.Frame):
     def resetProgramStatus(self):
         """ Reset the values of the status variables.
         """
-        self.line = 1          # source file line counter
-        self.instructions = [] # instructions
-        self.memory = {}       # RAM memory
-        self.acc = 0           # implicit accumulator register
-        self.pc = 0            # program counter
+        self.machine = None    # emulated processor, while running
+        self.history = None    # execution history, when running step by step
+        self.runJob = None     # scheduled chunk of execution for "Run all"
+        self.debugger = None   # breakpoints of "Run all", while running
+        self.detector = None   # endless loop detector of "Run all"
 
     def stopProgram(self):
         """ Halt the execution of a program.
         """
+        if self.runJob is not None:
+            self.after_cancel(self.runJob)
         self.resetProgramStatus();
         self.runButton["state"] = 'normal'
+        self.runAllButton["state"] = 'normal'
         self.textBox.text["state"] = 'normal'
         self.stopButton["state"] = DISABLED
         self.nextButton["state"] = DISABLED
+        self.backButton["state"] = DISABLED
+        self.seekEntry["state"] = DISABLED
+        self.seekButton["state"] = DISABLED
 
     def runNext(self):
         """ Run the next instruction of the program.
@@ -513,26 +699,147 @@ class Application(tk.Frame):
             self.outputText.set(e.message)
             self.stopProgram()
 
-    def runAll(self):
-        """ Run the whole program.
+    def runBack(self):
+        """ Undo the last instruction of the program.
         """
-        if self.pc == 0:
-            try:
-                self.runProgram()
-            except ExecutionComplete as e:
-                self.outputText.set(e.message)
-                self.stopProgram()
-        while True:
+        if self.history.back():
+            self.showPosition()
+
+    def seekProgram(self):
+        """ Bring the program to the instruction count in the entry.
+        """
+        try:
+            target = int(self.seekEntry.get(), 0)
+        except ValueError:
+            return
+        try:
+            status = self.history.seek(target)
+        except mu0_core.MemoryAccessError as e:
+            print("Line " + str(e.line) + ": uninitialized memory access.")
+            quit()
+        except mu0_core.WordOverflowError as e:
+            print("Line " + str(e.line) + ": arithmetic overflow.")
+            quit()
+        if status is not None:
+            self.outputText.set(self.haltMessage(status))
+            self.stopProgram()
+            return
+        self.showPosition()
+
+    def showProfile(self):
+        """ Show the execution profile of the last run in a new window.
+        """
+        window = tk.Toplevel(self)
+        window.title("Execution profile")
+        text = tk.Text(window, wrap = NONE, width = 90)
+        scrollBar = tk.Scrollbar(window, command = text.yview)
+        text.config(yscrollcommand = scrollBar.set)
+        scrollBar.pack(side = RIGHT, fill = Y)
+        text.pack(side = LEFT, fill = BOTH, expand = True)
+        text.insert(END, self.profile.report())
+        text["state"] = DISABLED
+
+    def updateBreakpoints(self):
+        """ Set the breakpoints of the debugger to the lines marked in the
+            line numbers (ignoring the lines without an instruction).
+        """
+        lines = self.textBox.linenumbers.breakpoints
+        for line in list(self.debugger.breakpoints):
+            if line not in lines:
+                self.debugger.remove_breakpoint(line)
+        for line in lines - set(self.debugger.breakpoints):
             try:
-                self.runInstruction()
-            except ExecutionComplete as e:
-                self.outputText.set(e.message)
-                self.stopProgram()
-                break
+                self.debugger.add_breakpoint(line)
+            except ValueError:
+                pass
+
+    def runAll(self):
+        """ Run the whole program, or up to the next breakpoint.
+
+            The program runs in chunks scheduled on the Tk event loop, so
+            that the window stays responsive and the execution can be
+            stopped. The output is refreshed once per frame, when the status
+            is also checked for an endless loop.
+        """
+        if self.machine is None:
+            self.runProgram()
+            if self.machine is None: # the program could not start, or ended
+                return
+            self.history.seek(0) # profile from the first instruction
+        # the history does not record the execution of the whole program,
+        # which is profiled instead (going on with the same profile after
+        # a breakpoint)
+        self.history = None
+        if self.debugger is None:
+            self.profile = mu0_profile.Profile(self.machine.program)
+            self.debugger = mu0_debug.Debugger(self.machine.program)
+        # the statuses before a pause are not checked, since the program may
+        # have been taken back meanwhile
+        self.detector = mu0_runaway.CycleDetector()
+        self.profileButton["state"] = DISABLED
+        self.runAllButton["state"] = DISABLED
+        self.nextButton["state"] = DISABLED
+        self.backButton["state"] = DISABLED
+        self.seekEntry["state"] = DISABLED
+        self.seekButton["state"] = DISABLED
+        self.runJob = self.after(0, self.runChunk)
+
+    def runChunk(self):
+        """ Run the program for a frame, then refresh the output and
+            schedule the next chunk.
+        """
+        self.runJob = None
+        machine = self.machine
+        deadline = time.perf_counter() + self.FRAME_TIME
+        self.updateBreakpoints()
+        run = self.debugger.run
+        try:
+            status = run(machine, self.CHUNK_SIZE, self.profile.run)
+            while status is None and time.perf_counter() < deadline:
+                status = run(machine, self.CHUNK_SIZE, self.profile.run)
+            if status is None and self.detector.check(machine):
+                status = mu0_core.HALT_LOOP
+        except mu0_core.MemoryAccessError as e:
+            print("Line " + str(e.line) + ": uninitialized memory access.")
+            quit()
+        except mu0_core.WordOverflowError as e:
+            print("Line " + str(e.line) + ": arithmetic overflow.")
+            quit()
+
+        if status == mu0_core.HALT_BREAK:
+            # pause, going on step by step or with "Run all"
+            self.history = mu0_history.History(machine)
+            self.outputText.set(self.debugger.hit +
+                ", at instruction count " + str(machine.steps) +
+                "\n  Current PC value:  %#0.3x" % (machine.pc) +
+                "\n  Current ACC value: " +
+                    mu0_core.format_value(machine.acc))
+            self.showMemory()
+            self.runAllButton["state"] = 'normal'
+            self.nextButton["state"] = 'normal'
+            self.backButton["state"] = 'normal'
+            self.seekEntry["state"] = 'normal'
+            self.seekButton["state"] = 'normal'
+            self.profileButton["state"] = 'normal'
+            return
+
+        if status is not None:
+            self.outputText.set(self.haltMessage(status))
+            self.stopProgram()
+            self.profileButton["state"] = 'normal'
+            return
+
+        self.outputText.set(
+            "Running... %d instructions executed" % (machine.steps) +
+            "\n  Current PC value:  %#0.3x" % (machine.pc) +
+            "\n  Current ACC value: " + mu0_core.format_value(machine.acc))
+        self.showMemory()
+        self.runJob = self.after(1, self.runChunk)
 
 # application entry point
-root = tk.Tk()
-root.title("MU0 - simple processor emulator")
-root.geometry('700x500')
-app = Application(master=root)
-app.mainloop()
+if __name__ == "__main__":
+    root = tk.Tk()
+    root.title("MU0 - simple processor emulator")
+    root.geometry('960x500')
+    app = Application(master=root)
+    app.mainloop()
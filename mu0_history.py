@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_history.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Execution history, to step backwards and to seek in time.
+
+    For each executed instruction, the history records in a binary log the
+    PC and ACC values before the instruction, and the previous content of
+    the memory location written by it (if any). A checkpoint with the whole
+    status of the machine is taken every few steps, so that seeking to any
+    instruction count costs at most the replay of a checkpoint interval,
+    while a single step backwards just undoes the last log entry.
+"""
+
+import array
+
+from mu0_core import STORE, ADDRESS_MASK
+
+NO_WRITE = -1 # address logged for instructions not writing the memory
+
+class History:
+    """ Execution history of a machine.
+    """
+    def __init__(self, machine, interval = 1024):
+        """
+            machine: machine whose execution is recorded (from its current
+                status)
+            interval: number of steps between checkpoints
+        """
+        self.machine = machine
+        self.interval = interval
+        self.base = machine.steps # instruction count at the start
+
+        # delta log, with an entry for each executed instruction
+        self.pcs = array.array('L')       # PC before the instruction
+        self.accs = array.array('q')      # ACC before the instruction
+        self.addresses = array.array('h') # location written, or NO_WRITE
+        self.olds = array.array('q')      # previous value of the location
+        self.fresh = bytearray()          # 1 if it was not initialized
+
+        # checkpoints, as (PC, ACC, initialized locations, their values)
+        self.checkpoints = []
+        self._checkpoint()
+
+    def __len__(self):
+        """ Return the number of recorded steps.
+        """
+        return len(self.pcs)
+
+    def position(self):
+        """ Return the current position in the history, in steps.
+        """
+        return self.machine.steps - self.base
+
+    def _checkpoint(self):
+        """ Save the current status of the machine as a checkpoint.
+        """
+        m = self.machine
+        self.checkpoints.append((m.pc, m.acc,
+            array.array('H', m.order),
+            array.array('q', [m.memory[a] for a in m.order])))
+
+    def _restore(self, index):
+        """ Restore the status saved in a checkpoint.
+        """
+        m = self.machine
+        m.own()
+        pc, acc, addresses, values = self.checkpoints[index]
+        image = dict(zip(addresses, values))
+        for a in m.order:
+            if a not in image:
+                m.valid[a] = 0
+                m.memory[a] = 0
+                m.dirty.add(a)
+        for a, v in image.items():
+            if not m.valid[a] or m.memory[a] != v:
+                m.valid[a] = 1
+                m.memory[a] = v
+                m.dirty.add(a)
+        m.order[:] = addresses
+        m.pc = pc
+        m.acc = acc
+        m.steps = self.base + index * self.interval
+
+    def step(self):
+        """ Execute an instruction of the machine, recording it.
+
+            Return the same as Machine.step().
+        """
+        m = self.machine
+        position = m.steps - self.base
+        if position < len(self.pcs):
+            return m.step() # replaying a recorded step
+
+        if position and position % self.interval == 0:
+            self._checkpoint()
+        pc = m.pc
+        acc = m.acc
+        address = NO_WRITE
+        old = fresh = 0
+        if pc < len(m.code) and m.code[pc] >> 12 == STORE:
+            address = m.code[pc] & ADDRESS_MASK
+            old = m.memory[address]
+            fresh = not m.valid[address]
+        status = m.step()
+        if status is None:
+            self.pcs.append(pc)
+            self.accs.append(acc)
+            self.addresses.append(address)
+            self.olds.append(old)
+            self.fresh.append(fresh)
+        return status
+
+    def back(self):
+        """ Undo the last executed instruction.
+
+            Return False if the machine is at the start of the history.
+        """
+        m = self.machine
+        position = m.steps - self.base
+        if position <= 0:
+            return False
+        i = position - 1
+        m.own()
+        m.pc = self.pcs[i]
+        m.acc = self.accs[i]
+        address = self.addresses[i]
+        if address != NO_WRITE:
+            if self.fresh[i]:
+                m.valid[address] = 0
+                m.memory[address] = 0
+                m.order.pop()
+            else:
+                m.memory[address] = self.olds[i]
+            m.dirty.add(address)
+        m.steps -= 1
+        return True
+
+    def seek(self, target):
+        """ Bring the machine to the status after the given number of steps
+            from the start of the history.
+
+            Seeking past the recorded steps runs (and records) the program,
+            which may halt before reaching the target: in this case the
+            reason of the halt is returned, otherwise None.
+        """
+        m = self.machine
+        target = max(0, target)
+        recorded = len(self.pcs)
+        position = m.steps - self.base
+
+        if target > recorded:
+            self.seek(recorded)
+            status = None
+            while status is None and m.steps - self.base < target:
+                status = self.step()
+            return status
+
+        # undo the steps if few, otherwise replay from a checkpoint
+        if position - self.interval <= target <= position:
+            while m.steps - self.base > target:
+                self.back()
+            return None
+        index = target // self.interval
+        if not (position < target and
+                target - position <= target - index * self.interval):
+            self._restore(index)
+        m.run(target - (m.steps - self.base))
+        return None
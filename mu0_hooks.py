@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_hooks.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Instrumentation hooks for the execution of mu0 programs.
+
+    Functions can be called at each event of the execution, added to a
+    machine with Machine.add_hook(event, function):
+
+        'fetch':  function(machine, pc, word), before each instruction
+        'read':   function(machine, address, value), after each read
+        'write':  function(machine, address, value), after each write
+        'branch': function(machine, pc, target), after each taken jump
+
+    Only the machines with hooks pay for them: adding the first hook makes
+    the machine step with hooked handlers, and run one step at a time,
+    while removing the last one brings back the plain handlers and the
+    inlined loop of Machine.run. The other engines (e.g. mu0_jit, or the
+    profiler) do not call the hooks.
+"""
+
+from mu0_core import STORE, SUB, JUMP, JGE, JNE, STOP, HALT_END
+
+EVENTS = ('fetch', 'read', 'write', 'branch')
+
+class Hooks:
+    """ Functions called at the events of the execution of a machine.
+    """
+    def __init__(self):
+        self.fetch = []  # functions called before each instruction
+        self.read = []   # functions called after each memory read
+        self.write = []  # functions called after each memory write
+        self.branch = [] # functions called after each taken jump
+
+    def __bool__(self):
+        return bool(self.fetch or self.read or self.write or self.branch)
+
+    def copy(self):
+        """ Return a copy of the hooks, whose lists of functions can be
+            changed without affecting the original ones.
+        """
+        other = Hooks()
+        for event in EVENTS:
+            getattr(other, event).extend(getattr(self, event))
+        return other
+
+    def add(self, event, function):
+        """ Add a function to call at each event of a kind, raising
+            ValueError for an unknown kind.
+        """
+        if event not in EVENTS:
+            raise ValueError("Unknown event \"" + str(event) + "\".")
+        getattr(self, event).append(function)
+
+    def remove(self, event, function):
+        """ Remove a function added for a kind of event, if present.
+        """
+        if event in EVENTS and function in getattr(self, event):
+            getattr(self, event).remove(function)
+
+    def wrap(self, machine, handlers):
+        """ Return the handlers of the opcodes of a machine (as used by
+            Machine.step()), wrapped to call the hooks.
+        """
+        shift = machine.address_bits
+        def hooked(op, handler):
+            def execute(address):
+                pc = machine.pc
+                for function in self.fetch:
+                    function(machine, pc, op << shift | address)
+                if op == JGE:
+                    taken = machine.acc >= 0
+                elif op == JNE:
+                    taken = machine.acc != 0
+                else:
+                    taken = op == JUMP
+                status = handler(address)
+                if op == STORE:
+                    for function in self.write:
+                        function(machine, address, machine.acc)
+                elif op <= SUB:
+                    for function in self.read:
+                        function(machine, address, machine.memory[address])
+                elif taken:
+                    for function in self.branch:
+                        function(machine, pc, address)
+                return status
+            return execute
+        # traps are not instructions of the program (see mu0_debug)
+        return tuple([hooked(op, h) if op <= STOP else h
+            for op, h in enumerate(handlers)])
+
+    def run(self, machine, limit = None):
+        """ Same as machine.run(limit) for a machine with hooks, stepping
+            with the hooked handlers.
+        """
+        step = machine.step
+        end = len(machine.code)
+        if limit is not None:
+            for i in range(limit):
+                status = step()
+                if status is not None:
+                    return status
+        else:
+            while True:
+                status = step()
+                if status is not None:
+                    return status
+        return HALT_END if machine.pc >= end else None
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_jit.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Translation of mu0 programs into Python functions.
+
+    The program is split into basic blocks, delimited by jumps, jump targets
+    and STOP instructions. Each block is interpreted until it has been
+    entered HOT times, and then translated into the source of a Python
+    function, compiled and cached, so that a whole block runs with a single
+    call. A block jumping back to its own start is translated into a loop
+    inside the function.
+
+    Compiling a block costs about as much as interpreting a few thousand
+    instructions, so code run only a few times (e.g. a long straight-line
+    program) is never compiled, and the blocks compiled are at most
+    MAX_BLOCK instructions long.
+"""
+
+import bisect
+import sys
+
+from mu0_core import LOAD, STORE, ADD, SUB, JUMP, JGE, JNE, STOP, \
+        ADDRESS_MASK, HALT_STOP, HALT_END, WORD_MIN, WORD_MAX
+
+# upper bound for the number of instructions executed in a single call
+FOREVER = sys.maxsize
+
+# translations, by program code
+_translations = {}
+MAX_TRANSLATIONS = 64
+
+HOT = 16         # entries to a block before it is translated
+MAX_BLOCK = 256  # maximum number of instructions in a translated block
+
+class _Overflow(Exception):
+    """ Exception risen by a block when the result of an ADD or SUB does not
+        fit in a word, with the position of the instruction, ACC before it
+        and the number of instructions executed before it.
+    """
+
+class Translation:
+    """ Blocks translated for a program, indexed by their first instruction.
+    """
+    def __init__(self, code):
+        self.code = code
+        self.blocks = [None] * len(code) # compiled block functions
+        self.sizes = [0] * len(code)     # instructions in each block
+        self.stores = [()] * len(code)   # locations written by each block
+        self.sources = {}                # generated source of each block
+        self.entries = bytearray(len(code)) # entries to each cold block
+
+        # find the leaders, i.e. the instructions starting a block
+        self.leaders = set([0])
+        for i, word in enumerate(code):
+            op = word >> 12
+            if op == JUMP or op == JGE or op == JNE:
+                self.leaders.add(word & ADDRESS_MASK)
+                self.leaders.add(i + 1)
+            elif op == STOP:
+                self.leaders.add(i)
+                self.leaders.add(i + 1)
+        self.starts = sorted(self.leaders) # leaders, in program order
+
+    def length(self, start):
+        """ Return the number of instructions from the given one to the end
+            of its block (i.e. to the next leader, or to the end of the
+            code).
+        """
+        starts = self.starts
+        i = bisect.bisect_right(starts, start)
+        return (starts[i] if i < len(starts) else len(self.code)) - start
+
+    def translate(self, start):
+        """ Translate the block starting at the given instruction, and
+            return the compiled function.
+
+            The function takes the accumulator, the memory, the initialized
+            flags and locations (in initialization order) and the maximum
+            number of instructions to run, and returns the new program
+            counter, the new accumulator and the number of executed
+            instructions. It returns None, without running anything, if any
+            location read by the block before writing it is uninitialized
+            (the locations written are initialized as by the interpreter),
+            and raises
+            _Overflow when the result of an ADD or SUB does not fit in a word.
+        """
+        code = self.code
+        end = len(code)
+        body = []        # statements for the block
+        used = []        # locations read before being written
+        stores = set()   # locations written by the block
+        i = start
+        exit = None      # statements leaving the block
+        loop = False     # True if the block jumps back to its start
+        while True:
+            word = code[i]
+            op = word >> 12
+            address = word & ADDRESS_MASK
+            if op <= SUB and op != STORE and address not in used and \
+                    address not in stores:
+                used.append(address)
+            if op == LOAD:
+                body.append('acc = memory[%d]' % address)
+            elif op == STORE:
+                body.append('memory[%d] = acc' % address)
+                body.append('if not valid[%d]:' % address)
+                body.append('    valid[%d] = 1' % address)
+                body.append('    order.append(%d)' % address)
+                stores.add(address)
+            elif op == ADD or op == SUB:
+                body.append('acc %s= memory[%d]' % ('+-'[op - ADD], address))
+                body.append('if not %d <= acc <= %d:' % (WORD_MIN, WORD_MAX))
+                body.append('    raise _Overflow(%d, acc %s memory[%d], '
+                        'n + %d)' % (i, '-+'[op - ADD], address, i - start))
+            else:
+                # condition for the jump to be taken
+                taken = 'acc >= 0' if op == JGE else 'acc != 0'
+                loop = address == start
+                if loop and op == JUMP:
+                    exit = []
+                elif loop:
+                    exit = ['if not %s:' % taken,
+                            '    return (%d, acc, n)' % (i + 1)]
+                elif op == JUMP:
+                    exit = ['return (%d, acc, n)' % address]
+                else:
+                    exit = ['return (%d if %s else %d, acc, n)'
+                            % (address, taken, i + 1)]
+                i += 1
+                break
+            i += 1
+            if i >= end or i in self.leaders or i - start >= MAX_BLOCK:
+                exit = ['return (%d, acc, n)' % i]
+                break
+        size = i - start
+
+        src = ['def block(acc, memory, valid, order, limit):']
+        if used:
+            src.append('    if not (%s):' %
+                    ' and '.join(['valid[%d]' % a for a in used]))
+            src.append('        return None')
+        src.append('    n = 0')
+        if loop:
+            src.append('    while n < limit:')
+            src.extend(['        ' + s for s in body])
+            src.append('        n += %d' % size)
+            src.extend(['        ' + s for s in exit])
+            src.append('    return (%d, acc, n)' % start)
+        else:
+            src.extend(['    ' + s for s in body])
+            src.append('    n += %d' % size)
+            src.extend(['    ' + s for s in exit])
+        src = '\n'.join(src) + '\n'
+
+        namespace = {'_Overflow': _Overflow}
+        exec(compile(src, '<mu0 block %#0.3x>' % start, 'exec'), namespace)
+        self.blocks[start] = namespace['block']
+        self.sizes[start] = size
+        self.stores[start] = tuple(stores)
+        self.sources[start] = src
+        return self.blocks[start]
+
+def translation(program):
+    """ Return the (cached) translation for a program.
+    """
+    key = program.code.tobytes()
+    t = _translations.get(key)
+    if t is None:
+        if len(_translations) >= MAX_TRANSLATIONS:
+            _translations.clear()
+        t = _translations[key] = Translation(program.code)
+    return t
+
+def clear_cache():
+    """ Forget the translations of all the programs.
+    """
+    _translations.clear()
+
+def run(machine, limit = None):
+    """ Run the program loaded in a machine until it halts, executing the
+        translated blocks, and return the reason why it halted.
+
+        If limit is given, at most limit instructions are executed, and None
+        is returned if the program did not halt meanwhile.
+    """
+    machine.own()
+    t = translation(machine.program)
+    blocks = t.blocks
+    entries = t.entries
+    stores = t.stores
+    dirty = machine.dirty
+    code = machine.code
+    memory = machine.memory
+    valid = machine.valid
+    order = machine.order
+    end = len(code)
+    pc = machine.pc
+    acc = machine.acc
+    steps = machine.steps
+    last = steps + limit if limit is not None else FOREVER
+    try:
+        while pc < end:
+            block = blocks[pc]
+            if block is None:
+                if code[pc] >> 12 == STOP:
+                    return HALT_STOP if steps < last else None
+                if entries[pc] < HOT:
+                    # cold block, interpret it up to its end (or the limit)
+                    entries[pc] += 1
+                    machine.pc = pc
+                    machine.acc = acc
+                    machine.steps = steps
+                    try:
+                        status = machine.run(min(t.length(pc), last - steps))
+                    finally:
+                        pc = machine.pc
+                        acc = machine.acc
+                        steps = machine.steps
+                    if status is not None or steps >= last:
+                        return status
+                    continue
+                block = t.translate(pc)
+            room = last - steps - t.sizes[pc] # left after running the block
+            if room < 0:
+                # the limit falls inside the block, interpret up to it
+                machine.pc = pc
+                machine.acc = acc
+                machine.steps = steps
+                try:
+                    return machine.run(last - steps)
+                finally:
+                    pc = machine.pc
+                    acc = machine.acc
+                    steps = machine.steps
+            try:
+                result = block(acc, memory, valid, order, room + 1)
+            except _Overflow as e:
+                # let the interpreter report the fault at the instruction
+                dirty.update(stores[pc])
+                pc, acc, n = e.args
+                steps += n
+                machine.pc = pc
+                machine.acc = acc
+                machine.steps = steps
+                machine.step()
+            if result is None:
+                # some location read is uninitialized: interpret the
+                # block, so that the fault is reported
+                machine.pc = pc
+                machine.acc = acc
+                machine.steps = steps
+                try:
+                    for _ in range(t.sizes[pc]):
+                        machine.step()
+                finally:
+                    pc = machine.pc
+                    acc = machine.acc
+                    steps = machine.steps
+            else:
+                if stores[pc]:
+                    dirty.update(stores[pc])
+                pc, acc, n = result
+                steps += n
+        return HALT_END
+    finally:
+        machine.pc = pc
+        machine.acc = acc
+        machine.steps = steps
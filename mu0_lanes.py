@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_lanes.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Vectorized execution of a program over many memory images.
+
+    Each lane is an independent machine running the same program. The
+    registers of all lanes are kept in NumPy vectors and their memory in a
+    matrix with one row per lane, so that each step executes an instruction
+    for all the lanes sharing the same program counter at once. Lanes
+    diverging on JGE/JNE are grouped by program counter, and halted lanes
+    are dropped from the set of running ones.
+
+    Since mu0 has no indirect addressing, only the locations named in the
+    program or in the memory images can ever be accessed: the memory matrix
+    has a column for each of them, instead of the whole address space.
+
+    The registers and the memory are 64-bit integers, as the words of
+    mu0_core: a lane whose ADD or SUB result does not fit is halted with
+    HALT_OVERFLOW (without changing its ACC), where Machine.run() raises
+    WordOverflowError.
+"""
+
+import mu0_core
+from mu0_core import LOAD, STORE, ADD, SUB, JUMP, JGE, STOP, \
+        ADDRESS_MASK, HALT_STOP, HALT_END, HALT_FAULT, HALT_OVERFLOW
+
+# numpy support
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# status of each lane
+RUNNING = 0
+STOPPED = 1 # a STOP instruction was reached
+ENDED = 2   # the program counter went past the last instruction
+FAULTED = 3 # an uninitialized location was read
+OVERFLOWED = 4 # the result of an ADD or SUB did not fit in a word
+
+# reason of halt for each status, as returned by Machine.run()
+STATUS_NAMES = (None, HALT_STOP, HALT_END, HALT_FAULT, HALT_OVERFLOW)
+
+class Lanes:
+    """ A set of machines running the same program from different initial
+        memory images.
+    """
+    def __init__(self, program, images):
+        """
+            program: decoded program
+            images: for each lane, a dictionary address -> value with the
+                locations to initialize, in addition to the INI ones
+        """
+        if np is None:
+            raise RuntimeError("NumPy support missing")
+        self.program = program
+        self.code = program.code
+        n = len(images)
+
+        # locations that may be accessed, each mapped to a memory column
+        addresses = list(program.data)
+        for image in images:
+            addresses.extend(image)
+        for word in program.code:
+            if word >> 12 <= SUB:
+                addresses.append(word & ADDRESS_MASK)
+        self.addresses = sorted(set(addresses))
+        self.column = dict((a, c) for c, a in enumerate(self.addresses))
+
+        self.memory = np.zeros((n, len(self.addresses)), dtype = np.int64)
+        self.valid = np.zeros((n, len(self.addresses)), dtype = bool)
+        for a, v in program.data.items():
+            self.memory[:, self.column[a]] = v
+            self.valid[:, self.column[a]] = True
+        for lane, image in enumerate(images):
+            for a, v in image.items():
+                self.memory[lane, self.column[a]] = v
+                self.valid[lane, self.column[a]] = True
+
+        self.acc = np.zeros(n, dtype = np.int64)   # accumulators
+        self.pc = np.zeros(n, dtype = np.int64)    # program counters
+        self.steps = np.zeros(n, dtype = np.int64) # executed instructions
+        self.status = np.zeros(n, dtype = np.int8) # lane status
+        self.running = np.arange(n)                # indices of running lanes
+
+    def __len__(self):
+        return len(self.acc)
+
+    def step(self):
+        """ Execute an instruction on each running lane.
+
+            Return the number of lanes still running.
+        """
+        running = self.running
+        if not len(running):
+            return 0
+        pcs = self.pc[running]
+
+        # execute the instructions, grouping the lanes by program counter
+        first = pcs[0]
+        if (pcs == first).all():
+            groups = [(first, running)]
+        else:
+            groups = [(p, running[pcs == p]) for p in np.unique(pcs)]
+        halted = False
+        for p, lanes in groups:
+            halted |= self._execute(int(p), lanes)
+
+        # drop the halted lanes from the running ones
+        if halted:
+            self.running = running[self.status[running] == RUNNING]
+        return len(self.running)
+
+    def _execute(self, pc, lanes):
+        """ Execute the instruction at the given position on the selected
+            lanes (given as an index array).
+
+            Return True if any of the lanes halted.
+        """
+        if pc >= len(self.code):
+            self.status[lanes] = ENDED
+            return True
+        word = self.code[pc]
+        op = word >> 12
+        address = word & ADDRESS_MASK
+        halted = False
+        if op == STOP:
+            self.status[lanes] = STOPPED
+            return True
+        if op <= SUB:
+            column = self.column[address]
+            if op == STORE:
+                self.memory[lanes, column] = self.acc[lanes]
+                self.valid[lanes, column] = True
+            else:
+                # lanes reading an uninitialized location are halted
+                bad = ~self.valid[lanes, column]
+                if bad.any():
+                    self.status[lanes[bad]] = FAULTED
+                    lanes = lanes[~bad]
+                    halted = True
+                if op == LOAD:
+                    self.acc[lanes] = self.memory[lanes, column]
+                else:
+                    acc = self.acc[lanes]
+                    value = self.memory[lanes, column]
+                    if op == ADD:
+                        result = acc + value
+                        wrapped = (acc ^ result) & (value ^ result)
+                    else:
+                        result = acc - value
+                        wrapped = (acc ^ value) & (acc ^ result)
+                    # the sign is wrong when the result wrapped around
+                    bad = wrapped < 0
+                    if bad.any():
+                        self.status[lanes[bad]] = OVERFLOWED
+                        lanes = lanes[~bad]
+                        result = result[~bad]
+                        halted = True
+                    self.acc[lanes] = result
+            self.pc[lanes] += 1
+        elif op == JUMP:
+            self.pc[lanes] = address
+        else:
+            if op == JGE:
+                taken = lanes[self.acc[lanes] >= 0]
+            else:
+                taken = lanes[self.acc[lanes] != 0]
+            self.pc[lanes] += 1
+            self.pc[taken] = address
+        self.steps[lanes] += 1
+        return halted
+
+    def run(self, limit = None):
+        """ Run all the lanes until they halt, or for at most limit steps.
+
+            Return the number of lanes still running.
+        """
+        running = len(self.running)
+        count = 0
+        while running and (limit is None or count < limit):
+            running = self.step()
+            count += 1
+        if running:
+            # lanes past the last instruction have ended, as for Machine.run
+            lanes = self.running
+            ended = self.pc[lanes] >= len(self.code)
+            if ended.any():
+                self.status[lanes[ended]] = ENDED
+                self.running = lanes[~ended]
+                running = len(self.running)
+        return running
+
+    def result(self, lane):
+        """ Return the reason why a lane halted (None if still running).
+        """
+        return STATUS_NAMES[self.status[lane]]
+
+    def machine(self, lane):
+        """ Return a Machine with the status of a lane.
+
+            INI locations are listed first in its dumps, followed by the
+            other initialized locations in address order.
+        """
+        machine = mu0_core.Machine(self.program)
+        for c, a in enumerate(self.addresses):
+            if self.valid[lane, c]:
+                machine.write(a, int(self.memory[lane, c]))
+        machine.acc = int(self.acc[lane])
+        machine.pc = int(self.pc[lane])
+        machine.steps = int(self.steps[lane])
+        return machine
+
+def run(program, images, limit = None):
+    """ Run a program over a list of initial memory images, and return the
+        Lanes holding the final status.
+    """
+    lanes = Lanes(program, images)
+    lanes.run(limit)
+    return lanes
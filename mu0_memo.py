@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_memo.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Cache of the results of runs, keyed by program and initial status.
+
+    A run is fully determined by the instruction words, the status of the
+    machine before it (registers and initialized memory) and the
+    instruction limit, so its result can be looked up by a hash of them.
+    The result is stored as the reason why the program halted, the address
+    accessed by the faulting instruction (for a fault) and the snapshot of
+    the machine after the run.
+
+    Results are kept in a least recently used cache in memory, backed by a
+    sqlite database on disk (in the cache directory of the assembled
+    programs), whose least recently used entries are evicted when its size
+    exceeds a bound. Runs halted by a timeout are not cached, since they
+    depend on the speed of the host, and neither are the endless loops
+    halted by a CycleDetector, which other runs would not halt.
+"""
+
+import collections
+import hashlib
+import os
+import sqlite3
+import struct
+import time
+
+import mu0_object
+from mu0_core import HALT_FAULT, HALT_TIMEOUT, HALT_LOOP, MemoryAccessError
+
+CAPACITY = 256             # results kept in memory
+MAX_SIZE = 64 * 1024 * 1024 # bound for the size of the database, in bytes
+EVICT_INTERVAL = 64        # results stored between checks of the size
+NO_LIMIT = -1              # limit hashed for runs without one
+
+def default_path():
+    """ Return the path of the result database in the cache directory.
+    """
+    return os.path.join(mu0_object.cache_dir(), 'results.sqlite')
+
+def key(machine, limit = None):
+    """ Return the key for a run of a machine from its current status.
+    """
+    h = hashlib.sha256(struct.pack('<q',
+        NO_LIMIT if limit is None else limit))
+    h.update(machine.program.code.tobytes())
+    h.update(machine.snapshot())
+    return h.hexdigest()
+
+class Memo:
+    """ Two-tier cache of run results.
+    """
+    def __init__(self, path = None, capacity = CAPACITY,
+            max_size = MAX_SIZE):
+        """
+            path: path of the database (no database is used if None)
+            capacity: number of results kept in memory
+            max_size: bound for the size of the database, in bytes
+        """
+        self.path = path
+        self.capacity = capacity
+        self.max_size = max_size
+        self.results = collections.OrderedDict() # in memory, by key
+        self.db = None     # database connection, opened when needed
+        self.stored = 0    # results stored since the last size check
+
+    def _connect(self):
+        """ Return the database connection, or None if there is no usable
+            database.
+        """
+        if self.db is None and self.path is not None:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                        exist_ok = True)
+                self.db = sqlite3.connect(self.path, timeout = 10.)
+                self.db.execute('PRAGMA journal_mode = WAL')
+                self.db.execute('CREATE TABLE IF NOT EXISTS results ('
+                        'key TEXT PRIMARY KEY, status TEXT, '
+                        'address INTEGER, image BLOB, used REAL)')
+                self.db.commit()
+            except (OSError, sqlite3.Error):
+                self._disable()
+        return self.db
+
+    def _disable(self):
+        """ Stop using the database, after an error.
+        """
+        if self.db is not None:
+            self.db.close()
+        self.db = None
+        self.path = None # caching is just an optimization
+
+    def _remember(self, key, result):
+        """ Store a result in memory.
+        """
+        self.results[key] = result
+        self.results.move_to_end(key)
+        if len(self.results) > self.capacity:
+            self.results.popitem(last = False)
+
+    def get(self, key):
+        """ Return the result for a key, as (status, address, snapshot), or
+            None if it is not cached.
+        """
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+            return result
+        db = self._connect()
+        if db is None:
+            return None
+        try:
+            row = db.execute('SELECT status, address, image FROM results '
+                    'WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute('UPDATE results SET used = ? WHERE key = ?',
+                    (time.time(), key))
+            db.commit()
+        except sqlite3.Error:
+            self._disable()
+            return None
+        result = (row[0], row[1], bytes(row[2]))
+        self._remember(key, result)
+        return result
+
+    def put(self, key, status, address, image):
+        """ Store the result for a key.
+        """
+        self._remember(key, (status, address, image))
+        db = self._connect()
+        if db is None:
+            return
+        try:
+            db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                    (key, status, address, image, time.time()))
+            if self.stored % EVICT_INTERVAL == 0:
+                self._evict()
+            self.stored += 1
+            db.commit()
+        except sqlite3.Error:
+            self._disable()
+
+    def _evict(self):
+        """ Delete the least recently used results from the database while
+            its size exceeds the bound.
+        """
+        size, = self.db.execute('SELECT TOTAL(LENGTH(image) + LENGTH(key)) '
+                'FROM results').fetchone()
+        if size <= self.max_size:
+            return
+        # keep the most recently used results, up to 3/4 of the bound
+        self.db.execute('DELETE FROM results WHERE key IN (SELECT key FROM '
+                '(SELECT key, SUM(LENGTH(image) + LENGTH(key)) OVER '
+                '(ORDER BY used DESC, key) AS total FROM results) '
+                'WHERE total > ?)', (self.max_size * 3 // 4,))
+
+    def close(self):
+        """ Close the database.
+        """
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+def run(machine, run, memo, limit = None):
+    """ Run a machine with the given function (taking the machine and the
+        limit, as Machine.run), unless the result is cached, and return the
+        reason why it halted and True if the run was skipped.
+
+        A MemoryAccessError is risen for a faulting run, as by the function,
+        and so is a WordOverflowError (the runs halted by an overflow are not
+        cached).
+    """
+    k = key(machine, limit)
+    result = memo.get(k)
+    if result is not None:
+        status, address, image = result
+        machine.restore(image)
+        if status == HALT_FAULT:
+            raise MemoryAccessError(machine.line(), address)
+        return status, True
+
+    try:
+        status = run(machine, limit)
+    except MemoryAccessError as e:
+        memo.put(k, HALT_FAULT, e.address, machine.snapshot())
+        raise
+    if status is not None and status not in (HALT_TIMEOUT, HALT_LOOP):
+        memo.put(k, status, None, machine.snapshot())
+    return status, False
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_object.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Binary object format for assembled mu0 programs.
+
+    An object image contains, in little endian order:
+        - a header (magic string, number of instructions, number of
+          initialized locations, size of the comments table);
+        - the packed instruction words (16 bit each);
+        - the source line of each instruction (32 bit each);
+        - the addresses (16 bit each) and the values (64 bit each) of the
+          locations initialized by INI, in source order;
+        - the comments of the instructions, in UTF-8, separated by newlines
+          (a NUL character stands for a missing comment).
+
+    Object images are loaded with mmap, and are also used as a cache of the
+    assembled sources, keyed by a hash of the source text, of the address
+    width and of the versions of the assembler and of the format.
+"""
+
+import array
+import hashlib
+import io
+import mmap
+import os
+import struct
+import sys
+
+import mu0_asm
+import mu0_core
+
+MAGIC = b'MU0\x01'
+HEADER = struct.Struct('<4sIII')
+NO_COMMENT = '\0'
+
+def dumps(program):
+    """ Return the object image of a program, as bytes.
+    """
+    lines = array.array('I', program.lines)
+    addresses = array.array('H', program.data.keys())
+    values = array.array('q', program.data.values())
+    code = array.array('H', program.code)
+    if sys.byteorder == 'big':
+        for a in (code, lines, addresses, values):
+            a.byteswap()
+    comments = '\n'.join(NO_COMMENT if c is None else c
+            for c in program.comments).encode('utf-8')
+    return b''.join([
+        HEADER.pack(MAGIC, len(code), len(addresses), len(comments)),
+        code.tobytes(),
+        lines.tobytes(),
+        addresses.tobytes(),
+        values.tobytes(),
+        comments,
+    ])
+
+def loads(image):
+    """ Return the Program for an object image (any bytes-like object).
+    """
+    if len(image) < HEADER.size:
+        raise ValueError("Truncated object image.")
+    magic, n, d, size = HEADER.unpack_from(image)
+    if magic != MAGIC:
+        raise ValueError("Not a mu0 object image.")
+    if len(image) != HEADER.size + 6 * n + 10 * d + size:
+        raise ValueError("Truncated object image.")
+
+    program = mu0_core.Program()
+    addresses = array.array('H')
+    values = array.array('q')
+    lines = array.array('I')
+    offset = HEADER.size
+    for a, count in ((program.code, n), (lines, n),
+            (addresses, d), (values, d)):
+        end = offset + a.itemsize * count
+        a.frombytes(image[offset:end])
+        offset = end
+        if sys.byteorder == 'big':
+            a.byteswap()
+    program.lines = lines.tolist()
+    program.data = dict(zip(addresses, values))
+    if n:
+        program.comments = [None if c == NO_COMMENT else c
+                for c in bytes(image[offset:]).decode('utf-8').split('\n')]
+    return program
+
+def save(program, path):
+    """ Write the object image of a program to a file.
+    """
+    write_file(path, dumps(program))
+
+def write_file(path, data):
+    """ Write data to a file, replaced atomically, so that concurrent readers
+        (or a later run, if this one is killed) never see a partially written
+        file.
+    """
+    import tempfile # only needed when writing
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp = tempfile.mkstemp(dir = directory, suffix = '.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp, 0o666 & ~umask) # same mode as a file made by open()
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+
+def load(path):
+    """ Load the Program contained in an object file.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError("Not a mu0 object image.")
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as image:
+            return loads(image)
+
+def is_object(path):
+    """ Return True if the file at the given path is an object image.
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def cache_dir():
+    """ Return the directory for cached object images.
+    """
+    path = os.environ.get('MU0_CACHE_DIR')
+    if not path:
+        path = os.path.join(
+                os.environ.get('XDG_CACHE_HOME') or
+                    os.path.join(os.path.expanduser('~'), '.cache'),
+                'mu0')
+    return path
+
+def cache_key(text, address_bits = mu0_core.ADDRESS_BITS):
+    """ Return the key of the cached object image for a source text (as
+        bytes) assembled for the given address width.
+    """
+    h = hashlib.sha256(MAGIC)
+    h.update(struct.pack('<II', mu0_asm.VERSION, address_bits))
+    h.update(text)
+    return h.hexdigest()
+
+def cached_assemble(source_path, log = None, cache = True,
+        address_bits = mu0_core.ADDRESS_BITS):
+    """ Return the Program for a source file (or for an object file), and
+        True if parsing was skipped.
+
+        When cache is True, the object image of an assembled source is
+        stored in the cache directory, keyed by cache_key(), and it is
+        loaded instead of parsing the source again. Programs for the wide
+        address widths are not cached, since object images only hold the
+        12-bit ones.
+    """
+    if is_object(source_path):
+        return load(source_path), True
+    with open(source_path, 'rb') as f:
+        text = f.read()
+
+    cache = cache and address_bits == mu0_core.ADDRESS_BITS
+    path = os.path.join(cache_dir(), cache_key(text, address_bits) + '.mu0o')
+    if cache and os.path.isfile(path):
+        try:
+            return load(path), True
+        except (OSError, ValueError):
+            pass # broken cache entry, parse the source again
+
+    program = mu0_asm.assemble(
+            io.StringIO(text.decode('utf-8'), newline = None), log,
+            address_bits)
+    if cache:
+        try:
+            os.makedirs(cache_dir(), exist_ok = True)
+            save(program, path)
+        except OSError:
+            pass # caching is just an optimization
+    return program, False
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_opt.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Static optimizer for decoded mu0 programs.
+
+    The optimizer rewrites a program into an equivalent one executing fewer
+    instructions, with the same final registers and memory (only the
+    number of executed instructions changes). The passes, repeated until
+    nothing changes, are:
+        - jump threading: jumps to a JUMP are redirected to its target;
+        - redundant instructions: within a basic block, the value of ACC
+          is tracked (it is known after loading an INI location that is
+          never written, the constant locations), together with the
+          locations known to hold the same value as ACC, so that loads,
+          stores, additions of zero and conditional jumps with a known
+          outcome are removed (or turned into a JUMP), e.g. the LOAD X
+          following a STORE X;
+        - dead stores: a STORE overwritten by a later STORE to the same
+          location in straight-line code, with no read of it in between;
+        - unreachable code, e.g. after a STOP or a JUMP.
+
+    The source line and the comment of each instruction are kept, so that
+    messages and step by step output refer to the original source.
+
+    Constant locations are assumed to hold their INI values: programs whose
+    memory is changed before running (as in batch jobs) must not be
+    optimized.
+"""
+
+import mu0_core
+from mu0_core import LOAD, STORE, ADD, SUB, JUMP, JGE, JNE, STOP, \
+        ADDRESS_MASK
+
+class _Code:
+    """ Program being optimized, as lists of opcodes, addresses, source
+        lines and comments, where removed instructions are marked.
+    """
+    def __init__(self, program):
+        self.ops = [word >> 12 for word in program.code]
+        self.addresses = [word & ADDRESS_MASK for word in program.code]
+        self.lines = list(program.lines)
+        self.comments = list(program.comments)
+        self.removed = [False] * len(program.code)
+        self.data = program.data
+
+    def __len__(self):
+        return len(self.ops)
+
+    def constants(self):
+        """ Return the constant locations, as a dictionary address -> value.
+        """
+        stored = set(a for op, a in zip(self.ops, self.addresses)
+                if op == STORE)
+        return dict((a, v) for a, v in self.data.items() if a not in stored)
+
+    def leaders(self):
+        """ Return the set of the instructions starting a basic block.
+        """
+        leaders = set([0])
+        for i, op in enumerate(self.ops):
+            if op == JUMP or op == JGE or op == JNE:
+                leaders.add(self.addresses[i])
+                leaders.add(i + 1)
+            elif op == STOP:
+                leaders.add(i + 1)
+        return leaders
+
+    def compact(self):
+        """ Drop the removed instructions, relocating the jump targets.
+        """
+        n = len(self.ops)
+        # new position of each instruction (or of the next kept one)
+        position = [0] * (n + 1)
+        kept = 0
+        for i in range(n):
+            position[i] = kept
+            if not self.removed[i]:
+                kept += 1
+        position[n] = kept
+        for i, op in enumerate(self.ops):
+            if op == JUMP or op == JGE or op == JNE:
+                target = self.addresses[i]
+                # targets past the end keep their distance from it
+                self.addresses[i] = position[target] if target < n else \
+                        target - n + kept
+        keep = [not r for r in self.removed]
+        for name in ('ops', 'addresses', 'lines', 'comments'):
+            setattr(self, name, [x for x, k in
+                zip(getattr(self, name), keep) if k])
+        self.removed = [False] * kept
+
+    def program(self):
+        """ Return the optimized Program.
+        """
+        program = mu0_core.Program()
+        for op, address, line, comment in zip(self.ops, self.addresses,
+                self.lines, self.comments):
+            program.append(op, address, line, comment)
+        program.data = dict(self.data)
+        return program
+
+def _thread_jumps(code):
+    """ Redirect the jumps to a JUMP to its final target.
+    """
+    changed = False
+    n = len(code)
+    for i, op in enumerate(code.ops):
+        if op != JUMP and op != JGE and op != JNE:
+            continue
+        target = code.addresses[i]
+        seen = set([i])
+        while target < n and code.ops[target] == JUMP and \
+                target not in seen:
+            seen.add(target)
+            target = code.addresses[target]
+        if target != code.addresses[i]:
+            code.addresses[i] = target
+            changed = True
+    return changed
+
+def _remove_redundant(code):
+    """ Remove the instructions not changing the status of the machine,
+        tracking ACC within each basic block.
+    """
+    changed = False
+    constants = code.constants()
+    leaders = code.leaders()
+    acc = None  # value of ACC, if known
+    same = set() # locations known to hold the same value as ACC
+    for i, op in enumerate(code.ops):
+        if i in leaders:
+            acc = None
+            same = set()
+        address = code.addresses[i]
+        value = constants.get(address)
+        remove = False
+        if op == LOAD:
+            if address in same or (value is not None and acc == value):
+                remove = True
+            else:
+                acc = value
+                same = set([address])
+        elif op == STORE:
+            if address in same:
+                remove = True
+            else:
+                same.add(address)
+        elif op == ADD or op == SUB:
+            if value == 0:
+                remove = True
+            else:
+                if acc is not None and value is not None:
+                    acc = acc + value if op == ADD else acc - value
+                else:
+                    acc = None
+                same = set()
+        elif op == JUMP:
+            remove = address == i + 1
+        elif op == JGE or op == JNE:
+            if address == i + 1:
+                remove = True
+            elif acc is not None:
+                if (acc >= 0) if op == JGE else (acc != 0):
+                    code.ops[i] = JUMP
+                    changed = True
+                else:
+                    remove = True
+        if remove:
+            code.removed[i] = True
+            changed = True
+    return changed
+
+def _remove_dead_stores(code):
+    """ Remove the stores overwritten before being read, in straight-line
+        code.
+
+        Only reads of constant locations (which cannot fault) may occur
+        between the two stores, so that the location is overwritten
+        whenever the first store is executed, and no other location is
+        initialized in between (keeping the order of the memory dumps).
+    """
+    changed = False
+    constants = code.constants()
+    n = len(code)
+    for i, op in enumerate(code.ops):
+        if op != STORE or code.removed[i]:
+            continue
+        address = code.addresses[i]
+        j = i + 1
+        while j < n and (code.removed[j] or (
+                code.ops[j] in (LOAD, ADD, SUB) and
+                code.addresses[j] != address and
+                code.addresses[j] in constants)):
+            j += 1
+        if j < n and code.ops[j] == STORE and code.addresses[j] == address:
+            code.removed[i] = True
+            changed = True
+    return changed
+
+def _remove_unreachable(code):
+    """ Remove the instructions that cannot be reached from the first one.
+    """
+    n = len(code)
+    reached = [False] * n
+    pending = [0] if n else []
+    while pending:
+        i = pending.pop()
+        if i >= n or reached[i]:
+            continue
+        reached[i] = True
+        op = code.ops[i]
+        if op == JUMP:
+            pending.append(code.addresses[i])
+        elif op == JGE or op == JNE:
+            pending.append(code.addresses[i])
+            pending.append(i + 1)
+        elif op != STOP:
+            pending.append(i + 1)
+    changed = False
+    for i in range(n):
+        if not reached[i] and not code.removed[i]:
+            code.removed[i] = True
+            changed = True
+    return changed
+
+def optimize(program):
+    """ Return an optimized version of a program.
+    """
+    code = _Code(program)
+    changed = True
+    while changed:
+        changed = _thread_jumps(code)
+        changed |= _remove_redundant(code)
+        code.compact()
+        changed |= _remove_dead_stores(code)
+        changed |= _remove_unreachable(code)
+        code.compact()
+    return code.program()
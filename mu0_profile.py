@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_profile.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Execution profiler for mu0 programs.
+
+    To keep the overhead low, the profiling interpreter only counts the
+    taken branches (in an array with a counter for each instruction), and
+    where each run started and stopped. Since control only leaves the
+    sequential flow on a taken branch, the execution count of each
+    instruction follows from these, in a single pass over the program:
+
+        count[i] = taken branches to i + count[i-1] - taken[i-1]
+                   + runs started at i - runs stopped at i
+
+    The memory accesses are derived from the counts too, since each
+    instruction always accesses the same location.
+"""
+
+import array
+import sys
+
+from mu0_core import STORE, SUB, STOP, \
+        MNEMONICS, ADDRESS_MASK, HALT_STOP, HALT_END, HALT_TRAP, \
+        MemoryAccessError, WordOverflowError, WORD_MIN, WORD_MAX
+
+class Profile:
+    """ Execution profile of a program, collected over one or more runs.
+    """
+    def __init__(self, program):
+        self.program = program
+        n = len(program.code)
+        self.taken = array.array('q', bytes(8 * n))  # taken branch counts
+        self.starts = array.array('q', bytes(8 * n)) # runs started at each pc
+        self.stops = array.array('q', bytes(8 * n))  # runs stopped at each pc
+
+    def run(self, machine, limit = None):
+        """ Same as machine.run(limit), collecting the profile.
+        """
+        machine.own()
+        code = machine.code
+        memory = machine.memory
+        valid = machine.valid
+        order = machine.order
+        mark = machine.dirty.add
+        taken = self.taken
+        end = len(code)
+        pc = machine.pc
+        acc = machine.acc
+        steps = machine.steps
+        last = steps + limit if limit is not None else sys.maxsize
+        if pc < end:
+            self.starts[pc] += 1
+        try:
+            while steps < last:
+                if pc >= end:
+                    return HALT_END
+                word = code[pc]
+                op = word >> 12
+                address = word & 0xFFF
+                if op < 4: # memory access instructions
+                    if op == 1: # STORE
+                        if not valid[address]:
+                            valid[address] = 1
+                            order.append(address)
+                        memory[address] = acc
+                        mark(address)
+                    elif not valid[address]:
+                        raise MemoryAccessError(
+                                machine.program.lines[pc], address)
+                    elif op == 0: # LOAD
+                        acc = memory[address]
+                    elif op == 2: # ADD
+                        acc += memory[address]
+                        if not WORD_MIN <= acc <= WORD_MAX:
+                            acc -= memory[address]
+                            raise WordOverflowError(machine.program.lines[pc],
+                                    acc + memory[address])
+                    else: # SUB
+                        acc -= memory[address]
+                        if not WORD_MIN <= acc <= WORD_MAX:
+                            acc += memory[address]
+                            raise WordOverflowError(machine.program.lines[pc],
+                                    acc - memory[address])
+                    pc += 1
+                elif op == 4: # JUMP
+                    taken[pc] += 1
+                    pc = address
+                elif op == 5: # JGE
+                    if acc >= 0:
+                        taken[pc] += 1
+                        pc = address
+                    else:
+                        pc += 1
+                elif op == 6: # JNE
+                    if acc != 0:
+                        taken[pc] += 1
+                        pc = address
+                    else:
+                        pc += 1
+                elif op == 7: # STOP
+                    return HALT_STOP
+                else: # trap
+                    return HALT_TRAP
+                steps += 1
+            if pc >= end:
+                return HALT_END
+            return None
+        finally:
+            if pc < end:
+                self.stops[pc] += 1
+            machine.pc = pc
+            machine.acc = acc
+            machine.steps = steps
+
+    def counts(self):
+        """ Return the execution count of each instruction.
+        """
+        code = self.program.code
+        n = len(code)
+        counts = array.array('q', self.starts)
+        for i, t in enumerate(self.taken):
+            if t and (code[i] & ADDRESS_MASK) < n:
+                counts[code[i] & ADDRESS_MASK] += t
+        previous = 0 # flow falling through from the previous instruction
+        for i in range(n):
+            counts[i] += previous - self.stops[i]
+            previous = counts[i] - self.taken[i]
+        return counts
+
+    def loops(self, counts = None):
+        """ Return the loops closed by a taken back-edge, as tuples (first
+            instruction, last instruction, iterations, executed instructions),
+            hottest first.
+        """
+        if counts is None:
+            counts = self.counts()
+        loops = []
+        for i, t in enumerate(self.taken):
+            target = self.program.code[i] & ADDRESS_MASK
+            if t and target <= i:
+                loops.append((target, i, t, sum(counts[target:i + 1])))
+        loops.sort(key = lambda l: -l[3])
+        return loops
+
+    def accesses(self, counts = None):
+        """ Return a dictionary address -> (reads, writes) for the memory
+            locations accessed, in address order.
+        """
+        if counts is None:
+            counts = self.counts()
+        reads = {}
+        writes = {}
+        for i, word in enumerate(self.program.code):
+            op = word >> 12
+            if counts[i] and op <= SUB:
+                target = writes if op == STORE else reads
+                target[word & ADDRESS_MASK] = \
+                        target.get(word & ADDRESS_MASK, 0) + counts[i]
+        return dict((a, (reads.get(a, 0), writes.get(a, 0)))
+                for a in sorted(set(reads) | set(writes)))
+
+    def report(self, loops = 10):
+        """ Return the profile as text, showing at most the given number of
+            loops.
+        """
+        program = self.program
+        counts = self.counts()
+        total = sum(counts) or 1
+        text = ["Instructions executed: %d" % sum(counts),
+                "",
+                "  Line Instr.       Count      %  Instruction"]
+        for i, c in enumerate(counts):
+            word = program.code[i]
+            instruction = MNEMONICS[word >> 12]
+            if word >> 12 != STOP:
+                instruction += " %#0.3x" % (word & ADDRESS_MASK)
+            if program.comments[i] is not None:
+                instruction += " ; " + program.comments[i]
+            text.append("  %4d  %#0.3x  %10d %5.1f%%  %s" % (
+                program.lines[i], i, c, 100. * c / total, instruction))
+
+        text += ["", "Hot loops:"]
+        for first, last, iterations, executed in self.loops(counts)[:loops]:
+            text.append("  lines %d-%d (instr. %#0.3x-%#0.3x): " % (
+                program.lines[first], program.lines[last], first, last) +
+                "%d iterations, %d instructions (%.1f%%)" % (
+                iterations, executed, 100. * executed / total))
+        if text[-1] == "Hot loops:":
+            text.append("  (none)")
+
+        text += ["", "Memory accesses:"]
+        for address, (reads, writes) in self.accesses(counts).items():
+            text.append("  @%#0.3x: %10d reads %10d writes" % (
+                address, reads, writes))
+        return '\n'.join(text)
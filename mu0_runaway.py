@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_runaway.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Protection against runaway programs.
+
+    A Budget bounds the number of instructions and the running time of a
+    run, checking them between chunks of instructions, so that any engine
+    runs at full speed in between.
+
+    A CycleDetector finds the endless loops which repeat the status of the
+    machine exactly. The program is deterministic, so once a status (PC,
+    ACC and initialized memory) is repeated, the run would go on forever.
+    Each cycle of the PC contains a taken backward jump, so the status is
+    only checked after those, with Brent's algorithm: the status is saved
+    at the checks numbered by powers of two, and the status at each check
+    is compared with the saved one, which finds a loop within about twice
+    its length after it is entered. A hash of the memory, updated at each
+    write, makes the comparison cheap: the memory is compared in full only
+    when the hash matches, so that a loop is never reported by mistake.
+
+    Drivers running the machine with other engines can check the status
+    between chunks of instructions instead: the repetition of any status is
+    still a proof of an endless loop, but it is found later (the checks of
+    the loop are spread over its iterations).
+"""
+
+import array
+import sys
+import time
+
+from mu0_core import HALT_STOP, HALT_END, HALT_TRAP, HALT_LIMIT, \
+        HALT_TIMEOUT, HALT_LOOP, MemoryAccessError, WordOverflowError, \
+        WORD_MIN, WORD_MAX, Machine
+
+CHUNK_SIZE = 100000 # instructions run between checks of the budgets
+
+class Budget:
+    """ Bounds for the number of instructions and for the running time of
+        a run, which may span several calls.
+    """
+    def __init__(self, run = Machine.run, limit = None, timeout = None):
+        """
+            run: function running a machine, as Machine.run(machine, limit)
+            limit: maximum number of instructions (HALT_LIMIT is returned
+                when they are executed)
+            timeout: maximum running time in seconds (HALT_TIMEOUT is
+                returned when it is exceeded)
+        """
+        self.engine = run
+        self.limit = limit
+        self.timeout = timeout
+        self.last = None     # instruction count ending the run
+        self.deadline = None # time ending the run
+
+    def run(self, machine, limit = None):
+        """ Same as run(machine, limit) for the function of the budget, but
+            halting with HALT_LIMIT or HALT_TIMEOUT when the budget (counted
+            from the first call) is exhausted.
+        """
+        if self.last is None and self.limit is not None:
+            self.last = machine.steps + self.limit
+        if self.deadline is None and self.timeout is not None:
+            self.deadline = time.monotonic() + self.timeout
+        end = machine.steps + limit if limit is not None else sys.maxsize
+        while True:
+            if self.last is not None and machine.steps >= self.last:
+                return HALT_LIMIT
+            if machine.steps >= end:
+                return None
+            chunk = min(CHUNK_SIZE, end - machine.steps)
+            if self.last is not None:
+                chunk = min(chunk, self.last - machine.steps)
+            status = self.engine(machine, chunk)
+            if status is not None:
+                return status
+            if self.deadline is not None and \
+                    time.monotonic() >= self.deadline:
+                return HALT_TIMEOUT
+
+class CycleDetector:
+    """ Detector of the endless loops repeating the status of the machine.
+    """
+    def __init__(self):
+        self.saved = None  # (hash, PC, ACC, valid, memory, steps) saved
+        self.power = 1     # number of checks between two saved statuses
+        self.length = 0    # number of checks since the last saved status
+        self.start = None  # instruction count of the status repeated
+        self.period = None # instructions between two repetitions
+
+    def check(self, machine):
+        """ Check the current status of a machine, run by another engine
+            since the last check, and return True if it repeats a status
+            checked before, after setting the start and the period of the
+            loop (the period may be a multiple of the actual one).
+        """
+        memory = machine.memory
+        h = 0
+        for address in machine.order:
+            h ^= hash((address, memory[address]))
+        saved = self.saved
+        if saved is not None and h == saved[0] and \
+                machine.pc == saved[1] and machine.acc == saved[2] and \
+                machine.valid == saved[3] and memory == saved[4]:
+            self.start = saved[5]
+            self.period = machine.steps - saved[5]
+            return True
+        self.length += 1
+        if self.length >= self.power:
+            self.saved = (h, machine.pc, machine.acc, bytes(machine.valid),
+                    array.array('q', memory), machine.steps)
+            self.power *= 2
+            self.length = 0
+        return False
+
+    def run(self, machine, limit = None):
+        """ Same as machine.run(limit), but halting with HALT_LOOP when the
+            status of the machine is repeated, after setting the instruction
+            count where the loop was found to start and its period.
+        """
+        machine.own()
+        code = machine.code
+        memory = machine.memory
+        valid = machine.valid
+        order = machine.order
+        mark = machine.dirty.add
+        end = len(code)
+        pc = machine.pc
+        acc = machine.acc
+        steps = machine.steps
+        last = steps + limit if limit is not None else sys.maxsize
+        saved = self.saved
+        power = self.power
+        length = self.length
+        # hash of the initialized memory
+        h = 0
+        for address in order:
+            h ^= hash((address, memory[address]))
+        try:
+            while steps < last:
+                if pc >= end:
+                    return HALT_END
+                word = code[pc]
+                op = word >> 12
+                address = word & 0xFFF
+                if op < 4: # memory access instructions
+                    if op == 1: # STORE
+                        if not valid[address]:
+                            valid[address] = 1
+                            order.append(address)
+                        else:
+                            h ^= hash((address, memory[address]))
+                        memory[address] = acc
+                        h ^= hash((address, acc))
+                        mark(address)
+                    elif not valid[address]:
+                        raise MemoryAccessError(
+                                machine.program.lines[pc], address)
+                    elif op == 0: # LOAD
+                        acc = memory[address]
+                    elif op == 2: # ADD
+                        acc += memory[address]
+                        if not WORD_MIN <= acc <= WORD_MAX:
+                            acc -= memory[address]
+                            raise WordOverflowError(machine.program.lines[pc],
+                                    acc + memory[address])
+                    else: # SUB
+                        acc -= memory[address]
+                        if not WORD_MIN <= acc <= WORD_MAX:
+                            acc += memory[address]
+                            raise WordOverflowError(machine.program.lines[pc],
+                                    acc - memory[address])
+                    pc += 1
+                elif op < 7: # JUMP, JGE, JNE
+                    if op == 4 or (acc >= 0 if op == 5 else acc != 0):
+                        if address <= pc: # check the status after the jump
+                            pc = address
+                            steps += 1
+                            length += 1
+                            if saved is not None and h == saved[0] and \
+                                    pc == saved[1] and acc == saved[2] and \
+                                    valid == saved[3] and \
+                                    memory == saved[4]:
+                                self.start = saved[5]
+                                self.period = steps - saved[5]
+                                return HALT_LOOP
+                            if length == power:
+                                saved = (h, pc, acc, bytes(valid),
+                                        array.array('q', memory), steps)
+                                power *= 2
+                                length = 0
+                            continue
+                        pc = address
+                    else:
+                        pc += 1
+                elif op == 7: # STOP
+                    return HALT_STOP
+                else: # trap
+                    return HALT_TRAP
+                steps += 1
+            if pc >= end:
+                return HALT_END
+            return None
+        finally:
+            machine.pc = pc
+            machine.acc = acc
+            machine.steps = steps
+            self.saved = saved
+            self.power = power
+            self.length = length
@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_service.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Local emulator service, running jobs on a warm worker pool.
+
+    The service listens on a Unix socket or on a localhost TCP port, and
+    reads a JSON object for each line, describing a job as the source to
+    run (or the path of a source or object file) and the memory locations
+    to initialize in addition to the INI ones, as in batch manifests, e.g.:
+
+        {"id": 1, "source": "LOAD 0x100\\nSTOP\\n", "memory": {"0x100": 7}}
+        {"id": 2, "program": "sample_program.asm", "limit": 1000}
+
+    Optional fields are "limit" (maximum number of instructions), "timeout"
+    (maximum running time, in seconds), "jit" (run the translated program)
+    and "detect_loops" (halt the endless loops repeating the status of the
+    machine, with status 'loop'). The service has its own limit and
+    timeout, used for the jobs not giving them and as upper bounds for the
+    others, so that a runaway program halts with status 'limit' or
+    'timeout' instead of holding a worker forever.
+
+    A line of JSON is written back for each job, with the same fields as a
+    batch result (status, line, acc, pc, steps, memory), or with status
+    'error' and a message if the request is invalid or the job failed. The
+    requests on a connection are served concurrently, so results may come
+    back in a different order: the id of each request is returned with its
+    result.
+
+    Programs are assembled once and kept in a cache, keyed by a hash of
+    their source, and the worker processes keep the decoded programs they
+    received, so that a repeated program costs neither parsing nor
+    decoding.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import hashlib
+import io
+import json
+import os
+import signal
+import stat
+import sys
+
+import mu0_asm
+import mu0_batch
+import mu0_memo
+import mu0_object
+
+PORT = 4200                 # default TCP port
+LIMIT = 100000000           # default maximum number of instructions per job
+TIMEOUT = 10.               # default maximum running time per job, seconds
+MAX_REQUEST = 16 * 1024 * 1024 # maximum length of a request line, in bytes
+MAX_PROGRAMS = 256          # programs kept in the caches
+
+# status of a worker process
+_programs = collections.OrderedDict() # decoded programs, by key
+_memo = None # cache of the results, if used
+
+def _init_worker(memo_path):
+    """ Initialize a worker process of the pool.
+    """
+    global _memo
+    _memo = mu0_memo.Memo(memo_path) if memo_path is not None else None
+
+def _warm_up():
+    """ Do nothing, to have a worker process started.
+    """
+    return os.getpid()
+
+def _run(key, image, memory, jit, limit, timeout, loops):
+    """ Run a job in a worker process, given the key and the object image of
+        the program, and return its result.
+
+        The image is decoded only if the program is not cached.
+    """
+    program = _programs.get(key)
+    if program is None:
+        program = _programs[key] = mu0_object.loads(image)
+        if len(_programs) > MAX_PROGRAMS:
+            _programs.popitem(last = False)
+    else:
+        _programs.move_to_end(key)
+    return mu0_batch.run_program(program, memory, jit, limit, timeout, _memo,
+            loops)
+
+def _assemble(source):
+    """ Assemble a source text, and return its object image.
+    """
+    return mu0_object.dumps(mu0_asm.assemble(io.StringIO(source)))
+
+def _load(path, cache):
+    """ Assemble a source file (or load an object file), and return its
+        object image.
+    """
+    return mu0_object.dumps(mu0_object.cached_assemble(path,
+        cache = cache)[0])
+
+class Service:
+    """ Emulator service, with its worker pool and cache of programs.
+    """
+    def __init__(self, workers = None, limit = LIMIT, timeout = TIMEOUT,
+            cache = True, memo = False, loops = False):
+        """
+            workers: number of worker processes (one per CPU by default)
+            limit: default and maximum number of instructions per job
+            timeout: default and maximum running time per job, in seconds
+            cache: cache the programs assembled from files on disk, as the
+                console emulator does
+            memo: cache the results of the jobs (see mu0_memo)
+            loops: detect the endless loops in the jobs not setting
+                "detect_loops" (see mu0_runaway)
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.limit = limit
+        self.timeout = timeout
+        self.cache = cache
+        self.memo = memo
+        self.loops = loops
+        self.pool = None
+        # object images of the assembled programs, by key
+        self.programs = collections.OrderedDict()
+
+    async def start(self):
+        """ Start the worker processes, waiting until all of them are ready.
+        """
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers = self.workers,
+                initializer = _init_worker,
+                initargs = (mu0_memo.default_path() if self.memo else None,))
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, _warm_up)
+            for _ in range(self.workers)])
+
+    def close(self):
+        """ Stop the worker processes.
+        """
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures = True)
+            self.pool = None
+
+    async def program(self, request):
+        """ Return the key and the object image of the program of a request,
+            assembling it if not cached.
+        """
+        if 'source' in request:
+            source = request['source']
+            if not isinstance(source, str):
+                raise ValueError("invalid source")
+            key = hashlib.sha256(source.encode('utf-8')).hexdigest()
+            load = lambda: _assemble(source)
+        else:
+            path = os.path.abspath(request['program'])
+            stat = await asyncio.to_thread(os.stat, path)
+            key = hashlib.sha256(('%s\0%d\0%d' % (path, stat.st_mtime_ns,
+                stat.st_size)).encode('utf-8')).hexdigest()
+            load = lambda: _load(path, self.cache)
+
+        image = self.programs.get(key)
+        if image is None:
+            image = await asyncio.to_thread(load)
+            self.programs[key] = image
+            if len(self.programs) > MAX_PROGRAMS:
+                self.programs.popitem(last = False)
+        else:
+            self.programs.move_to_end(key)
+        return key, image
+
+    def budget(self, request, name, default):
+        """ Return the value of a budget for a request, capped by the
+            service default.
+        """
+        value = request.get(name)
+        if value is None:
+            return default
+        if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                or value < 0:
+            raise ValueError("invalid %s" % name)
+        return value if default is None else min(value, default)
+
+    async def run(self, request):
+        """ Run the job described by a request (a decoded line of JSON), and
+            return its result as a dictionary.
+        """
+        result = dict(id = request.get('id'))
+        try:
+            memory = mu0_batch.parse_image(request.get('memory', {}))
+            limit = self.budget(request, 'limit', self.limit)
+            timeout = self.budget(request, 'timeout', self.timeout)
+            if limit is not None:
+                limit = int(limit)
+            key, image = await self.program(request)
+        except (ValueError, KeyError, TypeError, AttributeError, OSError,
+                mu0_asm.SourceSyntaxError) as e:
+            result.update(status = 'error', error = str(e))
+            return result
+
+        loop = asyncio.get_running_loop()
+        try:
+            result.update(await loop.run_in_executor(self.pool, _run, key,
+                image, memory, bool(request.get('jit')), limit, timeout,
+                bool(request.get('detect_loops', self.loops))))
+        except Exception as e:
+            # e.g. a broken pool, or a job failing in its worker: the
+            # client waits for a line for each request anyway
+            result.update(status = 'error', error = str(e) or
+                    type(e).__name__)
+        return result
+
+    async def serve(self, reader, writer):
+        """ Serve the requests on a connection.
+        """
+        lock = asyncio.Lock() # held while writing a response
+        tasks = set()
+
+        async def respond(text):
+            try:
+                request = json.loads(text)
+                if not isinstance(request, dict):
+                    raise ValueError("a JSON object is expected")
+            except ValueError as e:
+                result = dict(id = None, status = 'error', error = str(e))
+            else:
+                result = await self.run(request)
+            async with lock:
+                writer.write((json.dumps(result) + '\n').encode('utf-8'))
+                await writer.drain()
+
+        try:
+            while True:
+                try:
+                    text = await reader.readline()
+                except ValueError: # line too long
+                    break
+                if not text:
+                    break
+                if not text.strip():
+                    continue
+                task = asyncio.ensure_future(respond(text))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions = True)
+        except ConnectionError:
+            pass # the client went away
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+def _remove_socket(path):
+    """ Remove the Unix socket at the given path, if any (any other kind of
+        file is left in place).
+    """
+    try:
+        if stat.S_ISSOCK(os.lstat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+async def serve(service, socket_path = None, port = PORT, ready = None):
+    """ Start a service and serve the requests on a Unix socket (if a path
+        is given) or on a localhost TCP port, until cancelled.
+    """
+    await service.start()
+    try:
+        if socket_path is not None:
+            _remove_socket(socket_path) # left by a previous run
+            server = await asyncio.start_unix_server(service.serve,
+                    socket_path, limit = MAX_REQUEST)
+        else:
+            server = await asyncio.start_server(service.serve,
+                    '127.0.0.1', port, limit = MAX_REQUEST)
+        if ready:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+        if socket_path is not None:
+            _remove_socket(socket_path)
+
+def main():
+    """ Entry point of the service.
+    """
+    socket_path = None # Unix socket path
+    port = PORT        # TCP port, when no socket path is given
+    workers = None     # number of worker processes
+    limit = LIMIT      # maximum number of instructions per job
+    timeout = TIMEOUT  # maximum running time per job
+    cache = True       # programs assembled from files are cached when True
+    memo = False       # results of the jobs are cached when True
+    loops = False      # endless loops are detected when True
+
+    # parse command line arguments
+    args = iter(sys.argv[1:])
+    for s in args:
+        try:
+            if s == "--socket":
+                socket_path = next(args)
+            elif s == "--port":
+                port = int(next(args))
+            elif s == "--workers":
+                workers = max(1, int(next(args)))
+            elif s == "--limit":
+                limit = int(next(args)) or None
+            elif s == "--timeout":
+                timeout = float(next(args)) or None
+            elif s == "--no-cache":
+                cache = False
+            elif s == "--memo":
+                memo = True
+            elif s == "--detect-loops":
+                loops = True
+            else:
+                print("Unrecognized option \"" + s + "\".")
+                quit()
+        except (StopIteration, ValueError):
+            print("Missing or invalid parameter for option \"" + s + "\".")
+            quit()
+
+    service = Service(workers, limit, timeout, cache, memo, loops)
+    def ready(server):
+        print("Serving on " + (socket_path if socket_path is not None else
+            "127.0.0.1:%d" % port) + " with %d workers." % service.workers)
+        sys.stdout.flush()
+    async def run():
+        # stop cleanly on SIGTERM too, removing the socket
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM,
+                asyncio.current_task().cancel)
+        await serve(service, socket_path, port, ready)
+    try:
+        asyncio.run(run())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+if __name__ == "__main__":
+    main()
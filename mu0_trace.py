@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_trace.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Execution traces, streamed to a file.
+
+    A trace has a record for each executed instruction, with the instruction
+    count before it, the PC, the opcode and the operand, the value of ACC
+    after it and the location written by it (if any) with its new value.
+
+    The file format follows the file name: a name ending in '.csv' gives a
+    CSV file with a header line (the opcode as a mnemonic, addresses in
+    hexadecimal, and empty fields when nothing is written), any other name
+    a binary file, made of the MAGIC string followed by the records packed
+    as RECORD (the address is NO_WRITE when nothing is written). A further
+    '.gz' suffix compresses the file with gzip (at the fastest level).
+
+    Records are collected by an inlined interpreter loop, and written in
+    large chunks, so that the output is not the bottleneck. Only the
+    instructions in a range of instruction counts can be traced, the others
+    running at full speed.
+"""
+
+import struct
+import sys
+
+from mu0_core import MNEMONICS, HALT_STOP, HALT_END, HALT_TRAP, \
+        MemoryAccessError, WordOverflowError, WORD_MIN, WORD_MAX
+
+MAGIC = b'MU0T\x02' # the last byte is the version of the format
+# step, PC, opcode, operand, ACC, address written, value written
+RECORD = struct.Struct('<QIBHqhq')
+CSV_HEADER = 'step,pc,opcode,operand,acc,address,value\n'
+NO_WRITE = -1        # address recorded for instructions not writing
+CHUNK = 65536        # records collected between writes
+BUFFER_SIZE = 1 << 20 # size of the file buffer, in bytes
+
+def _open(path, mode):
+    """ Open a trace file, compressed if its name ends in '.gz'.
+    """
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, mode, compresslevel = 1)
+    return open(path, mode, buffering = BUFFER_SIZE)
+
+def is_csv(path):
+    """ Return True if a trace file name is for the CSV format.
+    """
+    if path.endswith('.gz'):
+        path = path[:-3]
+    return path.lower().endswith('.csv')
+
+class Trace:
+    """ Trace of the execution, written to a file.
+    """
+    def __init__(self, path, start = 0, end = None):
+        """
+            path: path of the trace file
+            start: first instruction count traced
+            end: instruction count where the trace ends (None for no end)
+        """
+        self.start = start
+        self.end = end
+        self.csv = is_csv(path)
+        self.file = _open(path, 'wb')
+        self.records = 0 # number of records written
+        self.file.write(CSV_HEADER.encode('ascii') if self.csv else MAGIC)
+
+    def close(self):
+        """ Flush and close the trace file.
+        """
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _write(self, rows):
+        """ Write a chunk of records.
+        """
+        if self.csv:
+            self.file.write(''.join([
+                '%d,%#0.3x,%s,%#0.3x,%d,%s,%s\n' % (step, pc,
+                    MNEMONICS[op], operand, acc,
+                    '' if address == NO_WRITE else '%#0.3x' % address,
+                    '' if address == NO_WRITE else value)
+                for step, pc, op, operand, acc, address, value in rows
+                ]).encode('ascii'))
+        else:
+            pack = RECORD.pack
+            self.file.write(b''.join([pack(*row) for row in rows]))
+        self.records += len(rows)
+
+    def run(self, machine, limit = None):
+        """ Same as machine.run(limit), tracing the instructions in the
+            range.
+        """
+        last = machine.steps + limit if limit is not None else sys.maxsize
+        # run at full speed before the range
+        if machine.steps < self.start:
+            status = machine.run(min(last, self.start) - machine.steps)
+            if status is not None or machine.steps >= last:
+                return status
+        # trace the range
+        stop = last if self.end is None else min(last, self.end)
+        if machine.steps < stop:
+            status = self._run(machine, stop - machine.steps)
+            if status is not None or machine.steps >= last:
+                return status
+        # run at full speed after the range
+        return machine.run(None if limit is None else last - machine.steps)
+
+    def _run(self, machine, limit):
+        """ Same as machine.run(limit), recording each instruction.
+        """
+        machine.own()
+        code = machine.code
+        memory = machine.memory
+        valid = machine.valid
+        order = machine.order
+        mark = machine.dirty.add
+        end = len(code)
+        pc = machine.pc
+        acc = machine.acc
+        steps = machine.steps
+        last = steps + limit
+        rows = []
+        record = rows.append
+        try:
+            while steps < last:
+                if pc >= end:
+                    return HALT_END
+                word = code[pc]
+                op = word >> 12
+                address = word & 0xFFF
+                if op < 4: # memory access instructions
+                    if op == 1: # STORE
+                        if not valid[address]:
+                            valid[address] = 1
+                            order.append(address)
+                        memory[address] = acc
+                        mark(address)
+                        record((steps, pc, op, address, acc, address, acc))
+                    elif not valid[address]:
+                        raise MemoryAccessError(
+                                machine.program.lines[pc], address)
+                    else:
+                        if op == 0: # LOAD
+                            acc = memory[address]
+                        elif op == 2: # ADD
+                            acc += memory[address]
+                            if not WORD_MIN <= acc <= WORD_MAX:
+                                acc -= memory[address]
+                                raise WordOverflowError(machine.program.lines[pc],
+                                        acc + memory[address])
+                        else: # SUB
+                            acc -= memory[address]
+                            if not WORD_MIN <= acc <= WORD_MAX:
+                                acc += memory[address]
+                                raise WordOverflowError(machine.program.lines[pc],
+                                        acc - memory[address])
+                        record((steps, pc, op, address, acc, NO_WRITE, 0))
+                    pc += 1
+                elif op == 4: # JUMP
+                    record((steps, pc, op, address, acc, NO_WRITE, 0))
+                    pc = address
+                elif op == 5: # JGE
+                    record((steps, pc, op, address, acc, NO_WRITE, 0))
+                    pc = address if acc >= 0 else pc + 1
+                elif op == 6: # JNE
+                    record((steps, pc, op, address, acc, NO_WRITE, 0))
+                    pc = address if acc != 0 else pc + 1
+                elif op == 7: # STOP
+                    return HALT_STOP
+                else: # trap
+                    return HALT_TRAP
+                steps += 1
+                if len(rows) >= CHUNK:
+                    self._write(rows)
+                    rows.clear()
+            if pc >= end:
+                return HALT_END
+            return None
+        finally:
+            machine.pc = pc
+            machine.acc = acc
+            machine.steps = steps
+            if rows:
+                self._write(rows)
+
+def records(path):
+    """ Iterate over the records of a binary trace file, as tuples (step,
+        PC, opcode, operand, ACC, address written, value written).
+    """
+    with _open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+        if magic[:-1] != MAGIC[:-1]:
+            raise ValueError("Not a mu0 trace.")
+        if magic != MAGIC:
+            raise ValueError("Unsupported version of the mu0 trace format.")
+        while True:
+            chunk = f.read(RECORD.size * CHUNK)
+            if len(chunk) % RECORD.size:
+                raise ValueError("Truncated trace.")
+            if not chunk:
+                return
+            yield from RECORD.iter_unpack(chunk)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2015 Martino Pilia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    @file mu0_wide.py
+    @author Martino Pilia <martino.pilia@gmail.com>
+    @date 2026-10-16
+    @brief Machine with a wide (16 or 24-bit) address space.
+
+    Programs assembled with a wider address field (e.g. assemble(source,
+    address_bits = 24)) address up to 2^24 words. A flat array would take
+    128 MiB for them, so the memory of a WideMachine is a sparse page
+    table instead: fixed-size array pages, allocated on the first write to
+    any of their locations, so that a program only pays for the pages it
+    uses, and reads within a page cost about the same as in the flat array.
+
+    The default 12-bit programs are still run by mu0_core.Machine, which is
+    not affected.
+"""
+
+import array
+import sys
+
+from mu0_core import HALT_STOP, HALT_END, HALT_TRAP, MemoryAccessError, \
+        WordOverflowError, WORD_MIN, WORD_MAX, Machine
+
+PAGE_BITS = 10               # log2 of the number of words in a page
+PAGE_SIZE = 1 << PAGE_BITS   # number of words in a page
+PAGE_MASK = PAGE_SIZE - 1    # mask selecting the offset within a page
+
+class PagedArray:
+    """ Sparse array of integers, split into fixed-size array pages which
+        are allocated on the first write to them.
+
+        Indexing works as for a flat array of the same size, and the
+        locations of the pages never written read as 0.
+    """
+    def __init__(self, typecode, size):
+        """
+            typecode: typecode of the array pages
+            size: number of items
+        """
+        self.typecode = typecode
+        self.size = size
+        self.pages = {} # allocated pages, by page number
+        self.blank = array.array(typecode,
+                bytes(PAGE_SIZE * array.array(typecode).itemsize))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        page = self.pages.get(index >> PAGE_BITS)
+        if page is None:
+            if not 0 <= index < self.size:
+                raise IndexError("PagedArray index out of range")
+            return 0
+        return page[index & PAGE_MASK]
+
+    def __setitem__(self, index, value):
+        page = self.pages.get(index >> PAGE_BITS)
+        if page is None:
+            page = self.page(index >> PAGE_BITS)
+        page[index & PAGE_MASK] = value
+
+    def page(self, number):
+        """ Return a page, allocating it if needed.
+        """
+        page = self.pages.get(number)
+        if page is None:
+            if not 0 <= number << PAGE_BITS < self.size:
+                raise IndexError("PagedArray index out of range")
+            page = self.pages[number] = array.array(self.typecode,
+                    self.blank)
+        return page
+
+    def copy(self):
+        """ Return a copy of the array, with copies of the pages.
+        """
+        other = PagedArray(self.typecode, self.size)
+        other.pages = dict((number, array.array(self.typecode, page))
+                for number, page in self.pages.items())
+        return other
+
+class WideMachine(Machine):
+    """ Machine running the programs assembled with a wider address field,
+        with the memory kept in page tables.
+
+        Everything else is the same as for Machine. Snapshots have 32-bit
+        addresses, and a magic string telling the address width (b'MU16' or
+        b'MU24').
+    """
+    snapshot_address = 'I'
+
+    def __init__(self, program):
+        self.address_bits = program.address_bits
+        self.address_mask = (1 << program.address_bits) - 1
+        self.snapshot_magic = b'MU%d' % program.address_bits
+        Machine.__init__(self, program)
+
+    def _clear_memory(self):
+        """ Make the whole memory uninitialized.
+        """
+        size = 1 << self.address_bits
+        self.memory = PagedArray('q', size) # RAM
+        self.valid = PagedArray('B', size)  # 1 for initialized locations
+        self.order = []  # initialized locations, in initialization order
+
+    def own(self):
+        """ Copy the memory, if it may be shared with a fork.
+        """
+        if self.shared:
+            self.memory = self.memory.copy()
+            self.valid = self.valid.copy()
+            self.order = list(self.order)
+            self.shared = False
+
+    def execute(self, word):
+        """ Same as Machine.execute(), for a wide instruction word.
+        """
+        if self.shared:
+            self.own()
+        status = self._ops[word >> self.address_bits](word & self.address_mask)
+        if status is None:
+            self.steps += 1
+        return status
+
+    def run(self, limit = None):
+        """ Same as Machine.run(), looking up the pages of the memory.
+
+            The page of the last memory access is kept at hand, so that the
+            page table is only looked up when a different page is accessed.
+        """
+        if self.hooks is not None:
+            return self.hooks.run(self, limit)
+        if self.shared:
+            self.own()
+        code = self.code
+        memory = self.memory
+        valid = self.valid
+        valid_pages = valid.pages
+        order = self.order
+        mark = self.dirty.add
+        shift = self.address_bits
+        mask = self.address_mask
+        end = len(code)
+        pc = self.pc
+        acc = self.acc
+        steps = self.steps
+        last = steps + limit if limit is not None else sys.maxsize
+        current = None # number of the page at hand
+        values = None  # values of the page at hand
+        flags = None   # initialization flags of the page at hand
+        try:
+            while steps < last:
+                if pc >= end:
+                    return HALT_END
+                word = code[pc]
+                op = word >> shift
+                if op < 4: # memory access instructions
+                    address = word & mask
+                    number = address >> PAGE_BITS
+                    offset = address & PAGE_MASK
+                    if number != current:
+                        flags = valid_pages.get(number)
+                        if flags is None:
+                            if op != 1: # never written
+                                raise MemoryAccessError(
+                                        self.program.lines[pc], address)
+                            flags = valid.page(number)
+                        values = memory.page(number)
+                        current = number
+                    if op == 1: # STORE
+                        if not flags[offset]:
+                            flags[offset] = 1
+                            order.append(address)
+                        values[offset] = acc
+                        mark(address)
+                    elif not flags[offset]:
+                        raise MemoryAccessError(
+                                self.program.lines[pc], address)
+                    elif op == 0: # LOAD
+                        acc = values[offset]
+                    elif op == 2: # ADD
+                        acc += values[offset]
+                        if not WORD_MIN <= acc <= WORD_MAX:
+                            acc -= values[offset]
+                            raise WordOverflowError(self.program.lines[pc],
+                                    acc + values[offset])
+                    else: # SUB
+                        acc -= values[offset]
+                        if not WORD_MIN <= acc <= WORD_MAX:
+                            acc += values[offset]
+                            raise WordOverflowError(self.program.lines[pc],
+                                    acc - values[offset])
+                    pc += 1
+                elif op == 4: # JUMP
+                    pc = word & mask
+                elif op == 5: # JGE
+                    pc = word & mask if acc >= 0 else pc + 1
+                elif op == 6: # JNE
+                    pc = word & mask if acc != 0 else pc + 1
+                elif op == 7: # STOP
+                    return HALT_STOP
+                else: # trap
+                    return HALT_TRAP
+                steps += 1
+            if pc >= end:
+                return HALT_END
+            return None
+        finally:
+            self.pc = pc
+            self.acc = acc
+            self.steps = steps
@@ -0,0 +1,63 @@
+""" Tests for the accelerator of affine loops.
+"""
+
+import mu0_accel
+import mu0_asm
+import mu0_core
+
+COUNTING = """
+INI 0x100 0x0 ; counter
+INI 0x101 0x1
+INI 0x102 0x7FF
+LOAD 0x103
+ADD 0x102
+STORE 0x103
+LOAD 0x100
+SUB 0x101
+STORE 0x100
+JNE 0x0
+STOP
+"""
+
+def test_skips_iterations():
+    program = mu0_asm.assemble(COUNTING.splitlines(True))
+    expected = mu0_core.Machine(program)
+    machine = mu0_core.Machine(program)
+    for m in (expected, machine):
+        m.write(0x100, 1000)
+        m.write(0x103, 0)
+    assert expected.run() == mu0_accel.run(machine) == mu0_core.HALT_STOP
+    assert machine.steps == expected.steps
+    assert machine.dump() == expected.dump()
+
+def test_accelerator_kept_across_calls():
+    # the drivers enforcing budgets call run() once per chunk: the loops are
+    # analyzed once, and the loops removed from the accelerated ones stay so
+    program = mu0_asm.assemble(COUNTING.splitlines(True))
+    machine = mu0_core.Machine(program)
+    machine.write(0x100, 1000000)
+    machine.write(0x103, 0)
+    assert mu0_accel.run(machine, 5000) is None
+    accelerator = mu0_accel._accelerators[machine]
+    accelerator.code[0] = program.code[0] # as done for a removed trap
+    assert mu0_accel.run(machine, 5000) is None
+    assert mu0_accel._accelerators[machine] is accelerator
+    assert accelerator.code[0] == program.code[0]
+    expected = mu0_core.Machine(program)
+    expected.write(0x100, 1000000)
+    expected.write(0x103, 0)
+    expected.run(10000)
+    assert (machine.pc, machine.acc, machine.steps) == \
+            (expected.pc, expected.acc, expected.steps)
+    assert machine.dump() == expected.dump()
+
+def test_forks_have_their_own_accelerator():
+    program = mu0_asm.assemble(COUNTING.splitlines(True))
+    machine = mu0_core.Machine(program)
+    machine.write(0x100, 10)
+    machine.write(0x103, 0)
+    mu0_accel.run(machine, 1)
+    other = machine.fork()
+    mu0_accel.run(other)
+    assert mu0_accel._accelerators[other] is not \
+            mu0_accel._accelerators[machine]
@@ -0,0 +1,113 @@
+""" Tests for the assembler: the tokenizer fast path must decode every line
+    as LINE_PATTERN does.
+"""
+
+import random
+
+import pytest
+
+import mu0_asm
+import mu0_core
+
+def regex_assemble(source_lines):
+    """ Reference assembler, matching every line against LINE_PATTERN.
+
+        Return (code, lines, comments, data, error line numbers), with
+        None in place of the decoded program if any line is not valid.
+    """
+    match = mu0_asm.regex(mu0_asm.LINE_PATTERN).match
+    code, lines, comments, data, errors = [], [], [], {}, []
+    for line, source_line in enumerate(source_lines, 1):
+        m = match(source_line)
+        if m is None:
+            errors.append(line)
+            continue
+        opc, imm, is_stop, location, value, comment = m.groups()
+        if opc is not None or is_stop is not None:
+            if opc is not None:
+                word = mu0_core.OPCODES[opc.upper()] << 12 | int(imm, 16)
+            else:
+                word = mu0_core.STOP << 12
+            code.append(word)
+            lines.append(line)
+            comments.append(comment)
+        elif location is not None:
+            value = int(value, 16)
+            data[int(location, 16)] = value - 0x1000 if value > 0x7FF \
+                    else value
+    if errors:
+        return None, None, None, None, errors
+    return code, lines, comments, data, errors
+
+def fast_assemble(source_lines):
+    """ Same as regex_assemble(), with mu0_asm.assemble().
+    """
+    try:
+        program = mu0_asm.assemble(source_lines)
+    except mu0_asm.SourceSyntaxError as e:
+        return None, None, None, None, [line for line, _ in e.errors]
+    return (list(program.code), program.lines, program.comments,
+            program.data, [])
+
+MNEMONICS = ['LOAD', 'LDA', 'STORE', 'STO', 'ADD', 'SUB', 'JUMP', 'JMP',
+        'JGE', 'JNE']
+OPERANDS = ['0x0', '0x1', '0x00F', '0xfff', '0xABC', '0x7FF', '0x800',
+        '0X10', '0x', '0x1000', '10', 'x10', '0xG']
+SPACES = ['', ' ', '  ', '\t', ' \t ']
+COMMENTS = ['', ';', '; comment', ';;; several', ';no space', '  ; spaced ',
+        '; a ; b']
+
+def variant(rng, word):
+    """ Return a word with a random case.
+    """
+    return ''.join(c.upper() if rng.random() < .5 else c.lower()
+            for c in word)
+
+def random_line(rng):
+    """ Return a random source line, valid or not.
+    """
+    s = lambda: rng.choice(SPACES)
+    kind = rng.random()
+    if kind < .45:
+        text = variant(rng, rng.choice(MNEMONICS)) + s() + \
+                rng.choice(OPERANDS)
+        if rng.random() < .1:
+            text += ' ' + rng.choice(OPERANDS) # too many operands
+    elif kind < .55:
+        text = variant(rng, 'STOP')
+        if rng.random() < .2:
+            text += ' ' + rng.choice(OPERANDS)
+    elif kind < .75:
+        text = variant(rng, 'INI') + s() + rng.choice(OPERANDS) + s() + \
+                rng.choice(OPERANDS)
+    elif kind < .85:
+        text = rng.choice(['', 'NOP', 'LOAD', 'INI 0x1', 'LOADX 0x1'])
+    else:
+        text = variant(rng, rng.choice(MNEMONICS + ['STOP', 'INI']))
+    return s() + text + s() + rng.choice(COMMENTS) + \
+            rng.choice(['\n', '\n', ''])
+
+@pytest.mark.parametrize('seed', range(20))
+def test_fast_path_matches_regex(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        source = [random_line(rng) for _ in range(rng.randint(1, 12))]
+        assert fast_assemble(source) == regex_assemble(source), source
+        # and the same for the valid lines alone, decoded as a program
+        valid = [line for line in source if not regex_assemble([line])[4]]
+        assert fast_assemble(valid) == regex_assemble(valid), valid
+
+@pytest.mark.parametrize('line', [
+    'LOAD 0x100\n', 'lda 0x100\n', 'Sto\t0x1 ; c\n', 'jmp   0x3\n',
+    'ADD0x100\n', 'STOP\n', 'stop;x\n', '  \n', '; only a comment\n',
+    'INI 0x100 0xFFF\n', 'INI0x100 0x800\n', 'ini 0x1\t0x7ff ; x\n',
+    'LOAD 0x1000\n', 'LOAD 0x100 0x1\n', 'STOP 0x1\n', 'NOP\n', 'INI 0x1\n',
+    'LOAD 0x100 ;;; comment ; with semicolons\n',
+])
+def test_line_forms(line):
+    assert fast_assemble([line]) == regex_assemble([line])
+
+def test_errors_listed_at_once():
+    with pytest.raises(mu0_asm.SourceSyntaxError) as e:
+        mu0_asm.assemble(['LOAD 0x1\n', 'BAD\n', 'STOP\n', 'LOAD 0x1000\n'])
+    assert [line for line, _ in e.value.errors] == [2, 4]
@@ -0,0 +1,252 @@
+""" Cross-check of the engines running mu0 programs.
+
+    Several engines have their own copy of the inlined dispatch loop of
+    Machine.run (the profiler, the tracer, the cycle detector, the wide
+    machine) or their own translation of the instruction semantics (the JIT
+    translator, the accelerator, the lanes). Each program below is run by
+    all of them, and the final status (halt reason or fault, ACC, PC,
+    executed instructions and memory) must be the same, so that a change to
+    the semantics cannot land in only one engine.
+"""
+
+import pytest
+
+import mu0_accel
+import mu0_asm
+import mu0_batch
+import mu0_core
+import mu0_jit
+import mu0_lanes
+import mu0_profile
+import mu0_runaway
+import mu0_trace
+import mu0_wide
+
+DIVISION = """
+INI 0x100 0x13 ; dividend
+INI 0x101 0x5  ; divisor
+INI 0x102 0x1
+INI 0x103 0x0
+INI 0x104 0x0
+LOAD 0x100
+STORE 0x103
+LOAD 0x103
+SUB 0x101
+JGE 0x6
+STOP
+STORE 0x103
+LOAD 0x104
+ADD 0x102
+STORE 0x104
+JUMP 0x2
+"""
+
+COUNTING = """
+INI 0x100 0x0 ; counter
+INI 0x101 0x1
+LOAD 0x100
+SUB 0x101
+STORE 0x100
+STORE 0x200 ; initialized by the loop
+JNE 0x0
+LOAD 0x200
+ADD 0x200
+"""
+
+FAULT = """
+INI 0x100 0x3
+INI 0x101 0x1
+LOAD 0x100
+SUB 0x101
+STORE 0x100
+JNE 0x0
+LOAD 0x105 ; never initialized
+STOP
+"""
+
+DOUBLING = """
+INI 0x100 0x1
+LOAD 0x100
+ADD 0x100
+STORE 0x100
+JUMP 0x0
+"""
+
+NEGATIVE = """
+INI 0x101 0x1
+LOAD 0x100
+SUB 0x101
+STORE 0x100
+JUMP 0x0
+"""
+
+AFFINE = """
+INI 0x101 0x1
+INI 0x102 0x7FF
+LOAD 0x100 ; counter
+SUB 0x101
+STORE 0x100
+LOAD 0x103
+ADD 0x102
+STORE 0x103
+LOAD 0x100
+JNE 0x0
+STOP
+"""
+
+# values below 0x800, positive for the wide engine too
+STOP_AT_LIMIT = """
+INI 0x101 0x27c
+INI 0x102 0x35e
+INI 0x103 0x79e
+STORE 0x100
+LOAD 0x103
+STOP
+"""
+
+# (name, source, memory image, limit)
+PROGRAMS = [
+    ('division', DIVISION, {0x100: 1000, 0x101: 7}, None),
+    ('division-limit', DIVISION, {0x100: 1000, 0x101: 7}, 333),
+    ('counting', COUNTING, {0x100: 500}, None),
+    ('fault', FAULT, {}, None),
+    ('doubling', DOUBLING, {}, None),
+    ('negative', NEGATIVE, {0x100: mu0_core.WORD_MIN + 5}, None),
+    ('affine', AFFINE, {0x100: 1000, 0x103: 0}, None),
+    ('affine-overflow', AFFINE,
+        {0x100: 1000, 0x103: mu0_core.WORD_MAX - 0x7FF * 500}, None),
+    ('endless', NEGATIVE, {0x100: 0}, 1000),
+    ('stop-at-limit', STOP_AT_LIMIT, {}, 2),
+    ('stop-after-limit', STOP_AT_LIMIT, {}, 3),
+]
+
+def outcome(machine, run, limit):
+    """ Run a machine with the given engine, and return the final status.
+    """
+    try:
+        status = run(machine, limit)
+    except (mu0_core.MemoryAccessError, mu0_core.WordOverflowError) as e:
+        status = (type(e).__name__, e.line)
+    return (status, machine.acc, machine.pc, machine.steps,
+            [(a, machine.memory[a]) for a in machine.order])
+
+def machine(program, image, cls = mu0_core.Machine):
+    """ Return a machine for a program, with an initial memory image.
+    """
+    m = cls(program)
+    for address, value in image.items():
+        m.write(address, value)
+    return m
+
+def chunked(run, size):
+    """ Return an engine running with the given one in chunks of size
+        instructions, as the drivers enforcing budgets do.
+    """
+    def chunks(machine, limit = None):
+        last = machine.steps + limit if limit is not None else None
+        while True:
+            n = size if last is None else min(size, last - machine.steps)
+            status = run(machine, n)
+            if status is not None or machine.steps == last:
+                return status
+    return chunks
+
+def stepping(machine, limit = None):
+    """ Same as Machine.run, one step at a time.
+    """
+    for _ in range(limit) if limit is not None else iter(int, 1):
+        status = machine.step()
+        if status is not None:
+            return status
+    return mu0_core.HALT_END if machine.pc >= len(machine.code) else None
+
+def hooked(machine, limit = None):
+    """ Same as Machine.run, with a hook installed.
+    """
+    machine.add_hook('fetch', lambda machine, pc, word: None)
+    return machine.run(limit)
+
+def engines(tmp_path):
+    """ Return the engines to cross-check, by name, as functions taking the
+        program, the memory image and the limit, and returning the outcome.
+    """
+    def plain(run, cls = mu0_core.Machine):
+        return lambda program, image, limit: outcome(
+                machine(program, image, cls), run, limit)
+
+    def profiled(program, image, limit):
+        return outcome(machine(program, image),
+                mu0_profile.Profile(program).run, limit)
+
+    def traced(program, image, limit):
+        with mu0_trace.Trace(str(tmp_path / 'trace.bin')) as trace:
+            return outcome(machine(program, image), trace.run, limit)
+
+    def detecting(program, image, limit):
+        return outcome(machine(program, image),
+                mu0_runaway.CycleDetector().run, limit)
+
+    def wide(program, image, limit):
+        source = program.source
+        program = mu0_asm.assemble(source.splitlines(True),
+                address_bits = 16)
+        return outcome(machine(program, image, mu0_wide.WideMachine),
+                mu0_wide.WideMachine.run, limit)
+
+    def lanes(program, image, limit):
+        result = mu0_batch.run_lanes(program, [image], limit)[0]
+        status = result['status']
+        if status == mu0_core.HALT_FAULT:
+            status = ('MemoryAccessError', result['line'])
+        elif status == mu0_core.HALT_OVERFLOW:
+            status = ('WordOverflowError', result['line'])
+        elif status == mu0_core.HALT_LIMIT:
+            status = None
+        return (status, result['acc'], result['pc'], result['steps'],
+                sorted((int(a, 16), v) for a, v in result['memory'].items()))
+
+    found = {
+        'step': plain(stepping),
+        'hooks': plain(hooked),
+        'chunks': plain(chunked(mu0_core.Machine.run, 7)),
+        'profile': profiled,
+        'trace': traced,
+        'cycles': detecting,
+        'wide': wide,
+        'jit': plain(mu0_jit.run),
+        'jit-chunks': plain(chunked(mu0_jit.run, 50)),
+        'accel': plain(mu0_accel.run),
+        'accel-chunks': plain(chunked(mu0_accel.run, 100)),
+    }
+    if mu0_lanes.np is not None:
+        found['lanes'] = lanes
+    return found
+
+ENGINES = ['step', 'hooks', 'chunks', 'profile', 'trace', 'cycles', 'wide',
+        'jit', 'jit-chunks', 'accel', 'accel-chunks', 'lanes']
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('name, source, image, limit', PROGRAMS,
+        ids = [p[0] for p in PROGRAMS])
+def test_engine_matches_interpreter(tmp_path, engine, name, source, image,
+        limit):
+    run = engines(tmp_path).get(engine)
+    if run is None:
+        pytest.skip('NumPy support missing')
+    program = mu0_asm.assemble(source.splitlines(True))
+    program.source = source
+    expected = outcome(machine(program, image), mu0_core.Machine.run, limit)
+    result = run(program, image, limit)
+    if engine == 'lanes':
+        # the memory of a lane is listed in address order
+        expected = expected[:4] + (sorted(expected[4]),)
+    assert result == expected
+
+def test_overflow_leaves_acc_unchanged():
+    program = mu0_asm.assemble(DOUBLING.splitlines(True))
+    m = mu0_core.Machine(program)
+    with pytest.raises(mu0_core.WordOverflowError) as e:
+        m.run()
+    assert e.value.line == 4
+    assert m.acc == 1 << 62
+    assert m.pc == 1
@@ -0,0 +1,23 @@
+""" Tests for the execution history of step mode.
+"""
+
+import mu0_asm
+import mu0_core
+import mu0_history
+
+def test_long_program():
+    # program counters past 16 bits are recorded and restored
+    n = 70000
+    source = ['INI 0x100 0x1\n'] + ['LOAD 0x100\n'] * n + \
+            ['STORE 0x101\n', 'STOP\n']
+    machine = mu0_core.Machine(mu0_asm.assemble(source))
+    machine.pc = n - 2
+    history = mu0_history.History(machine)
+    assert history.step() is None
+    assert history.step() is None
+    assert history.step() is None
+    assert (machine.pc, machine.valid[0x101]) == (n + 1, 1)
+    assert history.back()
+    assert (machine.pc, machine.valid[0x101]) == (n, 0)
+    assert history.back()
+    assert machine.pc == n - 1
@@ -0,0 +1,57 @@
+""" Tests for the hooks of forked machines, which must not be shared with
+    the original machine.
+"""
+
+import mu0_asm
+import mu0_core
+
+SOURCE = """
+INI 0x100 0x1
+LOAD 0x100
+ADD 0x100
+STORE 0x101
+STOP
+"""
+
+def machine():
+    return mu0_core.Machine(mu0_asm.assemble(SOURCE.splitlines(True)))
+
+def test_hook_added_to_fork_only():
+    parent = machine()
+    fork = parent.fork()
+    fetched = []
+    fork.add_hook('fetch', lambda machine, pc, word: fetched.append(pc))
+    assert parent.hooks is None
+    parent.run()
+    assert fetched == []
+    fork.run()
+    assert fetched == [0, 1, 2, 3]
+
+def test_fork_keeps_parent_hooks():
+    parent = machine()
+    parent_writes = []
+    def hook(machine, address, value):
+        parent_writes.append(address)
+    parent.add_hook('write', hook)
+    fork = parent.fork()
+    assert fork.hooks is not parent.hooks
+    fork.remove_hook('write', hook)
+    assert fork.hooks is None
+    assert parent.hooks is not None
+    fork.run()
+    assert parent_writes == []
+    parent.run()
+    assert parent_writes == [0x101]
+
+def test_parent_hook_removed_after_fork():
+    parent = machine()
+    fork_writes = []
+    def hook(machine, address, value):
+        fork_writes.append(address)
+    parent.add_hook('write', hook)
+    fork = parent.fork()
+    parent.remove_hook('write', hook)
+    parent.add_hook('read', hook)
+    assert fork.hooks.read == []
+    fork.run()
+    assert fork_writes == [0x101]
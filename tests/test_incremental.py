@@ -0,0 +1,75 @@
+""" Tests for the incremental assembler: after any sequence of edits, the
+    program must be the same as the one assembled from scratch.
+"""
+
+import random
+
+import pytest
+
+import mu0_asm
+
+LINES = ['LOAD 0x100\n', 'STORE 0x101 ; store\n', 'ADD 0x102\n',
+        'SUB 0x100\n', 'JUMP 0x0\n', 'JGE 0x3\n', 'JNE 0x1\n', 'STOP\n',
+        'INI 0x100 0x5\n', 'INI 0x101 0xFFF ; negative\n', 'INI 0x100 0x7\n',
+        '\n', '; comment\n', '   \n', 'BAD LINE\n', 'LOAD 0x1000\n']
+
+def full(source_lines):
+    """ Return the program assembled from scratch, or the unrecognized
+        lines.
+    """
+    try:
+        program = mu0_asm.assemble(source_lines)
+    except mu0_asm.SourceSyntaxError as e:
+        return e.errors
+    return (list(program.code), program.lines, program.comments,
+            list(program.data.items()))
+
+def incremental(assembler, source_lines):
+    """ Same as full(), updating an IncrementalAssembler.
+    """
+    errors = assembler.update(source_lines)
+    if errors:
+        with pytest.raises(mu0_asm.SourceSyntaxError):
+            assembler.program()
+        return errors
+    program = assembler.program()
+    return (list(program.code), program.lines, program.comments,
+            list(program.data.items()))
+
+def edit(rng, source):
+    """ Return a copy of the source with a random edit: lines inserted,
+        deleted or replaced, at the head, at the tail or anywhere.
+    """
+    source = list(source)
+    if rng.random() < .2 and source:
+        # change a line in place, keeping its neighbours
+        source[rng.randrange(len(source))] = rng.choice(LINES)
+        return source
+    start = rng.choice([0, len(source), rng.randint(0, len(source))])
+    end = min(len(source), start + rng.choice([0, 0, 1, 1, 2, 5]))
+    source[start:end] = [rng.choice(LINES)
+            for _ in range(rng.choice([0, 1, 1, 2, 4]))]
+    return source
+
+@pytest.mark.parametrize('seed', range(30))
+def test_random_edits(seed):
+    rng = random.Random(seed)
+    assembler = mu0_asm.IncrementalAssembler()
+    source = []
+    for _ in range(200):
+        source = edit(rng, source)
+        if rng.random() < .3:
+            # most sources are valid, as while editing a program
+            source = [line for line in source
+                    if line not in ('BAD LINE\n', 'LOAD 0x1000\n')]
+        assert incremental(assembler, source) == full(source), source
+
+def test_program_is_a_copy():
+    assembler = mu0_asm.IncrementalAssembler()
+    assembler.update(['LOAD 0x100\n', 'STOP\n'])
+    program = assembler.program()
+    assembler.update(['INI 0x100 0x1\n', 'LOAD 0x100\n', 'STOP\n'])
+    assert list(program.code) == [0x0100, 0x7000]
+    assert program.lines == [1, 2]
+    assert program.data == {}
+    assert assembler.program().lines == [2, 3]
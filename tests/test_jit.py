@@ -0,0 +1,57 @@
+""" Tests for the JIT translator: cold blocks are interpreted, hot ones are
+    translated, and no translated block is longer than MAX_BLOCK.
+"""
+
+import time
+
+import mu0_asm
+import mu0_bench
+import mu0_core
+import mu0_jit
+
+def translated(program):
+    return [i for i, block in
+            enumerate(mu0_jit.translation(program).blocks) if block]
+
+def test_cold_code_not_translated():
+    # a long straight-line program runs each block once
+    mu0_jit.clear_cache()
+    source = mu0_bench.straight_source(50000)
+    program = mu0_asm.assemble(source.splitlines(True))
+    expected = mu0_core.Machine(program)
+    start = time.perf_counter()
+    expected.run()
+    interpreted = time.perf_counter() - start
+
+    machine = mu0_core.Machine(program)
+    start = time.perf_counter()
+    assert mu0_jit.run(machine) == mu0_core.HALT_STOP
+    elapsed = time.perf_counter() - start
+    assert translated(program) == []
+    assert machine.steps == expected.steps
+    assert list(machine.memory) == list(expected.memory)
+    # about as fast as the interpreter (it used to be 100 times slower)
+    assert elapsed < 10 * interpreted + 0.5
+
+def test_hot_blocks_translated_and_capped():
+    mu0_jit.clear_cache()
+    # a loop whose body is longer than MAX_BLOCK
+    body = ['LOAD 0x101', 'ADD 0x102', 'STORE 0x101'] * mu0_jit.MAX_BLOCK
+    source = '\n'.join(['INI 0x100 0x0', 'INI 0x101 0x0', 'INI 0x102 0x1',
+            'INI 0x103 0x1'] + body + ['LOAD 0x100', 'SUB 0x103',
+            'STORE 0x100', 'JNE 0x0', 'STOP']) + '\n'
+    program = mu0_asm.assemble(source.splitlines(True))
+    image = {0x100: 4 * mu0_jit.HOT}
+    expected = mu0_core.Machine(program)
+    machine = mu0_core.Machine(program)
+    for address, value in image.items():
+        expected.write(address, value)
+        machine.write(address, value)
+    expected.run()
+    assert mu0_jit.run(machine) == mu0_core.HALT_STOP
+    assert (machine.acc, machine.pc, machine.steps) == \
+            (expected.acc, expected.pc, expected.steps)
+    assert list(machine.memory) == list(expected.memory)
+    t = mu0_jit.translation(program)
+    assert 0 in translated(program)
+    assert max(t.sizes) == mu0_jit.MAX_BLOCK
@@ -0,0 +1,43 @@
+""" Tests for the lanes engine of the batch runner, against the results of
+    the worker pool (run_program) for the same jobs.
+"""
+
+import pytest
+
+import mu0_asm
+import mu0_batch
+import mu0_lanes
+
+pytestmark = pytest.mark.skipif(mu0_lanes.np is None,
+        reason = 'NumPy support missing')
+
+# lanes run past the end, stop or loop depending on their memory image
+DIVERGING = """
+INI 0x101 0x1
+LOAD 0x100
+JNE 0x3
+STOP
+SUB 0x101
+STORE 0x100
+JGE 0x0
+"""
+
+def test_end_on_last_step():
+    program = mu0_asm.assemble(['INI 0x100 0x1\n', 'LOAD 0x100\n'])
+    result = mu0_batch.run_lanes(program, [{}], 1)[0]
+    assert result['status'] == 'end'
+    assert result == mu0_batch.run_program(program, {}, limit = 1)
+
+@pytest.mark.parametrize('limit', [None] + list(range(12)))
+def test_lanes_match_pool_at_limit(limit):
+    program = mu0_asm.assemble(DIVERGING.splitlines(True))
+    images = [{0x100: 0}, {0x100: 1}, {0x100: 2}, {0x100: -1}, {0x100: 3}]
+    expected = [mu0_batch.run_program(program, image, limit = limit)
+            for image in images]
+    for result in expected:
+        # the lanes list the memory in address order
+        result['memory'] = dict(sorted(result['memory'].items()))
+    results = mu0_batch.run_lanes(program, images, limit)
+    for result in results:
+        result['memory'] = dict(sorted(result['memory'].items()))
+    assert results == expected
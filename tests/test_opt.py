@@ -0,0 +1,110 @@
+""" Tests for the optimizer: an optimized program must halt for the same
+    reason (on the same source line) with the same ACC and memory as the
+    original one.
+"""
+
+import random
+
+import pytest
+
+import mu0_asm
+import mu0_core
+import mu0_opt
+
+LIMIT = 5000 # instructions run by the original program
+
+def final(program, limit = None):
+    """ Run a program, and return its final status, or None if it did not
+        halt within the limit.
+    """
+    machine = mu0_core.Machine(program)
+    try:
+        status = machine.run(limit)
+    except (mu0_core.MemoryAccessError, mu0_core.WordOverflowError) as e:
+        status = (type(e).__name__, e.line)
+    else:
+        if status is None:
+            return None
+        if status == mu0_core.HALT_STOP:
+            status = (status, machine.line())
+    return (status, machine.acc,
+            [(a, machine.memory[a]) for a in machine.order])
+
+def random_program(rng):
+    """ Return the source of a random program, whose jumps may go anywhere
+        (including past the last instruction).
+    """
+    n = rng.randint(1, 20)
+    locations = ['0x%x' % a for a in range(0x100, 0x106)]
+    source = []
+    for address in locations:
+        if rng.random() < .6:
+            source.append('INI %s 0x%x' % (address, rng.choice(
+                [0, 0, 1, 2, 3, 0xFFF, 0xFFE])))
+    for i in range(n):
+        op = rng.choice(['LOAD', 'LOAD', 'STORE', 'STORE', 'ADD', 'SUB',
+            'JUMP', 'JGE', 'JNE', 'STOP'])
+        if op == 'STOP':
+            source.append(op)
+        elif op in ('JUMP', 'JGE', 'JNE'):
+            source.append('%s 0x%x' % (op, rng.randint(0, n)))
+        else:
+            source.append('%s %s' % (op, rng.choice(locations)))
+    return '\n'.join(source) + '\n'
+
+@pytest.mark.parametrize('seed', range(40))
+def test_optimized_same_final_state(seed):
+    rng = random.Random(seed)
+    checked = 0
+    for _ in range(100):
+        source = random_program(rng)
+        program = mu0_asm.assemble(source.splitlines(True))
+        expected = final(program, LIMIT)
+        if expected is None:
+            continue # runs for too long
+        optimized = mu0_opt.optimize(program)
+        assert len(optimized) <= len(program)
+        assert final(optimized, LIMIT) == expected, source
+        checked += 1
+    assert checked
+
+def test_optimizer_reaches_fixpoint():
+    program = mu0_asm.assemble(SAMPLE.splitlines(True))
+    optimized = mu0_opt.optimize(program)
+    again = mu0_opt.optimize(optimized)
+    assert list(again.code) == list(optimized.code)
+    assert again.lines == optimized.lines
+    assert final(optimized) == final(program)
+
+def test_jumps_relocated():
+    # the chain of jumps is threaded, the dead code removed, and the jump
+    # targets follow the instructions they pointed to
+    source = ("INI 0x100 0x1\nINI 0x101 0x0\nJUMP 0x2\nSTOP\nJUMP 0x4\n"
+            "LOAD 0x100\nADD 0x101\nJUMP 0x8\nSTOP\nSTORE 0x102\n"
+            "LOAD 0x102\nSTOP\n")
+    program = mu0_asm.assemble(source.splitlines(True))
+    optimized = mu0_opt.optimize(program)
+    assert len(optimized) < len(program)
+    assert final(optimized) == final(program)
+    for word in optimized.code:
+        if word >> 12 in (mu0_core.JUMP, mu0_core.JGE, mu0_core.JNE):
+            assert (word & mu0_core.ADDRESS_MASK) <= len(optimized)
+
+SAMPLE = """
+INI 0x100 0x13
+INI 0x101 0x5
+INI 0x102 0x1
+INI 0x103 0x0
+INI 0x104 0x0
+LOAD 0x100
+STORE 0x103
+LOAD 0x103
+SUB 0x101
+JGE 0x6
+STOP
+STORE 0x103
+LOAD 0x104
+ADD 0x102
+STORE 0x104
+JUMP 0x2
+"""
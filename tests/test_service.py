@@ -0,0 +1,66 @@
+""" Tests for the emulator service.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+
+import pytest
+
+import mu0_batch
+import mu0_service
+
+def test_failing_job_gets_error_response(monkeypatch):
+    def run_program(program, image, *args):
+        if image:
+            raise RuntimeError("job failed")
+        return dict(status = 'stop')
+    monkeypatch.setattr(mu0_batch, 'run_program', run_program)
+
+    async def main():
+        service = mu0_service.Service(workers = 1)
+        service.pool = concurrent.futures.ThreadPoolExecutor(1)
+        try:
+            return await asyncio.gather(
+                service.run({'id': 1, 'source': 'STOP\n',
+                    'memory': {'0x100': 1}}),
+                service.run({'id': 2, 'source': 'STOP\n'}))
+        finally:
+            service.close()
+    failed, done = asyncio.run(main())
+    assert failed == dict(id = 1, status = 'error', error = 'job failed')
+    assert done == dict(id = 2, status = 'stop')
+
+def test_serve_over_socket(tmp_path):
+    path = str(tmp_path / 'mu0.sock')
+
+    async def main():
+        service = mu0_service.Service(workers = 1)
+        ready = asyncio.get_running_loop().create_future()
+        server = asyncio.ensure_future(mu0_service.serve(service, path,
+            ready = ready.set_result))
+        await ready
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(b'{"id": 1, "source": "INI 0x100 0x1\\nLOAD 0x100\\n'
+                b'ADD 0x100\\nSTORE 0x100\\nJUMP 0x0\\n"}\n')
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        writer.close()
+        server.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await server
+        return response
+    response = asyncio.run(main())
+    assert response['id'] == 1
+    assert response['status'] == 'overflow'
+    assert not (tmp_path / 'mu0.sock').exists()
+
+def test_regular_file_not_removed(tmp_path):
+    path = tmp_path / 'not-a-socket'
+    path.write_text('keep me')
+
+    async def main():
+        await mu0_service.serve(mu0_service.Service(workers = 1), str(path))
+    with pytest.raises(OSError):
+        asyncio.run(main())
+    assert path.read_text() == 'keep me'
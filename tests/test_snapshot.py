@@ -0,0 +1,69 @@
+""" Tests for the snapshots of the machines, for the default and the wide
+    address spaces.
+"""
+
+import pytest
+
+import mu0_asm
+import mu0_core
+import mu0_wide
+
+COUNTING = """
+INI 0x100 0x0
+INI 0x101 0x1
+LOAD 0x100
+SUB 0x101
+STORE 0x100
+JNE 0x0
+STOP
+"""
+
+def machine(address_bits, image):
+    program = mu0_asm.assemble(COUNTING.splitlines(True),
+            address_bits = address_bits)
+    if address_bits == mu0_core.ADDRESS_BITS:
+        m = mu0_core.Machine(program)
+    else:
+        m = mu0_wide.WideMachine(program)
+    for address, value in image.items():
+        m.write(address, value)
+    return m
+
+def status(m):
+    return (m.pc, m.acc, m.steps, [(a, m.memory[a]) for a in m.order])
+
+@pytest.mark.parametrize('address_bits, image', [
+    (12, {0x100: 50, 0xFFF: -3}),
+    (16, {0x100: 50, 0xFFFF: -3, 0x1234: 7}),
+    (24, {0x100: 50, 0xFFFFFF: -3, 0x123456: 1 << 40}),
+])
+def test_resumed_run_matches(address_bits, image):
+    m = machine(address_bits, image)
+    type(m).run(m, 37)
+    saved = m.snapshot()
+    type(m).run(m)
+    expected = status(m)
+
+    resumed = machine(address_bits, {})
+    resumed.restore(saved)
+    type(resumed).run(resumed)
+    assert status(resumed) == expected
+
+def test_snapshot_of_other_width_refused():
+    saved = machine(16, {0x1234: 1}).snapshot()
+    for address_bits in (12, 24):
+        with pytest.raises(ValueError):
+            machine(address_bits, {}).restore(saved)
+    with pytest.raises(ValueError):
+        machine(16, {}).restore(machine(12, {}).snapshot())
+
+def test_invalid_wide_snapshot_refused():
+    saved = machine(16, {0x1234: 1}).snapshot()
+    with pytest.raises(ValueError):
+        machine(16, {}).restore(saved[:-1])
+    # an address past the address space
+    corrupt = bytearray(saved)
+    # third byte of the last address (0x1234 -> 0x11234)
+    corrupt[mu0_core.SNAPSHOT_HEADER.size + 4 * 2 + 2] = 1
+    with pytest.raises(ValueError):
+        machine(16, {}).restore(bytes(corrupt))
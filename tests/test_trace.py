@@ -0,0 +1,30 @@
+""" Tests for the execution traces.
+"""
+
+import pytest
+
+import mu0_asm
+import mu0_core
+import mu0_trace
+
+def test_long_program(tmp_path):
+    # program counters past 16 bits are recorded
+    n = 70001
+    source = ['INI 0x100 0x1\n'] + ['LOAD 0x100\n'] * n + \
+            ['STORE 0x101\n', 'STOP\n']
+    machine = mu0_core.Machine(mu0_asm.assemble(source))
+    path = str(tmp_path / 'trace.bin')
+    with mu0_trace.Trace(path) as trace:
+        assert trace.run(machine) == mu0_core.HALT_STOP
+    records = list(mu0_trace.records(path))
+    assert len(records) == n + 1
+    assert records[-1] == (n, n, mu0_core.STORE, 0x101, 1, 0x101, 1)
+
+def test_other_version_rejected(tmp_path):
+    path = tmp_path / 'old.bin'
+    path.write_bytes(b'MU0T\x01' + bytes(30))
+    with pytest.raises(ValueError, match = 'version'):
+        list(mu0_trace.records(str(path)))
+    path.write_bytes(b'MU0S\x02')
+    with pytest.raises(ValueError, match = 'Not a mu0 trace'):
+        list(mu0_trace.records(str(path)))